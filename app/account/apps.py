@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class AccountConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app.account"
+
+    def ready(self):
+        # reminder: without a master key the mail account passwords cannot be
+        # encrypted, so the service refuses to start instead of guessing one
+        if not settings.MAIL_ACCOUNT_MASTER_KEYS:
+            raise ImproperlyConfigured(
+                "MAIL_ACCOUNT_MASTER_KEYS is not set, set it and run "
+                "'manage.py reencrypt_mail_accounts' to migrate the mail accounts "
+                "encrypted with the key derived from their mail address"
+            )
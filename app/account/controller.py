@@ -4,6 +4,7 @@ from rest_framework.request import Request
 
 from core.exceptions import AppException
 
+from .models import MailAccountModel
 from .repository import MailAccountRepository
 from .serializer import (
     AddMailAccountSerializer,
@@ -44,11 +45,13 @@ class MailAccountController:
                     "updated_at": datetime.now(),
                 },
             )
+            if "password" in serializer.validated_data:
+                MailAccountModel.invalidate_cached_keys(mail_account.mail_address)
             return MailAccountSerializer(mail_account)
         raise AppException.ValidationException(error_message=serializer.errors)
 
     def delete_account(self, request: Request, obj_id: str):
-        self.mail_account_repository.update_by_id(
+        mail_account = self.mail_account_repository.update_by_id(
             obj_id=obj_id,
             obj_data={
                 "is_deleted": True,
@@ -56,4 +59,5 @@ class MailAccountController:
                 "deleted_at": datetime.now(),
             },
         )
+        MailAccountModel.invalidate_cached_keys(mail_account.mail_address)
         return None
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.account.models import MailAccountModel
+
+
+class Command(BaseCommand):
+    help = (
+        "re-encrypts mail account passwords with a per-account data key wrapped by "
+        "the master key, processing the mail_accounts table in small batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="number of accounts re-encrypted per transaction",
+        )
+        parser.add_argument(
+            "--rotate",
+            action="store_true",
+            help="also re-wrap existing data keys with the current master key",
+        )
+
+    def handle(self, *args, **options):
+        queryset = MailAccountModel.objects.order_by("id")
+        if not options.get("rotate"):
+            queryset = queryset.filter(_data_key__isnull=True)
+        last_id, total = None, 0
+        while True:
+            # reminder: short transactions keep row locks brief while the service runs
+            with transaction.atomic():
+                batch = queryset.filter(id__gt=last_id) if last_id else queryset
+                accounts = list(batch.select_for_update()[: options.get("batch_size")])
+                if not accounts:
+                    break
+                for account in accounts:
+                    self.reencrypt(account)
+                MailAccountModel.objects.bulk_update(
+                    accounts, fields=["_password", "_data_key"]
+                )
+            last_id = accounts[-1].id
+            total += len(accounts)
+            self.stdout.write(f"re-encrypted {total} mail accounts")
+        self.stdout.write(self.style.SUCCESS(f"{total} mail accounts re-encrypted"))
+
+    # noinspection PyMethodMayBeStatic
+    def reencrypt(self, account: MailAccountModel):
+        if account.data_key:
+            account._data_key = MailAccountModel.rotate_data_key(account.data_key)
+        else:
+            account.password = MailAccountModel.decrypt_text(
+                passkey=account.mail_address, encrypted_text=account.password
+            )
+        return account
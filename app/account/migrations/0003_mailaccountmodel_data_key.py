@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0002_mailaccountmodel_is_deleted"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailaccountmodel",
+            name="_data_key",
+            field=models.CharField(db_column="data_key", null=True),
+        ),
+    ]
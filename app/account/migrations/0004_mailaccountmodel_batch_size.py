@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0003_mailaccountmodel_data_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailaccountmodel",
+            name="adaptive_batch_size",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="mailaccountmodel",
+            name="batch_size",
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
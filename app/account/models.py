@@ -1,16 +1,27 @@
 import base64
 import uuid
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from django.conf import settings
 from django.db import models
 
 from core.models import BaseModel
+from core.utils import TTLCache
 
 # Create your models here.
 
+# reminder: key derivation is deliberately slow, so derived keys and decrypted
+# credentials are cached per mail address until they expire or are invalidated
+derived_key_cache = TTLCache(
+    maxsize=settings.MAIL_KEY_CACHE_SIZE, ttl=settings.MAIL_KEY_CACHE_TTL
+)
+credential_cache = TTLCache(
+    maxsize=settings.MAIL_KEY_CACHE_SIZE, ttl=settings.MAIL_CREDENTIAL_CACHE_TTL
+)
+
 
 class MailAccountModel(BaseModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, null=False)
@@ -18,7 +29,10 @@ class MailAccountModel(BaseModel):
     mail_address = models.EmailField(null=False, unique=True, db_index=True)
     sender_name = models.CharField(null=False)
     _password = models.CharField(db_column="password", null=False)
+    _data_key = models.CharField(db_column="data_key", null=True)
     is_default = models.BooleanField(null=False, default=False)
+    batch_size = models.PositiveIntegerField(null=True)
+    adaptive_batch_size = models.BooleanField(null=False, default=False)
 
     class Meta:
         db_table = "mail_accounts"
@@ -36,14 +50,45 @@ class MailAccountModel(BaseModel):
 
     @password.setter
     def password(self, value):
-        # reminder: generate a key for encrypting password
-        key = MailAccountModel.generate_key_from_string(passkey=str(self.mail_address))
+        # reminder: generate a random data key for encrypting password
+        key = Fernet.generate_key().decode("utf-8")
         # reminder: encrypt password
         self._password = MailAccountModel.encrypt_text(key=key, text=value)
+        # reminder: wrap the data key with the master key and store it with the row
+        data_key = MailAccountModel.master_cipher().encrypt(key.encode("utf-8"))
+        self._data_key = data_key.decode("utf-8")
+
+    @property
+    def data_key(self):
+        return self._data_key
+
+    @staticmethod
+    def master_cipher():
+        # reminder: the first master key encrypts, every configured key decrypts
+        return MultiFernet([Fernet(key) for key in settings.MAIL_ACCOUNT_MASTER_KEYS])
+
+    @staticmethod
+    def unwrap_data_key(data_key: str):
+        return (
+            MailAccountModel.master_cipher()
+            .decrypt(data_key.encode("utf-8"))
+            .decode("utf-8")
+        )
+
+    @staticmethod
+    def rotate_data_key(data_key: str):
+        return (
+            MailAccountModel.master_cipher()
+            .rotate(data_key.encode("utf-8"))
+            .decode("utf-8")
+        )
 
     # noinspection PyMethodMayBeStatic
     @staticmethod
     def generate_key_from_string(passkey):
+        key = derived_key_cache.get(passkey)
+        if key:
+            return key
         # reminder: generate a passphrase and salt for encryption key
         passphrase = passkey.encode("utf-8").lower()[::-1]
         salt = passkey.encode("utf-8").upper()
@@ -57,7 +102,9 @@ class MailAccountModel(BaseModel):
         )
         key = kdf.derive(passphrase)
         # reminder: return a url-safe base64-encoded key as a string
-        return base64.urlsafe_b64encode(key).decode("utf-8")
+        return derived_key_cache.set(
+            passkey, base64.urlsafe_b64encode(key).decode("utf-8")
+        )
 
     # noinspection PyMethodMayBeStatic
     @staticmethod
@@ -67,9 +114,23 @@ class MailAccountModel(BaseModel):
         return base64.urlsafe_b64encode(raw_encryption).decode("utf-8")
 
     @staticmethod
-    def decrypt_text(passkey: str, encrypted_text: str):
-        # reminder: generate key for decrypting text
-        key = MailAccountModel.generate_key_from_string(passkey=passkey)
+    def decrypt_text(passkey: str, encrypted_text: str, data_key: str = None):
+        cached_text, text = credential_cache.get(passkey, (None, None))
+        if cached_text == encrypted_text:
+            return text
+        if data_key:
+            # reminder: unwrap the data key the text was encrypted with
+            key = MailAccountModel.unwrap_data_key(data_key=data_key)
+        else:
+            # reminder: generate key for decrypting text encrypted before data keys
+            key = MailAccountModel.generate_key_from_string(passkey=passkey)
         cipher_suite = Fernet(key)
         convert_to_byte = base64.urlsafe_b64decode(encrypted_text.encode("utf-8"))
-        return cipher_suite.decrypt(convert_to_byte).decode("utf-8")
+        text = cipher_suite.decrypt(convert_to_byte).decode("utf-8")
+        credential_cache.set(passkey, (encrypted_text, text))
+        return text
+
+    @staticmethod
+    def invalidate_cached_keys(passkey: str):
+        derived_key_cache.pop(passkey)
+        credential_cache.pop(passkey)
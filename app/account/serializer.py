@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from core.serializers import PaginatedSerializer
@@ -9,6 +10,8 @@ class MailAccountSerializer(serializers.Serializer):
     mail_address = serializers.EmailField(required=True)
     sender_name = serializers.CharField(required=False)
     is_default = serializers.BooleanField(required=True)
+    batch_size = serializers.IntegerField(allow_null=True)
+    adaptive_batch_size = serializers.BooleanField(required=True)
 
 
 class PaginatedMailAccountSerializer(PaginatedSerializer):
@@ -20,12 +23,26 @@ class AddMailAccountSerializer(serializers.Serializer):
     sender_name = serializers.CharField(required=True)
     password = serializers.CharField(required=True)
     is_default = serializers.BooleanField(required=False, default=False)
+    batch_size = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        min_value=1,
+        max_value=settings.MAIL_BATCH_SIZE_MAX,
+    )
+    adaptive_batch_size = serializers.BooleanField(required=False, default=False)
 
 
 class UpdateMailAccountSerializer(serializers.Serializer):
     sender_name = serializers.CharField(required=False)
     password = serializers.CharField(required=False)
     is_default = serializers.BooleanField(required=False)
+    batch_size = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        min_value=1,
+        max_value=settings.MAIL_BATCH_SIZE_MAX,
+    )
+    adaptive_batch_size = serializers.BooleanField(required=False)
 
 
 class QueryMailAccountSerializer(serializers.Serializer):
@@ -0,0 +1,33 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import tag
+
+from app.account.models import MailAccountModel
+
+from .base_test_case import MailAccountTestCase
+
+
+@tag("app.account.command")
+class TestReencryptMailAccountsCommand(MailAccountTestCase):
+    def test_reencrypt_mail_accounts(self):
+        password = self.mail_account_test_data.existing_mail_account.get("password")
+        key = MailAccountModel.generate_key_from_string(
+            passkey=self.mail_account_model.mail_address
+        )
+        MailAccountModel.objects.filter(pk=self.mail_account_model.id).update(
+            _password=MailAccountModel.encrypt_text(key=key, text=password),
+            _data_key=None,
+        )
+        call_command("reencrypt_mail_accounts", batch_size=1, stdout=StringIO())
+        account = MailAccountModel.objects.get(pk=self.mail_account_model.id)
+        self.assertIsNotNone(account.data_key)
+        MailAccountModel.invalidate_cached_keys(account.mail_address)
+        self.assertEqual(
+            MailAccountModel.decrypt_text(
+                passkey=account.mail_address,
+                encrypted_text=account.password,
+                data_key=account.data_key,
+            ),
+            password,
+        )
@@ -5,6 +5,7 @@ from rest_framework import status
 from rest_framework.parsers import JSONParser
 from rest_framework.request import Request
 
+from app.account.models import MailAccountModel, credential_cache
 from app.account.serializer import MailAccountSerializer
 from core.exceptions import AppException
 
@@ -67,6 +68,38 @@ class TestMailAccountController(MailAccountTestCase):
         )
         self.assertIsNotNone(exception.exception.error_message)
 
+    def test_update_account_batch_size(self):
+        request = Request(
+            self.request_factory.post(
+                self.request_url,
+                {"batch_size": 50, "adaptive_batch_size": True},
+                format=self.data_format,
+            ),
+            parsers=[JSONParser()],
+        )
+        request.user = self.mock_decode_token()
+        result = self.mail_account_controller.update_account(
+            request=request, obj_id=self.mail_account_model.id
+        )
+        self.assertEqual(result.data.get("batch_size"), 50)
+        self.assertTrue(result.data.get("adaptive_batch_size"))
+
+    def test_update_account_invalid_batch_size_exc(self):
+        with self.assertRaises(AppException.ValidationException) as exception:
+            request = Request(
+                self.request_factory.post(
+                    self.request_url, {"batch_size": 0}, format=self.data_format
+                ),
+                parsers=[JSONParser()],
+            )
+            request.user = self.mock_decode_token()
+            self.mail_account_controller.update_account(
+                request=request, obj_id=self.mail_account_model.id
+            )
+        self.assertEqual(
+            exception.exception.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
     def test_update_account(self):
         request = Request(
             self.request_factory.post(
@@ -83,6 +116,26 @@ class TestMailAccountController(MailAccountTestCase):
         self.assertIsInstance(result, MailAccountSerializer)
         self.assertIsInstance(result.data, dict)
 
+    def test_update_account_invalidates_cached_credentials(self):
+        MailAccountModel.decrypt_text(
+            passkey=self.mail_account_model.mail_address,
+            encrypted_text=self.mail_account_model.password,
+            data_key=self.mail_account_model.data_key,
+        )
+        request = Request(
+            self.request_factory.post(
+                self.request_url,
+                self.mail_account_test_data.update_account,
+                format=self.data_format,
+            ),
+            parsers=[JSONParser()],
+        )
+        request.user = self.mock_decode_token()
+        self.mail_account_controller.update_account(
+            request=request, obj_id=self.mail_account_model.id
+        )
+        self.assertIsNone(credential_cache.get(self.mail_account_model.mail_address))
+
     def test_update_account_notfound_exc(self):
         with self.assertRaises(AppException.NotFoundException) as exception:
             request = Request(
@@ -1,6 +1,8 @@
+from unittest import mock
+
 from django.test import tag
 
-from app.account.models import MailAccountModel
+from app.account.models import MailAccountModel, credential_cache
 
 from .base_test_case import MailAccountTestCase
 
@@ -16,6 +18,7 @@ class TestAccountModel(MailAccountTestCase):
         self.assertTrue(hasattr(account, "mail_address"))
         self.assertTrue(hasattr(account, "sender_name"))
         self.assertTrue(hasattr(account, "_password"))
+        self.assertTrue(hasattr(account, "_data_key"))
         self.assertTrue(hasattr(account, "is_default"))
         self.assertTrue(hasattr(account, "created_at"))
         self.assertTrue(hasattr(account, "created_by"))
@@ -23,3 +26,32 @@ class TestAccountModel(MailAccountTestCase):
         self.assertTrue(hasattr(account, "updated_by"))
         self.assertTrue(hasattr(account, "deleted_at"))
         self.assertTrue(hasattr(account, "deleted_by"))
+
+    def test_generate_key_from_string_cache(self):
+        MailAccountModel.invalidate_cached_keys(self.mail_account_model.mail_address)
+        with mock.patch(
+            "app.account.models.PBKDF2HMAC.derive", return_value=b"k" * 32
+        ) as derive:
+            key = MailAccountModel.generate_key_from_string(
+                self.mail_account_model.mail_address
+            )
+            self.assertEqual(
+                MailAccountModel.generate_key_from_string(
+                    self.mail_account_model.mail_address
+                ),
+                key,
+            )
+        derive.assert_called_once()
+        MailAccountModel.invalidate_cached_keys(self.mail_account_model.mail_address)
+
+    def test_decrypt_text(self):
+        account = MailAccountModel.objects.get(pk=self.mail_account_model.id)
+        self.assertEqual(
+            MailAccountModel.decrypt_text(
+                passkey=account.mail_address,
+                encrypted_text=account.password,
+                data_key=account.data_key,
+            ),
+            self.mail_account_test_data.existing_mail_account.get("password"),
+        )
+        self.assertIsNotNone(credential_cache.get(account.mail_address))
@@ -1,4 +1,13 @@
+import uuid
+from functools import partial
+from typing import Iterator, Optional
+
+import redis
 from amqp import exceptions as amqp_exc
+from celery import chord, group
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
 from kombu import exceptions as kombu_exc
 from rest_framework.request import Request
 
@@ -6,90 +15,205 @@ from app.account.repository import MailAccountRepository
 from app.delivery.repository import MailDeliveryRepository
 from app.template.controller import MailTemplateController
 from core.exceptions import AppException
-from core.interfaces import MailMailAttribute
-from core.tasks import send_mail_task
+from core.log import logger
+from core.services import campaign_control
+from core.tasks import (
+    finalise_delivery_task,
+    retry_failed_recipients_task,
+    send_mail_chunk_task,
+    send_mail_task,
+)
+from core.utils import (
+    RecipientReader,
+    validate_file_size,
+    validate_file_type,
+)
+from core.utils.constants import BulkMailStatusEnum
 
-from .repository import BulkMailRepository
+from .repository import BulkMailRecipientRepository, BulkMailRepository
 from .serializer import (
+    BulkMailListSerializer,
     BulkMailResponseSerializer,
     BulkMailSerializer,
+    BulkMailUploadResponseSerializer,
     ConsumerSendBulkMailSerializer,
     SendBulkMailSerializer,
     SendBulkMailTemplateSerializer,
+    SendBulkMailUploadSerializer,
 )
 
 
 class BulkMailController:
+    campaign_control = campaign_control
+
     def __init__(
         self,
         bulk_mail_repository: BulkMailRepository,
         mail_account_repository: MailAccountRepository,
         mail_delivery_repository: MailDeliveryRepository,
         mail_template_controller: MailTemplateController,
+        bulk_mail_recipient_repository: BulkMailRecipientRepository,
     ):
         self.bulk_mail_repository = bulk_mail_repository
+        self.bulk_mail_recipient_repository = bulk_mail_recipient_repository
         self.mail_account_repository = mail_account_repository
         self.mail_delivery_repository = mail_delivery_repository
         self.mail_template_controller = mail_template_controller
 
     def view_all_mails(self, request: Request):
         paginator, result = self.bulk_mail_repository.index(request)
-        serializer = BulkMailSerializer(result, many=True)
+        serializer = BulkMailListSerializer(result, many=True)
         return paginator.get_paginated_response(serializer.data)
 
     def send_mail(self, request: Request):
         serializer = SendBulkMailSerializer(data=request.data)
         if serializer.is_valid():
             data = serializer.validated_data
-            obj_data, mail_record = self.create_mail_record(
-                user_id=request.user.get("preferred_username"), obj_data=data
-            )
-            mail_delivery = self.create_delivery_record(
-                user_id=request.user.get("preferred_username"), mail_id=mail_record.id
-            )
-            self.create_task(
-                obj_data={
-                    "mail_id": mail_record.id,
-                    "sender_address": obj_data.get("sender"),
-                    "sender_name": obj_data.get("name"),
-                    "password": obj_data.get("password"),
-                    "recipients": obj_data.get("recipients"),
-                    "subject": obj_data.get("subject"),
-                    "delivery_id": mail_delivery.id,
-                    "html_body": obj_data.get("html_body"),
-                    "text_body": obj_data.get("text_body"),
-                },
+            mail_record, _ = self.create_mail(
+                user_id=request.user.get("preferred_username"),
+                obj_data=data,
+                recipients=self.recipient_chunks(data.pop("recipients")),
             )
             return BulkMailResponseSerializer(
                 {"id": mail_record.id, "is_success": True}
             )
         raise AppException.ValidationException(error_message=serializer.errors)
 
-    def consumer_send_mail(self, obj_data: dict):
-        serializer = ConsumerSendBulkMailSerializer(data=obj_data)
+    def consumer_send_mails(self, objs_data: list):
+        """
+        create the mails of a batch of consumed messages in a handful of queries. The
+        accounts are found once for every sender, the mails, their recipients and
+        delivery reports are inserted in bulk, and the mails are queued in order once
+        the batch is committed. When the database refuses the batch, every mail is
+        inserted in a savepoint of its own so only the refused ones fail
+        :return: the response or the exception of every message, in order
+        """
+        results, mails = [None] * len(objs_data), {}
+        for index, obj_data in enumerate(objs_data):
+            serializer = ConsumerSendBulkMailSerializer(data=obj_data)
+            if serializer.is_valid():
+                mails[index] = serializer.validated_data
+            else:
+                results[index] = AppException.ValidationException(
+                    error_message=serializer.errors
+                )
+        accounts = {
+            account.mail_address: account
+            for account in self.mail_account_repository.find_all(
+                filter_param={
+                    "mail_address__in": {data.get("sender") for data in mails.values()},
+                    "is_deleted": False,
+                }
+            )
+        }
+        mail_records, recipients = {}, {}
+        for index, data in mails.items():
+            user_id = str(data.get("user_id"))
+            account = accounts.get(data.get("sender"))
+            addresses = list(dict.fromkeys(data.pop("recipients")))
+            if not account or str(account.user_id) != user_id:
+                results[index] = AppException.NotFoundException(
+                    error_message=f"mail_account({data.get('sender')}) does not exist"
+                )
+            elif not addresses:
+                results[index] = AppException.ValidationException(
+                    error_message={"recipients": ["no valid recipients"]}
+                )
+            else:
+                mail_records[index] = self.mail_record_data(
+                    user_id=user_id, obj_data=data, account=account
+                )
+                recipients[index] = addresses
+        if not mail_records:
+            return results
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    created = self.create_consumed_mails(
+                        mail_records=mail_records, recipients=recipients
+                    )
+            except (IntegrityError, DataError) as exc:
+                logger.warning(f"ConsumedMailBatchError({exc})")
+                created = {}
+                for index, mail_record in mail_records.items():
+                    try:
+                        with transaction.atomic():
+                            created.update(
+                                self.create_consumed_mails(
+                                    mail_records={index: mail_record},
+                                    recipients={index: recipients[index]},
+                                )
+                            )
+                    except (IntegrityError, DataError) as row_exc:
+                        results[index] = row_exc
+            transaction.on_commit(
+                lambda: self.create_tasks(
+                    objs_data=[
+                        {
+                            "mail_id": mail.id,
+                            "delivery_id": delivery.id,
+                            # reminder: a new mail holds exactly its unique addresses
+                            "recipient_count": len(recipients[index]),
+                        }
+                        for index, (mail, delivery) in created.items()
+                        if not mail.is_scheduled
+                    ]
+                )
+            )
+        for index, (mail, _) in created.items():
+            results[index] = BulkMailResponseSerializer(
+                {"id": mail.id, "is_success": True}
+            )
+        return results
+
+    def create_consumed_mails(self, mail_records: dict, recipients: dict):
+        """
+        insert the mails, their recipients and delivery reports in bulk
+        :param mail_records: the data of every mail, keyed by its message
+        :param recipients: the unique addresses of every mail, keyed by its message
+        :return: the mail and the delivery report of every message
+        """
+        mails = self.bulk_mail_repository.bulk_create(
+            objs_data=list(mail_records.values())
+        )
+        self.bulk_mail_recipient_repository.create_mail_recipients(
+            recipients={
+                mail.id: recipients[index] for index, mail in zip(mail_records, mails)
+            }
+        )
+        deliveries = self.mail_delivery_repository.bulk_create(
+            objs_data=[
+                {"user_id": mail.user_id, "bulk_mail_id": mail.id} for mail in mails
+            ]
+        )
+        return dict(zip(mail_records, zip(mails, deliveries)))
+
+    def send_mail_with_upload(self, request: Request):
+        serializer = SendBulkMailUploadSerializer(data=request.data)
         if serializer.is_valid():
             data = serializer.validated_data
-            obj_data, mail_record = self.create_mail_record(
-                user_id=data.get("user_id"), obj_data=data
+            file = data.pop("file")
+            _, extension, _ = validate_file_type(
+                file, allowed_extensions=["csv", "ndjson", "jsonl"]
             )
-            mail_delivery = self.create_delivery_record(
-                user_id=data.get("user_id"), mail_id=mail_record.id
-            )
-            self.create_task(
-                obj_data={
-                    "mail_id": mail_record.id,
-                    "sender_address": obj_data.get("sender"),
-                    "sender_name": obj_data.get("name"),
-                    "password": obj_data.get("password"),
-                    "recipients": obj_data.get("recipients"),
-                    "subject": obj_data.get("subject"),
-                    "delivery_id": mail_delivery.id,
-                    "html_body": obj_data.get("html_body"),
-                    "text_body": obj_data.get("text_body"),
-                },
+            validate_file_size(
+                file, allowed_size_in_mb=settings.BULK_MAIL_UPLOAD_MAX_SIZE_MB
             )
-            return BulkMailResponseSerializer(
-                {"id": mail_record.id, "is_success": True}
+            reader = RecipientReader(
+                file=file, file_format="csv" if extension == "csv" else "ndjson"
+            )
+            mail_record, recipient_count = self.create_mail(
+                user_id=request.user.get("preferred_username"),
+                obj_data=data,
+                recipients=reader.chunks(settings.BULK_MAIL_RECIPIENT_CHUNK_SIZE),
+            )
+            return BulkMailUploadResponseSerializer(
+                {
+                    "id": mail_record.id,
+                    "is_success": True,
+                    "total_recipients": recipient_count,
+                    "invalid_recipients": reader.invalid,
+                }
             )
         raise AppException.ValidationException(error_message=serializer.errors)
 
@@ -109,34 +233,276 @@ class BulkMailController:
                 },
                 keywords=data.get("keywords", {}),
             )
-            obj_data, mail_record = self.create_mail_record(
-                user_id=request.user.get("preferred_username"), obj_data=data
-            )
-            mail_delivery = self.create_delivery_record(
-                mail_id=mail_record.id, user_id=request.user.get("preferred_username")
-            )
-            self.create_task(
-                obj_data={
-                    "mail_id": mail_record.id,
-                    "sender_address": obj_data.get("sender"),
-                    "sender_name": obj_data.get("name"),
-                    "password": obj_data.get("password"),
-                    "recipients": obj_data.get("recipients"),
-                    "subject": obj_data.get("subject"),
-                    "delivery_id": mail_delivery.id,
-                    "html_body": message,
-                },
+            data["html_body"] = message
+            mail_record, _ = self.create_mail(
+                user_id=request.user.get("preferred_username"),
+                obj_data=data,
+                recipients=self.recipient_chunks(data.pop("recipients")),
             )
             return BulkMailResponseSerializer(
                 {"id": mail_record.id, "is_success": True}
             )
         raise AppException.ValidationException(error_message=serializer.errors)
 
+    def pause_mail(self, obj_id: str):
+        mail = self.update_campaign(
+            obj_id=obj_id,
+            status=BulkMailStatusEnum.paused.value,
+            state=BulkMailStatusEnum.paused.value,
+            from_status=[BulkMailStatusEnum.active.value],
+        )
+        return BulkMailResponseSerializer({"id": mail.id, "is_success": True})
+
+    def resume_mail(self, obj_id: str):
+        mail = self.bulk_mail_repository.find_by_id(obj_id)
+        mail_delivery = self.mail_delivery_repository.find(
+            filter_param={"bulk_mail_id": mail.id}
+        )
+        # reminder: the resumed run stops every task of the paused run still sending
+        # and resumes each part of the mail from its checkpoint, a mail that was not
+        # dispatched yet has no task and is sent by its dispatch as its first run
+        run = None if mail.is_scheduled else str(uuid.uuid4())
+        with transaction.atomic():
+            self.update_campaign(
+                obj_id=obj_id,
+                status=BulkMailStatusEnum.active.value,
+                state=run,
+                from_status=[BulkMailStatusEnum.paused.value],
+            )
+            if mail.is_scheduled:
+                # reminder: the scheduled mail is sent by its dispatch once it is due
+                return BulkMailResponseSerializer({"id": mail.id, "is_success": True})
+            recipient_count = self.bulk_mail_recipient_repository.count_recipients(
+                bulk_mail_id=mail.id
+            )
+            transaction.on_commit(
+                lambda: self.create_task(
+                    obj_data={
+                        "mail_id": mail.id,
+                        "delivery_id": mail_delivery.id,
+                        "recipient_count": recipient_count,
+                        "run": run,
+                    }
+                )
+            )
+        return BulkMailResponseSerializer({"id": mail.id, "is_success": True})
+
+    def cancel_mail(self, obj_id: str):
+        mail = self.update_campaign(
+            obj_id=obj_id,
+            status=BulkMailStatusEnum.cancelled.value,
+            state=BulkMailStatusEnum.cancelled.value,
+            from_status=[
+                BulkMailStatusEnum.active.value,
+                BulkMailStatusEnum.paused.value,
+            ],
+            # reminder: a cancelled mail is never dispatched
+            obj_data={"is_scheduled": False},
+        )
+        return BulkMailResponseSerializer({"id": mail.id, "is_success": True})
+
+    def update_campaign(
+        self,
+        obj_id: str,
+        status: str,
+        state: Optional[str],
+        from_status: list,
+        obj_data: dict = None,
+    ):
+        """
+        move a bulk mail to status and flag its state for the workers sending it
+        :param state: the state read by the workers before every batch
+        :param from_status: the statuses the mail can be moved from
+        :param obj_data: other fields of the mail updated with its status
+        """
+        mail = self.bulk_mail_repository.find_by_id(obj_id)
+        if mail.status not in from_status:
+            raise AppException.BadRequestException(
+                error_message=f"bulk mail({obj_id}) is {mail.status}"
+            )
+        with transaction.atomic():
+            mail = self.bulk_mail_repository.update_by_id(
+                obj_id=obj_id, obj_data={"status": status, **(obj_data or {})}
+            )
+            self.set_campaign_state(bulk_mail_id=mail.id, state=state)
+        return mail
+
+    def set_campaign_state(self, bulk_mail_id: str, state: Optional[str]):
+        try:
+            self.campaign_control.set_state(bulk_mail_id=bulk_mail_id, state=state)
+        except redis.RedisError as exc:
+            raise AppException.InternalServerException(
+                error_message=f"CampaignControlError({exc})"
+            ) from exc
+
+    def retry_mail(self, obj_id: str):
+        mail = self.bulk_mail_repository.find_by_id(obj_id)
+        if mail.status not in [
+            BulkMailStatusEnum.active.value,
+            BulkMailStatusEnum.completed.value,
+        ]:
+            raise AppException.BadRequestException(
+                error_message=f"bulk mail({obj_id}) is {mail.status}"
+            )
+        mail_delivery = self.mail_delivery_repository.find(
+            filter_param={"bulk_mail_id": mail.id}
+        )
+        if not mail_delivery.failed_recipients:
+            raise AppException.BadRequestException(
+                error_message=f"bulk mail({obj_id}) has no failed recipients"
+            )
+        try:
+            retry_failed_recipients_task.apply_async(
+                kwargs={
+                    "mail_record": {
+                        "delivery_id": mail_delivery.id,
+                        "bulk_mail_id": mail.id,
+                    },
+                },
+            )
+        except (kombu_exc.KombuError, amqp_exc.AMQPError) as exc:
+            raise AppException.InternalServerException(
+                error_message=f"CeleryBrokerError({exc})"
+            ) from exc
+        return BulkMailResponseSerializer({"id": mail.id, "is_success": True})
+
+    def dispatch_scheduled_mails(self):
+        """
+        queue the active scheduled mails that are due, claimed in batches in the
+        order they are due so every mail is queued once however many dispatchers run
+        :return: the number of mails queued
+        """
+        dispatched, refused = 0, []
+        while not refused:
+            # reminder: the flag is cleared in the transaction queuing the mails once
+            # it commits, so a dispatcher that dies first leaves them scheduled
+            with transaction.atomic():
+                mails = self.bulk_mail_repository.claim(
+                    filter_param={
+                        "is_scheduled": True,
+                        "scheduled_date__lte": timezone.now(),
+                        "status": BulkMailStatusEnum.active.value,
+                    },
+                    obj_data={"is_scheduled": False},
+                    limit=settings.MAIL_SCHEDULE_BATCH_SIZE,
+                    order_by=["scheduled_date"],
+                )
+                if not mails:
+                    break
+                deliveries = {
+                    delivery.bulk_mail_id: delivery.id
+                    for delivery in self.mail_delivery_repository.find_all(
+                        filter_param={"bulk_mail_id__in": [mail.id for mail in mails]}
+                    )
+                }
+                objs_data = [
+                    {
+                        "mail_id": mail.id,
+                        "delivery_id": deliveries.get(mail.id),
+                        "recipient_count": (
+                            self.bulk_mail_recipient_repository.count_recipients(
+                                bulk_mail_id=mail.id
+                            )
+                        ),
+                    }
+                    for mail in mails
+                ]
+                transaction.on_commit(
+                    partial(
+                        self.queue_scheduled_mails, objs_data=objs_data, refused=refused
+                    )
+                )
+            dispatched += len(mails) - len(refused)
+        return dispatched
+
+    def queue_scheduled_mails(self, objs_data: list, refused: list):
+        """
+        queue the claimed scheduled mails in order, flagging the ones left once the
+        broker refuses one so the next dispatch picks them up
+        :param refused: filled with the ids of the mails that were not queued
+        """
+        for index, obj_data in enumerate(objs_data):
+            try:
+                self.create_task(obj_data=obj_data)
+            except AppException.InternalServerException as exc:
+                refused.extend(_.get("mail_id") for _ in objs_data[index:])
+                self.bulk_mail_repository.update_all(
+                    filter_param={"id__in": refused}, obj_data={"is_scheduled": True}
+                )
+                logger.error(f"ScheduledMailDispatchError({exc})")
+                return None
+        return None
+
     def delete_mail(self, obj_id: str):
+        mail = self.bulk_mail_repository.find_by_id(obj_id)
+        # reminder: the workers still sending the mail stop before their next batch
+        self.set_campaign_state(
+            bulk_mail_id=mail.id, state=BulkMailStatusEnum.cancelled.value
+        )
         self.bulk_mail_repository.delete_by_id(obj_id)
         return None
 
-    def create_mail_record(self, user_id: str, obj_data: dict):
+    def create_mail(self, user_id: str, obj_data: dict, recipients: Iterator[list]):
+        """
+        store the mail and load its recipients a chunk per transaction, so a large
+        upload never holds one long transaction, then activate the mail, store its
+        delivery report and queue the mail once they are committed. A mail whose
+        recipients fail to load is deleted with the recipients loaded so far
+        :param recipients: the recipients of the mail in chunks of unique addresses
+        :return: the mail and its number of recipients
+        """
+        obj_data, mail_record = self.create_mail_record(
+            user_id=user_id,
+            obj_data=obj_data,
+            status=BulkMailStatusEnum.loading.value,
+        )
+        try:
+            for addresses in recipients:
+                with transaction.atomic():
+                    self.bulk_mail_recipient_repository.create_recipients(
+                        bulk_mail_id=mail_record.id, addresses=addresses
+                    )
+            recipient_count = self.bulk_mail_recipient_repository.count_recipients(
+                bulk_mail_id=mail_record.id
+            )
+            if not recipient_count:
+                raise AppException.ValidationException(
+                    error_message={"recipients": ["no valid recipients"]}
+                )
+        except Exception:
+            self.bulk_mail_repository.delete_by_id(mail_record.id)
+            raise
+        with transaction.atomic():
+            # reminder: a loading mail is never dispatched, paused or resumed
+            self.bulk_mail_repository.update_fields_by_id(
+                obj_id=mail_record.id,
+                obj_data={"status": BulkMailStatusEnum.active.value},
+            )
+            mail_record.status = BulkMailStatusEnum.active.value
+            mail_delivery = self.create_delivery_record(
+                user_id=user_id, mail_id=mail_record.id
+            )
+            if mail_record.is_scheduled:
+                return mail_record, recipient_count
+            transaction.on_commit(
+                lambda: self.create_task(
+                    obj_data={
+                        "mail_id": mail_record.id,
+                        "delivery_id": mail_delivery.id,
+                        "recipient_count": recipient_count,
+                    }
+                )
+            )
+        return mail_record, recipient_count
+
+    # noinspection PyMethodMayBeStatic
+    def recipient_chunks(self, recipients: list):
+        recipients = list(dict.fromkeys(recipients))
+        chunk_size = settings.BULK_MAIL_RECIPIENT_CHUNK_SIZE
+        for start in range(0, len(recipients), chunk_size):
+            yield recipients[start : start + chunk_size]
+
+    def create_mail_record(self, user_id: str, obj_data: dict, status: str = None):
         account = self.mail_account_repository.find(
             filter_param={
                 "user_id": user_id,
@@ -144,18 +510,32 @@ class BulkMailController:
                 "is_deleted": False,
             }
         )
-        obj_data["name"] = obj_data.get("name", account.sender_name)
-        obj_data["password"] = account.password
         mail = self.bulk_mail_repository.create(
             obj_data={
-                "user_id": user_id,
-                "sender": obj_data.get("sender"),
-                "recipients": obj_data.get("recipients"),
-                "subject": obj_data.get("subject"),
+                **self.mail_record_data(
+                    user_id=user_id, obj_data=obj_data, account=account
+                ),
+                **({"status": status} if status else {}),
             }
         )
         return obj_data, mail
 
+    # noinspection PyMethodMayBeStatic
+    def mail_record_data(self, user_id: str, obj_data: dict, account):
+        obj_data["name"] = obj_data.get("name", account.sender_name)
+        # reminder: a mail scheduled in the past is sent straight away
+        scheduled_date = obj_data.get("scheduled_date")
+        return {
+            "user_id": user_id,
+            "sender": obj_data.get("sender"),
+            "name": obj_data.get("name"),
+            "subject": obj_data.get("subject"),
+            "html_body": obj_data.get("html_body"),
+            "text_body": obj_data.get("text_body"),
+            "is_scheduled": bool(scheduled_date and scheduled_date > timezone.now()),
+            "scheduled_date": scheduled_date,
+        }
+
     def create_delivery_record(self, user_id: str, mail_id: str):
         return self.mail_delivery_repository.create(
             obj_data={"user_id": user_id, "bulk_mail_id": mail_id}
@@ -163,27 +543,57 @@ class BulkMailController:
 
     # noinspection PyMethodMayBeStatic
     def create_task(self, obj_data: dict):
+        # reminder: the task only carries ids, the worker loads the mail itself
+        mail_record = {
+            "delivery_id": obj_data.get("delivery_id"),
+            "bulk_mail_id": obj_data.get("mail_id"),
+            **({"run": obj_data.get("run")} if obj_data.get("run") else {}),
+        }
         try:
-            send_mail_task.apply_async(
-                kwargs={
-                    "mail_attr": MailMailAttribute(
-                        sender_address=obj_data.get("sender_address"),
-                        sender_name=obj_data.get("sender_name"),
-                        password=obj_data.get("password"),
-                        recipient=obj_data.get("recipients"),
-                        subject=obj_data.get("subject"),
-                        html_body=obj_data.get("html_body"),
-                        text_body=obj_data.get("text_body"),
-                    ),
-                    "mail_record": {
-                        "delivery_id": obj_data.get("delivery_id"),
-                        "bulk_mail_id": obj_data.get("mail_id"),
-                    },
-                },
-                kwargsrepr="",
-            )
+            chunk_size = self.chunk_size(obj_data.get("recipient_count"))
+            if chunk_size:
+                self.create_chunk_tasks(
+                    mail_record=mail_record,
+                    recipients=obj_data.get("recipient_count"),
+                    chunk_size=chunk_size,
+                )
+            else:
+                send_mail_task.apply_async(kwargs={"mail_record": mail_record})
         except (kombu_exc.KombuError, amqp_exc.AMQPError) as exc:
             raise AppException.InternalServerException(
                 error_message=f"CeleryBrokerError({exc})"
             ) from exc
         return None
+
+    def create_tasks(self, objs_data: list):
+        """
+        queue every mail of objs_data in order, logging the ones the broker refused
+        instead of leaving the rest of the mails unqueued
+        """
+        for obj_data in objs_data:
+            try:
+                self.create_task(obj_data=obj_data)
+            # reminder: the mails are committed, an error raised from here would have
+            # the consumer create them again
+            except Exception as exc:
+                logger.error(f"BulkMailTaskError({obj_data.get('mail_id')}, {exc})")
+        return None
+
+    # noinspection PyMethodMayBeStatic
+    def chunk_size(self, recipient_count: int):
+        chunk_size = settings.BULK_MAIL_CHUNK_SIZE
+        return chunk_size if chunk_size and recipient_count > chunk_size else None
+
+    # noinspection PyMethodMayBeStatic
+    def create_chunk_tasks(self, mail_record: dict, recipients: int, chunk_size: int):
+        """
+        split the recipients into chunk tasks sent in parallel by the workers, with a
+        callback that finalises the delivery report once every chunk completes
+        """
+        chunk_tasks = group(
+            send_mail_chunk_task.s(
+                mail_record={**mail_record, "recipient_slice": [_, chunk_size + _]}
+            )
+            for _ in range(0, recipients, chunk_size)
+        )
+        return chord(chunk_tasks)(finalise_delivery_task.s(mail_record=mail_record))
@@ -0,0 +1,43 @@
+import pinject
+from django.core.management.base import BaseCommand
+from kafka.errors import KafkaError
+
+from app.account.repository import MailAccountRepository
+from app.bulk.controller import BulkMailController
+from app.bulk.repository import (
+    BulkMailRecipientRepository,
+    BulkMailRepository,
+)
+from app.delivery.repository import MailDeliveryRepository
+from app.template.controller import MailTemplateController
+from app.template.repository import MailTemplateRepository
+from core.consumer import MailConsumer
+
+
+class Command(BaseCommand):
+    help = (
+        "consumes the bulk mails published on the kafka subscriptions, building the "
+        "controllers once and reusing them for every message"
+    )
+
+    def handle(self, *args, **options):
+        obj_graph = pinject.new_object_graph(
+            modules=None,
+            classes=[
+                MailConsumer,
+                BulkMailController,
+                BulkMailRepository,
+                BulkMailRecipientRepository,
+                MailAccountRepository,
+                MailDeliveryRepository,
+                MailTemplateController,
+                MailTemplateRepository,
+            ],
+        )
+        mail_consumer: MailConsumer = obj_graph.provide(MailConsumer)
+        try:
+            consumer = mail_consumer.connect()
+        except KafkaError as exc:
+            self.stderr.write(f"error({exc}) occurred while connecting to kafka")
+            return
+        mail_consumer.run(consumer)
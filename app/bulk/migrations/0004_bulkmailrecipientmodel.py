@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bulk", "0003_alter_bulkmailmodel_text_body"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BulkMailRecipientModel",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("address", models.CharField()),
+                (
+                    "bulk_mail",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recipient_set",
+                        to="bulk.bulkmailmodel",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "bulk_mail_recipients",
+                "ordering": ["id"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("bulk_mail", "address"),
+                        name="unique_bulk_mail_recipient",
+                    )
+                ],
+            },
+        ),
+    ]
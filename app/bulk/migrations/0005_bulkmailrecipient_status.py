@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bulk", "0004_bulkmailrecipientmodel"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bulkmailmodel",
+            name="recipients",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="bulkmailrecipientmodel",
+            name="status",
+            field=models.CharField(default="pending"),
+        ),
+        migrations.AddIndex(
+            model_name="bulkmailrecipientmodel",
+            index=models.Index(
+                fields=["bulk_mail", "status"], name="bulk_mail_recipient_status"
+            ),
+        ),
+    ]
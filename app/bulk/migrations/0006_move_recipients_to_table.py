@@ -0,0 +1,45 @@
+# Generated by Django 5.1 on 2026-10-18 15:25
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def move_recipients_to_table(apps, schema_editor):
+    bulk_mail_model = apps.get_model("bulk", "BulkMailModel")
+    recipient_model = apps.get_model("bulk", "BulkMailRecipientModel")
+    mails = bulk_mail_model.objects.filter(recipients__isnull=False)
+    for mail in mails.only("id", "recipients").iterator(chunk_size=100):
+        recipient_model.objects.bulk_create(
+            [
+                recipient_model(bulk_mail_id=mail.id, address=address)
+                for address in dict.fromkeys(mail.recipients or [])
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    mails.update(recipients=None)
+
+
+def move_recipients_to_json(apps, schema_editor):
+    bulk_mail_model = apps.get_model("bulk", "BulkMailModel")
+    recipient_model = apps.get_model("bulk", "BulkMailRecipientModel")
+    for mail in bulk_mail_model.objects.only("id").iterator(chunk_size=100):
+        mail.recipients = list(
+            recipient_model.objects.filter(bulk_mail_id=mail.id)
+            .order_by("id")
+            .values_list("address", flat=True)
+        )
+        mail.save(update_fields=["recipients"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bulk", "0005_bulkmailrecipient_status"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=move_recipients_to_table, reverse_code=move_recipients_to_json
+        ),
+    ]
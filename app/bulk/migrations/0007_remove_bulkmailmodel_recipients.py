@@ -0,0 +1,16 @@
+# Generated by Django 5.1 on 2026-10-18 15:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bulk", "0006_move_recipients_to_table"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="bulkmailmodel",
+            name="recipients",
+        ),
+    ]
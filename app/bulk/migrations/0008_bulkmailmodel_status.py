@@ -0,0 +1,27 @@
+# Generated by Django 5.1 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+def complete_existing_mails(apps, schema_editor):
+    # reminder: the mails created before statuses existed were queued when they were
+    # created, resuming one without a checkpoint would send it again
+    bulk_mail_model = apps.get_model("bulk", "BulkMailModel")
+    bulk_mail_model.objects.update(status="completed")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bulk", "0007_remove_bulkmailmodel_recipients"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bulkmailmodel",
+            name="status",
+            field=models.CharField(default="active"),
+        ),
+        migrations.RunPython(
+            code=complete_existing_mails, reverse_code=migrations.RunPython.noop
+        ),
+    ]
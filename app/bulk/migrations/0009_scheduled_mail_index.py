@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bulk", "0008_bulkmailmodel_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bulkmailmodel",
+            index=models.Index(
+                condition=models.Q(("is_scheduled", True)),
+                fields=["scheduled_date"],
+                name="bulk_mail_due",
+            ),
+        ),
+    ]
@@ -3,6 +3,10 @@ import uuid
 from django.db import models
 
 from core.models import BaseModel
+from core.utils.constants import (
+    BulkMailStatusEnum,
+    MailRecipientStatusEnum,
+)
 
 # Create your models here.
 
@@ -12,19 +16,71 @@ class BulkMailModel(BaseModel):
     user_id = models.UUIDField(null=False, db_index=True)
     sender = models.CharField(null=False, db_index=True)
     name = models.CharField(null=False, db_index=True)
-    recipients = models.JSONField()
     subject = models.CharField()
     html_body = models.CharField(null=False)
     text_body = models.CharField(null=True)
+    status = models.CharField(null=False, default=BulkMailStatusEnum.active.value)
     is_scheduled = models.BooleanField(default=False)
     scheduled_date = models.DateTimeField(null=True)
 
     class Meta:
         db_table = "bulk_mails"
         ordering = ["created_at"]
+        # reminder: only the mails waiting to be dispatched are indexed, so finding
+        # the ones that are due never scans the mails already sent
+        indexes = [
+            models.Index(
+                fields=["scheduled_date"],
+                condition=models.Q(is_scheduled=True),
+                name="bulk_mail_due",
+            )
+        ]
+
+    @property
+    def recipients(self):
+        return list(self.recipient_set.values_list("address", flat=True))
 
     def __str__(self):
         return self.sender
 
     def __repr__(self):
         return self.sender
+
+
+class BulkMailRecipientModel(models.Model):
+    """
+    A recipient of a bulk mail. Recipients are kept in the table 'bulk_mail_recipients'
+    instead of a json column on the mail, so a campaign is loaded with COPY, read by
+    the workers in slices and tracked per recipient. Rows are kept lean, without the
+    audit columns of BaseModel, and an address is stored once per bulk mail.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    bulk_mail = models.ForeignKey(
+        to=BulkMailModel,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="recipient_set",
+    )
+    address = models.CharField(null=False)
+    status = models.CharField(null=False, default=MailRecipientStatusEnum.pending.value)
+
+    class Meta:
+        db_table = "bulk_mail_recipients"
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["bulk_mail", "status"], name="bulk_mail_recipient_status"
+            )
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bulk_mail", "address"], name="unique_bulk_mail_recipient"
+            )
+        ]
+
+    def __str__(self):
+        return self.address
+
+    def __repr__(self):
+        return self.address
@@ -1,8 +1,157 @@
+import csv
+import io
+
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
 from core.repository import SqlBaseRepository
+from core.utils.constants import MailRecipientStatusEnum
 
-from .models import BulkMailModel
+from .models import BulkMailModel, BulkMailRecipientModel
 
 
 class BulkMailRepository(SqlBaseRepository):
     model = BulkMailModel
     object_name = "bulk_mail"
+
+    def index(self, paginate):
+        """
+        :return: {list} returns a page of bulk mails annotated with their number of
+        recipients and with their delivery reports prefetched, instead of loading the
+        recipients and the delivery reports of every mail one mail at a time
+        """
+        recipient_count = (
+            BulkMailRecipientModel.objects.filter(bulk_mail=OuterRef("pk"))
+            .order_by()
+            .values("bulk_mail")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        results = self.custom_paginator.paginate_queryset(
+            self.model.objects.annotate(
+                total_recipients=Coalesce(
+                    Subquery(recipient_count, output_field=IntegerField()), Value(0)
+                )
+            ).prefetch_related("delivery"),
+            paginate,
+        )
+        return self.custom_paginator, results
+
+
+class BulkMailRecipientRepository(SqlBaseRepository):
+    model = BulkMailRecipientModel
+    object_name = "bulk_mail_recipient"
+
+    def create_recipients(self, bulk_mail_id: str, addresses: list):
+        """
+        insert the addresses of a bulk mail, skipping the ones it already has. On
+        postgresql the addresses are streamed with COPY into a temporary table and
+        moved over in a single INSERT, which is far cheaper than a multi-row INSERT
+        for the hundreds of thousands of recipients of a campaign
+        """
+        return self.create_mail_recipients(recipients={bulk_mail_id: addresses})
+
+    def create_mail_recipients(self, recipients: dict):
+        """
+        insert the addresses of several bulk mails with a single COPY and INSERT
+        :param recipients: the addresses of every bulk mail keyed by its id
+        """
+        if connection.vendor != "postgresql":
+            self.model.objects.bulk_create(
+                [
+                    self.model(bulk_mail_id=bulk_mail_id, address=address)
+                    for bulk_mail_id, addresses in recipients.items()
+                    for address in addresses
+                ],
+                ignore_conflicts=True,
+            )
+            return None
+        table = self.model._meta.db_table  # noqa
+        rows = io.StringIO()
+        csv.writer(rows).writerows(
+            [bulk_mail_id, address]
+            for bulk_mail_id, addresses in recipients.items()
+            for address in addresses
+        )
+        rows.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # reminder: the load table lives until the transaction ends, so a chunked
+            # upload reuses it and empties it after every chunk
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {table}_load "
+                "(position serial, bulk_mail_id uuid, address varchar) ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                f"COPY {table}_load (bulk_mail_id, address) FROM STDIN "
+                "WITH (FORMAT csv)",
+                rows,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (bulk_mail_id, address, status) "
+                f"SELECT bulk_mail_id, address, %s FROM {table}_load ORDER BY position "
+                "ON CONFLICT DO NOTHING",
+                [MailRecipientStatusEnum.pending.value],
+            )
+            cursor.execute(f"TRUNCATE {table}_load")
+        return None
+
+    def count_recipients(self, bulk_mail_id: str, status: str = None):
+        recipients = self.model.objects.filter(bulk_mail_id=bulk_mail_id)
+        if status:
+            recipients = recipients.filter(status=status)
+        return recipients.count()
+
+    def iter_addresses(
+        self,
+        bulk_mail_id: str,
+        start: int = 0,
+        stop: int = None,
+        chunk_size: int = 2000,
+    ):
+        """
+        iterate the addresses of a bulk mail in the order they were stored. On
+        postgresql the rows are fetched chunk_size at a time from a server-side cursor
+        instead of loading the whole result into memory
+        """
+        return (
+            self.model.objects.filter(bulk_mail_id=bulk_mail_id)
+            .order_by("id")
+            .values_list("address", flat=True)[start:stop]
+            .iterator(chunk_size=chunk_size)
+        )
+
+    def find_addresses(
+        self, bulk_mail_id: str, start: int = 0, stop: int = None, status: str = None
+    ):
+        """
+        return the addresses of the recipients of a bulk mail from start to stop in
+        the order they were stored, only the ones with status when given
+        """
+        positions = (
+            self.model.objects.filter(bulk_mail_id=bulk_mail_id)
+            .order_by("id")
+            .values("id")[start:stop]
+        )
+        recipients = self.model.objects.filter(id__in=positions)
+        if status:
+            recipients = recipients.filter(status=status)
+        return list(recipients.order_by("id").values_list("address", flat=True))
+
+    def update_status(self, bulk_mail_id: str, addresses: list, status: str):
+        """
+        set the delivery status of the given recipients of a bulk mail in one UPDATE
+        :param addresses: the recipients whose status changes
+        :param status: a MailRecipientStatusEnum value
+        """
+        if not addresses:
+            return 0
+        return self.model.objects.filter(
+            bulk_mail_id=bulk_mail_id, address__in=addresses
+        ).update(status=status)
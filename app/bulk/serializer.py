@@ -13,11 +13,27 @@ class BulkMailSerializer(serializers.Serializer):
         child=serializers.EmailField(required=True), required=True
     )
     subject = serializers.CharField(required=False)
+    status = serializers.CharField(required=True)
+    is_scheduled = serializers.BooleanField(required=True)
+    scheduled_date = serializers.DateTimeField(required=False)
+    delivery = MailDeliverySerializer(many=True)
+
+
+class BulkMailListSerializer(serializers.Serializer):
+    id = serializers.UUIDField(required=True)
+    user_id = serializers.UUIDField(required=True)
+    sender = serializers.EmailField(required=True)
+    name = serializers.CharField(required=False)
+    total_recipients = serializers.IntegerField(required=True)
+    subject = serializers.CharField(required=False)
+    status = serializers.CharField(required=True)
+    is_scheduled = serializers.BooleanField(required=True)
+    scheduled_date = serializers.DateTimeField(required=False)
     delivery = MailDeliverySerializer(many=True)
 
 
 class PaginatedBulkMailSerializer(PaginatedSerializer):
-    results = BulkMailSerializer(many=True)
+    results = BulkMailListSerializer(many=True)
 
 
 class SendBulkMailSerializer(serializers.Serializer):
@@ -29,6 +45,7 @@ class SendBulkMailSerializer(serializers.Serializer):
     subject = serializers.CharField(required=True)
     html_body = serializers.CharField(required=True)
     text_body = serializers.CharField(required=False, allow_null=True)
+    scheduled_date = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class SendBulkMailTemplateSerializer(serializers.Serializer):
@@ -41,6 +58,17 @@ class SendBulkMailTemplateSerializer(serializers.Serializer):
     template_id = serializers.UUIDField(required=False)
     template_name = serializers.CharField(required=False)
     keywords = serializers.DictField(required=False)
+    scheduled_date = serializers.DateTimeField(required=False, allow_null=True)
+
+
+class SendBulkMailUploadSerializer(serializers.Serializer):
+    sender = serializers.EmailField(required=True)
+    name = serializers.CharField(required=False)
+    subject = serializers.CharField(required=True)
+    html_body = serializers.CharField(required=True)
+    text_body = serializers.CharField(required=False, allow_null=True)
+    file = serializers.FileField(required=True)
+    scheduled_date = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class BulkMailResponseSerializer(serializers.Serializer):
@@ -48,6 +76,11 @@ class BulkMailResponseSerializer(serializers.Serializer):
     is_success = serializers.BooleanField(required=True)
 
 
+class BulkMailUploadResponseSerializer(BulkMailResponseSerializer):
+    total_recipients = serializers.IntegerField(required=True)
+    invalid_recipients = serializers.IntegerField(required=True)
+
+
 class ConsumerSendBulkMailSerializer(SendBulkMailSerializer):
     user_id = serializers.UUIDField(required=True)
 
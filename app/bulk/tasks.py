@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .views import bulk_mail_controller
+
+
+@shared_task
+def dispatch_scheduled_mails_task():
+    return bulk_mail_controller.dispatch_scheduled_mails()
@@ -7,8 +7,12 @@ from app.account.models import MailAccountModel
 from app.account.repository import MailAccountRepository
 from app.account.tests import MailAccountTestData
 from app.bulk.controller import BulkMailController
-from app.bulk.models import BulkMailModel
-from app.bulk.repository import BulkMailRepository
+from app.bulk.models import BulkMailModel, BulkMailRecipientModel
+from app.bulk.repository import (
+    BulkMailRecipientRepository,
+    BulkMailRepository,
+)
+from app.delivery.models import MailDeliveryModel
 from app.delivery.repository import MailDeliveryRepository
 from app.template.controller import MailTemplateController
 from app.template.models import MailTemplateModel
@@ -25,6 +29,10 @@ class BulkMailTestCase(BaseTestCase):
         self.bulk_mail_model = BulkMailModel.objects.create(
             **self.bulk_mail_test_data.existing_mail
         )
+        BulkMailRecipientModel.objects.bulk_create(
+            BulkMailRecipientModel(bulk_mail=self.bulk_mail_model, address=address)
+            for address in self.bulk_mail_test_data.existing_recipients
+        )
         self.mail_account_test_data = MailAccountTestData()
         self.mail_account_model = MailAccountModel.objects.create(
             **self.mail_account_test_data.existing_mail_account
@@ -47,6 +55,7 @@ class BulkMailTestCase(BaseTestCase):
         """This is where all classes are instantiated for the test"""
         self.mail_account_repository = MailAccountRepository()
         self.bulk_mail_repository = BulkMailRepository()
+        self.bulk_mail_recipient_repository = BulkMailRecipientRepository()
         self.mail_template_repository = MailTemplateRepository()
         self.mail_delivery_repository = MailDeliveryRepository()
         self.mail_template_controller = MailTemplateController(
@@ -57,6 +66,7 @@ class BulkMailTestCase(BaseTestCase):
             mail_delivery_repository=self.mail_delivery_repository,
             mail_template_controller=self.mail_template_controller,
             bulk_mail_repository=self.bulk_mail_repository,
+            bulk_mail_recipient_repository=self.bulk_mail_recipient_repository,
         )
         super().instantiate_classes()
 
@@ -72,8 +82,26 @@ class BulkMailTestCase(BaseTestCase):
         )
         self.addCleanup(task.stop)
         self.celery_task = task.start()
+        retry_task = mock.patch(
+            "core.tasks.send_mail.retry_failed_recipients_task.apply_async",
+        )
+        self.addCleanup(retry_task.stop)
+        self.retry_celery_task = retry_task.start()
+        campaign_control = mock.patch.object(BulkMailController, "campaign_control")
+        self.addCleanup(campaign_control.stop)
+        self.campaign_control = campaign_control.start()
         super().setup_patches()
 
+    def create_failed_delivery(self, failed_recipients: int = 1):
+        return MailDeliveryModel.objects.create(
+            user_id=self.bulk_mail_model.user_id,
+            bulk_mail_id=self.bulk_mail_model.id,
+            status="partially_sent_to_provider",
+            total_recipients=failed_recipients + 1,
+            sent_recipients=1,
+            failed_recipients=failed_recipients,
+        )
+
     # noinspection PyMethodMayBeStatic
     def mock_decode_token(self, *args, **kwargs):
         return {"preferred_username": str(self.bulk_mail_model.id)}
@@ -1,15 +1,26 @@
 import uuid
+from datetime import timedelta
+from unittest import mock
 
-from django.test import tag
+import fakeredis
+import redis
+from django.db import IntegrityError, connection
+from django.test import override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.parsers import JSONParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.request import Request
 
+from app.bulk.controller import BulkMailController
+from app.bulk.models import BulkMailModel, BulkMailRecipientModel
 from app.bulk.serializer import (
     BulkMailResponseSerializer,
     BulkMailSerializer,
+    BulkMailUploadResponseSerializer,
 )
 from core.exceptions import AppException
+from core.services.campaign_control import CampaignControl
 
 from .base_test_case import BulkMailTestCase
 
@@ -28,6 +39,113 @@ class TestBulkMailController(BulkMailTestCase):
             len(results.data.get("results")), int(request.query_params.get("page_size"))
         )
 
+    def test_view_all_mails_counts_recipients(self):
+        for _ in range(3):
+            mail = BulkMailModel.objects.create(
+                **{**self.bulk_mail_test_data.existing_mail, "id": uuid.uuid4()}
+            )
+            BulkMailRecipientModel.objects.create(
+                bulk_mail=mail, address="example@test.com"
+            )
+        request = Request(
+            self.request_factory.get(
+                self.request_url, data={"page": 1, "page_size": 10}
+            )
+        )
+        # reminder: a page count, a page of mails and their delivery reports
+        with self.assertNumQueries(3):
+            results = self.bulk_mail_controller.view_all_mails(request)
+        self.assertEqual(len(results.data.get("results")), 4)
+        for mail in results.data.get("results"):
+            self.assertEqual(mail.get("total_recipients"), 1)
+            self.assertNotIn("recipients", mail)
+
+    def upload_request(self, file):
+        request = Request(
+            self.request_factory.post(
+                self.request_url,
+                self.bulk_mail_test_data.send_mail_with_upload(
+                    sender=self.mail_account_model.mail_address, file=file
+                ),
+                format="multipart",
+            ),
+            parsers=[MultiPartParser()],
+        )
+        request.user = self.mock_decode_token()
+        return request
+
+    def test_send_mail_with_upload(self):
+        request = self.upload_request(self.bulk_mail_test_data.recipients_file())
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.bulk_mail_controller.send_mail_with_upload(request)
+        self.assertIsInstance(result, BulkMailUploadResponseSerializer)
+        self.assertEqual(result.data.get("total_recipients"), 1)
+        self.assertEqual(result.data.get("invalid_recipients"), 1)
+        self.assertEqual(
+            BulkMailModel.objects.get(pk=result.data.get("id")).status, "active"
+        )
+        self.assertEqual(
+            list(
+                BulkMailRecipientModel.objects.filter(
+                    bulk_mail_id=result.data.get("id")
+                ).values_list("address", flat=True)
+            ),
+            ["user@example.com"],
+        )
+        self.celery_task.assert_called_once()
+
+    def test_send_mail_with_ndjson_upload(self):
+        request = self.upload_request(
+            self.bulk_mail_test_data.recipients_file(name="recipients.ndjson")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.bulk_mail_controller.send_mail_with_upload(request)
+        self.assertEqual(result.data.get("total_recipients"), 2)
+        self.assertEqual(result.data.get("invalid_recipients"), 1)
+
+    def test_send_mail_with_upload_no_valid_recipients_exc(self):
+        file = self.bulk_mail_test_data.recipients_file(content=b"email\ninvalid\n")
+        with self.assertRaises(AppException.ValidationException) as exception:
+            self.bulk_mail_controller.send_mail_with_upload(self.upload_request(file))
+        self.assertEqual(
+            exception.exception.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+        self.assertFalse(
+            BulkMailRecipientModel.objects.exclude(
+                bulk_mail=self.bulk_mail_model
+            ).exists()
+        )
+        self.celery_task.assert_not_called()
+
+    @override_settings(BULK_MAIL_RECIPIENT_CHUNK_SIZE=1)
+    def test_send_mail_with_upload_unreadable_file_exc(self):
+        for content in (
+            b"email\nuser@example.com\ncaf\xe9@example.com\n",
+            b"email\nuser@example.com\n" + b"a" * 200000 + b"\n",
+        ):
+            file = self.bulk_mail_test_data.recipients_file(content=content)
+            with self.assertRaises(AppException.ValidationException) as exception:
+                self.bulk_mail_controller.send_mail_with_upload(
+                    self.upload_request(file)
+                )
+            self.assertIn("file", exception.exception.error_message)
+        # reminder: the mail is deleted with the chunks committed before the error
+        self.assertEqual(BulkMailModel.objects.count(), 1)
+        self.assertFalse(
+            BulkMailRecipientModel.objects.exclude(
+                bulk_mail=self.bulk_mail_model
+            ).exists()
+        )
+        self.celery_task.assert_not_called()
+
+    def test_send_mail_with_upload_file_type_exc(self):
+        request = self.upload_request(
+            self.bulk_mail_test_data.recipients_file(name="recipients.txt")
+        )
+        with self.assertRaises(AppException.BadRequestException) as exception:
+            self.bulk_mail_controller.send_mail_with_upload(request)
+        self.assertEqual(exception.exception.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_get_mail(self):
         results = self.bulk_mail_controller.get_mail(self.bulk_mail_model.id)
         self.assertIsInstance(results, BulkMailSerializer)
@@ -51,9 +169,39 @@ class TestBulkMailController(BulkMailTestCase):
             parsers=[JSONParser()],
         )
         request.user = self.mock_decode_token()
-        result = self.bulk_mail_controller.send_mail(request=request)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.bulk_mail_controller.send_mail(request=request)
         self.assertIsInstance(result, BulkMailResponseSerializer)
         self.assertIsInstance(result.data, dict)
+        self.assertEqual(
+            list(
+                BulkMailRecipientModel.objects.filter(
+                    bulk_mail_id=result.data.get("id")
+                ).values_list("address", "status")
+            ),
+            [("example@test.com", "pending")],
+        )
+        self.celery_task.assert_called_once()
+
+    def test_send_mail_scheduled(self):
+        request = Request(
+            self.request_factory.post(
+                self.request_url,
+                {
+                    **self.bulk_mail_test_data.send_mail(
+                        self.mail_account_model.mail_address
+                    ),
+                    "scheduled_date": (timezone.now() + timedelta(hours=1)).isoformat(),
+                },
+                format=self.data_format,
+            ),
+            parsers=[JSONParser()],
+        )
+        request.user = self.mock_decode_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.bulk_mail_controller.send_mail(request=request)
+        self.assertTrue(BulkMailModel.objects.get(pk=result.data["id"]).is_scheduled)
+        self.celery_task.assert_not_called()
 
     def test_send_mail_invalid_data_exc(self):
         with self.assertRaises(AppException.ValidationException) as exception:
@@ -140,38 +288,292 @@ class TestBulkMailController(BulkMailTestCase):
         self.assertEqual(exception.exception.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIsNotNone(exception.exception.error_message)
 
-    def test_consumer_send_mail(self):
-        result = self.bulk_mail_controller.consumer_send_mail(
+    def test_consumer_send_mails(self):
+        objs_data = [
+            self.bulk_mail_test_data.consumer_send_mail(
+                self.mail_account_model.mail_address
+            ),
+            self.bulk_mail_test_data.consumer_send_mail(sender="invalid"),
+            self.bulk_mail_test_data.consumer_send_mail(sender="notfound@example.com"),
+            {
+                **self.bulk_mail_test_data.consumer_send_mail(
+                    self.mail_account_model.mail_address
+                ),
+                "recipients": ["first@test.com", "second@test.com", "first@test.com"],
+            },
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            results = self.bulk_mail_controller.consumer_send_mails(objs_data)
+        self.assertIsInstance(results[0], BulkMailResponseSerializer)
+        self.assertIsInstance(results[1], AppException.ValidationException)
+        self.assertIsInstance(results[2], AppException.NotFoundException)
+        self.assertIsInstance(results[3], BulkMailResponseSerializer)
+        self.assertEqual(
+            list(
+                BulkMailRecipientModel.objects.filter(
+                    bulk_mail_id=results[3].data.get("id")
+                ).values_list("address", flat=True)
+            ),
+            ["first@test.com", "second@test.com"],
+        )
+        self.assertEqual(
+            [
+                str(call.kwargs["kwargs"]["mail_record"].get("bulk_mail_id"))
+                for call in self.celery_task.call_args_list
+            ],
+            [results[0].data.get("id"), results[3].data.get("id")],
+        )
+
+    def test_consumer_send_mails_queries(self):
+        objs_data = [
             self.bulk_mail_test_data.consumer_send_mail(
                 self.mail_account_model.mail_address
             )
+            for _ in range(20)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            results = self.bulk_mail_controller.consumer_send_mails(objs_data)
+        self.assertEqual(len(results), 20)
+        # reminder: the batch is inserted in a savepoint, which takes two queries
+        self.assertLessEqual(len(queries), 8)
+
+    def test_consumer_send_mails_isolates_refused_mail(self):
+        objs_data = [
+            {
+                **self.bulk_mail_test_data.consumer_send_mail(
+                    self.mail_account_model.mail_address
+                ),
+                "subject": subject,
+            }
+            for subject in ("first", "refused", "last")
+        ]
+        bulk_create = self.bulk_mail_controller.bulk_mail_repository.bulk_create
+
+        def refuse(objs_data):
+            if any(data.get("subject") == "refused" for data in objs_data):
+                raise IntegrityError("refused")
+            return bulk_create(objs_data=objs_data)
+
+        with mock.patch.object(
+            self.bulk_mail_controller.bulk_mail_repository,
+            "bulk_create",
+            side_effect=refuse,
+        ), self.captureOnCommitCallbacks(execute=True):
+            results = self.bulk_mail_controller.consumer_send_mails(objs_data)
+        self.assertIsInstance(results[0], BulkMailResponseSerializer)
+        self.assertIsInstance(results[1], IntegrityError)
+        self.assertIsInstance(results[2], BulkMailResponseSerializer)
+        self.assertFalse(BulkMailModel.objects.filter(subject="refused").exists())
+        self.assertEqual(self.celery_task.call_count, 2)
+
+    def test_retry_mail(self):
+        mail_delivery = self.create_failed_delivery()
+        result = self.bulk_mail_controller.retry_mail(obj_id=self.bulk_mail_model.id)
+        self.assertIsInstance(result, BulkMailResponseSerializer)
+        self.assertTrue(result.data.get("is_success"))
+        self.retry_celery_task.assert_called_once()
+        self.assertEqual(
+            self.retry_celery_task.call_args.kwargs["kwargs"]["mail_record"].get(
+                "delivery_id"
+            ),
+            mail_delivery.id,
         )
+
+    def test_retry_mail_completed(self):
+        self.create_failed_delivery()
+        self.bulk_mail_model.status = "completed"
+        self.bulk_mail_model.save()
+        self.bulk_mail_controller.retry_mail(obj_id=self.bulk_mail_model.id)
+        self.retry_celery_task.assert_called_once()
+
+    def test_retry_mail_no_failed_recipients_exc(self):
+        self.create_failed_delivery(failed_recipients=0)
+        with self.assertRaises(AppException.BadRequestException) as exception:
+            self.bulk_mail_controller.retry_mail(obj_id=self.bulk_mail_model.id)
+        self.assertEqual(exception.exception.status_code, status.HTTP_400_BAD_REQUEST)
+        self.retry_celery_task.assert_not_called()
+
+    def test_retry_mail_paused_exc(self):
+        self.create_failed_delivery()
+        self.bulk_mail_model.status = "paused"
+        self.bulk_mail_model.save()
+        with self.assertRaises(AppException.BadRequestException) as exception:
+            self.bulk_mail_controller.retry_mail(obj_id=self.bulk_mail_model.id)
+        self.assertEqual(exception.exception.status_code, status.HTTP_400_BAD_REQUEST)
+        self.retry_celery_task.assert_not_called()
+
+    def test_pause_mail(self):
+        result = self.bulk_mail_controller.pause_mail(obj_id=self.bulk_mail_model.id)
         self.assertIsInstance(result, BulkMailResponseSerializer)
-        self.assertIsInstance(result.data, dict)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertEqual(self.bulk_mail_model.status, "paused")
+        self.campaign_control.set_state.assert_called_once_with(
+            bulk_mail_id=self.bulk_mail_model.id, state="paused"
+        )
 
-    def test_consumer_send_mail_invalid_data_exc(self):
-        with self.assertRaises(AppException.ValidationException) as exception:
-            self.bulk_mail_controller.consumer_send_mail(
-                self.bulk_mail_test_data.send_mail(sender="invalid")
+    def test_pause_mail_cancelled_exc(self):
+        self.bulk_mail_model.status = "cancelled"
+        self.bulk_mail_model.save()
+        with self.assertRaises(AppException.BadRequestException) as exception:
+            self.bulk_mail_controller.pause_mail(obj_id=self.bulk_mail_model.id)
+        self.assertEqual(exception.exception.status_code, status.HTTP_400_BAD_REQUEST)
+        self.campaign_control.set_state.assert_not_called()
+
+    def test_pause_mail_completed_exc(self):
+        self.bulk_mail_model.status = "completed"
+        self.bulk_mail_model.save()
+        with self.assertRaises(AppException.BadRequestException) as exception:
+            self.bulk_mail_controller.pause_mail(obj_id=self.bulk_mail_model.id)
+        self.assertEqual(exception.exception.status_code, status.HTTP_400_BAD_REQUEST)
+        self.campaign_control.set_state.assert_not_called()
+
+    def test_pause_mail_redis_exc(self):
+        self.campaign_control.set_state.side_effect = redis.RedisError("down")
+        with self.assertRaises(AppException.InternalServerException):
+            self.bulk_mail_controller.pause_mail(obj_id=self.bulk_mail_model.id)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertEqual(self.bulk_mail_model.status, "active")
+
+    def test_resume_mail(self):
+        mail_delivery = self.create_failed_delivery()
+        self.bulk_mail_model.status = "paused"
+        self.bulk_mail_model.is_scheduled = False
+        self.bulk_mail_model.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.bulk_mail_controller.resume_mail(
+                obj_id=self.bulk_mail_model.id
             )
-        self.assertEqual(
-            exception.exception.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        self.assertIsInstance(result, BulkMailResponseSerializer)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertEqual(self.bulk_mail_model.status, "active")
+        mail_record = self.celery_task.call_args.kwargs["kwargs"]["mail_record"]
+        self.assertEqual(mail_record.get("delivery_id"), mail_delivery.id)
+        self.campaign_control.set_state.assert_called_once_with(
+            bulk_mail_id=self.bulk_mail_model.id, state=mail_record.get("run")
         )
-        self.assertIsNotNone(exception.exception.error_message)
 
-    def test_consumer_send_mail_sender_notfound_exc(self):
-        with self.assertRaises(AppException.NotFoundException) as exception:
-            self.bulk_mail_controller.consumer_send_mail(
-                self.bulk_mail_test_data.consumer_send_mail(
-                    sender="notfound@example.com"
-                )
+    def test_resume_mail_scheduled(self):
+        self.schedule_mail(scheduled_date=timezone.now() + timedelta(hours=1))
+        campaign_control = CampaignControl(client=fakeredis.FakeRedis())
+        with mock.patch.object(
+            BulkMailController, "campaign_control", campaign_control
+        ):
+            self.bulk_mail_controller.pause_mail(obj_id=self.bulk_mail_model.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.bulk_mail_controller.resume_mail(obj_id=self.bulk_mail_model.id)
+            self.bulk_mail_model.refresh_from_db()
+            self.assertEqual(self.bulk_mail_model.status, "active")
+            self.celery_task.assert_not_called()
+            BulkMailModel.objects.filter(pk=self.bulk_mail_model.id).update(
+                scheduled_date=timezone.now() - timedelta(minutes=1)
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                self.bulk_mail_controller.dispatch_scheduled_mails()
+        mail_record = self.celery_task.call_args.kwargs["kwargs"]["mail_record"]
+        # reminder: the dispatched task is the first run of the mail
+        self.assertFalse(
+            campaign_control.is_stopped(
+                bulk_mail_id=self.bulk_mail_model.id, run=mail_record.get("run")
             )
+        )
+
+    def test_resume_mail_active_exc(self):
+        self.create_failed_delivery()
+        with self.assertRaises(AppException.BadRequestException) as exception:
+            self.bulk_mail_controller.resume_mail(obj_id=self.bulk_mail_model.id)
+        self.assertEqual(exception.exception.status_code, status.HTTP_400_BAD_REQUEST)
+        self.celery_task.assert_not_called()
+
+    def test_cancel_mail(self):
+        result = self.bulk_mail_controller.cancel_mail(obj_id=self.bulk_mail_model.id)
+        self.assertIsInstance(result, BulkMailResponseSerializer)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertEqual(self.bulk_mail_model.status, "cancelled")
+        self.campaign_control.set_state.assert_called_once_with(
+            bulk_mail_id=self.bulk_mail_model.id, state="cancelled"
+        )
+
+    def test_cancel_mail_scheduled(self):
+        self.bulk_mail_model.is_scheduled = True
+        self.bulk_mail_model.save()
+        self.bulk_mail_controller.cancel_mail(obj_id=self.bulk_mail_model.id)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertFalse(self.bulk_mail_model.is_scheduled)
+
+    def test_cancel_mail_not_found_exc(self):
+        with self.assertRaises(AppException.NotFoundException) as exception:
+            self.bulk_mail_controller.cancel_mail(obj_id=uuid.uuid4())
         self.assertEqual(exception.exception.status_code, status.HTTP_404_NOT_FOUND)
-        self.assertIsNotNone(exception.exception.error_message)
+
+    def test_retry_mail_not_found_exc(self):
+        with self.assertRaises(AppException.NotFoundException) as exception:
+            self.bulk_mail_controller.retry_mail(obj_id=uuid.uuid4())
+        self.assertEqual(exception.exception.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_dispatch_scheduled_mails(self):
+        mail_delivery = self.schedule_mail(
+            scheduled_date=timezone.now() - timedelta(minutes=1)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.bulk_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(result, 1)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertFalse(self.bulk_mail_model.is_scheduled)
+        mail_record = self.celery_task.call_args.kwargs["kwargs"]["mail_record"]
+        self.assertEqual(mail_record.get("bulk_mail_id"), self.bulk_mail_model.id)
+        self.assertEqual(mail_record.get("delivery_id"), mail_delivery.id)
+
+    def test_dispatch_scheduled_mails_not_due(self):
+        self.schedule_mail(scheduled_date=timezone.now() + timedelta(hours=1))
+        result = self.bulk_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(result, 0)
+        self.celery_task.assert_not_called()
+
+    def test_dispatch_scheduled_mails_paused(self):
+        self.schedule_mail(scheduled_date=timezone.now() - timedelta(minutes=1))
+        self.bulk_mail_model.status = "paused"
+        self.bulk_mail_model.save()
+        result = self.bulk_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(result, 0)
+        self.bulk_mail_model.refresh_from_db()
+        self.assertTrue(self.bulk_mail_model.is_scheduled)
+        self.celery_task.assert_not_called()
+
+    def test_dispatch_scheduled_mails_celery_exc(self):
+        self.schedule_mail(scheduled_date=timezone.now() - timedelta(minutes=1))
+        self.celery_task.side_effect = self.celery_exc
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk_mail_controller.dispatch_scheduled_mails()
+        self.bulk_mail_model.refresh_from_db()
+        self.assertTrue(self.bulk_mail_model.is_scheduled)
+
+    def test_dispatch_scheduled_mails_queued_on_commit(self):
+        self.schedule_mail(scheduled_date=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.bulk_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(len(callbacks), 1)
+        self.celery_task.assert_not_called()
+
+    def test_queue_scheduled_mails_celery_exc(self):
+        self.celery_task.side_effect = self.celery_exc
+        refused = []
+        self.bulk_mail_controller.queue_scheduled_mails(
+            objs_data=[{"mail_id": self.bulk_mail_model.id}], refused=refused
+        )
+        self.assertEqual(refused, [self.bulk_mail_model.id])
+
+    def schedule_mail(self, scheduled_date):
+        self.bulk_mail_model.is_scheduled = True
+        self.bulk_mail_model.scheduled_date = scheduled_date
+        self.bulk_mail_model.save()
+        return self.create_failed_delivery(failed_recipients=0)
 
     def test_delete_mail(self):
         result = self.bulk_mail_controller.delete_mail(obj_id=self.bulk_mail_model.id)
         self.assertIsNone(result)
+        self.assertEqual(
+            self.campaign_control.set_state.call_args.kwargs["state"], "cancelled"
+        )
 
     def test_bulk_mail_notfound_exc(self):
         with self.assertRaises(AppException.NotFoundException) as exception:
@@ -184,6 +586,37 @@ class TestBulkMailController(BulkMailTestCase):
             obj_data=self.bulk_mail_test_data.mail_task
         )
         self.assertIsNone(result)
+        self.assertEqual(
+            self.celery_task.call_args.kwargs["kwargs"],
+            {
+                "mail_record": {
+                    "delivery_id": "report_id",
+                    "bulk_mail_id": "single_mail_id",
+                }
+            },
+        )
+
+    def test_create_tasks_logs_every_publish_error(self):
+        self.celery_task.side_effect = [RuntimeError("publish"), None]
+        result = self.bulk_mail_controller.create_tasks(
+            objs_data=[self.bulk_mail_test_data.mail_task] * 2
+        )
+        self.assertIsNone(result)
+        self.assertEqual(self.celery_task.call_count, 2)
+
+    @override_settings(BULK_MAIL_CHUNK_SIZE=1)
+    def test_create_task_in_chunks(self):
+        with mock.patch("app.bulk.controller.chord") as chord:
+            result = self.bulk_mail_controller.create_task(
+                obj_data={
+                    **self.bulk_mail_test_data.mail_task,
+                    "recipient_count": 2,
+                }
+            )
+        self.assertIsNone(result)
+        chord.assert_called_once()
+        self.assertEqual(len(chord.call_args.args[0].tasks), 2)
+        self.celery_task.assert_not_called()
 
     def test_create_task_celery_exc(self):
         with self.assertRaises(AppException.InternalServerException) as exception:
@@ -1,3 +1,6 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+
 class BulkMailTestData:
     @property
     def existing_mail(self):
@@ -6,13 +9,16 @@ class BulkMailTestData:
             "user_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
             "sender": "user@example.com",
             "name": "string",
-            "recipients": ["example@test.com"],
             "subject": "string",
             "html_body": "string",
             "text_body": "string",
             "is_scheduled": True,
         }
 
+    @property
+    def existing_recipients(self):
+        return ["example@test.com"]
+
     def send_mail(self, sender):
         return {
             "sender": sender,
@@ -34,6 +40,27 @@ class BulkMailTestData:
             "text_body": "string",
         }
 
+    def send_mail_with_upload(self, sender, file):
+        return {
+            "sender": sender,
+            "name": "string",
+            "subject": "string",
+            "html_body": "string",
+            "text_body": "string",
+            "file": file,
+        }
+
+    # noinspection PyMethodMayBeStatic
+    def recipients_file(self, name="recipients.csv", content=None):
+        if content is None and name.endswith(".csv"):
+            content = b"email,name\nuser@example.com,a\nuser@EXAMPLE.com,b\ninvalid,c\n"
+        elif content is None:
+            content = (
+                b'"user@example.com"\n{"email": "test@example.com"}\n'
+                b'{"email": "user@example.com"}\n{"email": 1}\n'
+            )
+        return SimpleUploadedFile(name=name, content=content)
+
     def send_email_with_template(self, sender, template_id):
         return {
             "sender": sender,
@@ -49,7 +76,7 @@ class BulkMailTestData:
             "sender": "example@test.com",
             "sender_name": "example",
             "password": "password",
-            "recipients": ["test@example.com"],
+            "recipient_count": 1,
             "subject": "testing",
             "html_body": "html",
             "text_body": "",
@@ -1,6 +1,6 @@
 from django.test import tag
 
-from app.bulk.models import BulkMailModel
+from app.bulk.models import BulkMailModel, BulkMailRecipientModel
 
 from .base_test_case import BulkMailTestCase
 
@@ -27,3 +27,14 @@ class TestBulkMailModel(BulkMailTestCase):
         self.assertTrue(hasattr(mail, "updated_by"))
         self.assertTrue(hasattr(mail, "deleted_at"))
         self.assertTrue(hasattr(mail, "deleted_by"))
+
+    def test_bulk_mail_recipient_model(self):
+        recipient = BulkMailRecipientModel.objects.get(bulk_mail=self.bulk_mail_model)
+        self.assertTrue(hasattr(recipient, "id"))
+        self.assertTrue(hasattr(recipient, "bulk_mail"))
+        self.assertTrue(hasattr(recipient, "address"))
+        self.assertEqual(recipient.status, "pending")
+        self.assertEqual(
+            self.bulk_mail_model.recipients,
+            self.bulk_mail_test_data.existing_recipients,
+        )
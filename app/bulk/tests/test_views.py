@@ -112,6 +112,82 @@ class TestBulkMailView(BulkMailTestCase):
         self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
         self.assertIsInstance(response_data, dict)
 
+    def test_send_mail_with_upload(self):
+        self.jwt_decode.return_value = self.mock_decode_token()
+        response = self.client.post(
+            reverse("send_upload_bulk_mail"),
+            self.bulk_mail_test_data.send_mail_with_upload(
+                sender=self.mail_account_model.mail_address,
+                file=self.bulk_mail_test_data.recipients_file(),
+            ),
+            format="multipart",
+            headers=self.headers,
+        )
+        response_data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response_data.get("total_recipients"), 1)
+
+    def test_retry_mail(self):
+        self.jwt_decode.return_value = self.mock_decode_token()
+        self.create_failed_delivery()
+        response = self.client.post(
+            reverse("retry_bulk_mail", kwargs={"mail_id": self.bulk_mail_model.id}),
+            format=self.data_format,
+            headers=self.headers,
+        )
+        response_data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response_data, dict)
+
+    def test_pause_mail(self):
+        self.jwt_decode.return_value = self.mock_decode_token()
+        response = self.client.post(
+            reverse("pause_bulk_mail", kwargs={"mail_id": self.bulk_mail_model.id}),
+            format=self.data_format,
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json().get("is_success"))
+
+    def test_resume_mail(self):
+        self.jwt_decode.return_value = self.mock_decode_token()
+        self.create_failed_delivery()
+        self.bulk_mail_model.status = "paused"
+        self.bulk_mail_model.save()
+        response = self.client.post(
+            reverse("resume_bulk_mail", kwargs={"mail_id": self.bulk_mail_model.id}),
+            format=self.data_format,
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json().get("is_success"))
+
+    def test_cancel_mail(self):
+        self.jwt_decode.return_value = self.mock_decode_token()
+        response = self.client.post(
+            reverse("cancel_bulk_mail", kwargs={"mail_id": self.bulk_mail_model.id}),
+            format=self.data_format,
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json().get("is_success"))
+
+    def test_cancel_mail_unauthorized_exc(self):
+        response = self.client.post(
+            reverse("cancel_bulk_mail", kwargs={"mail_id": self.bulk_mail_model.id}),
+            format=self.data_format,
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_retry_mail_unauthorized_exc(self):
+        response = self.client.post(
+            reverse("retry_bulk_mail", kwargs={"mail_id": self.bulk_mail_model.id}),
+            format=self.data_format,
+        )
+        response_data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsInstance(response_data, dict)
+
     def test_delete_mail(self):
         self.jwt_decode.return_value = self.mock_decode_token()
         response = self.client.delete(
@@ -8,6 +8,11 @@ urlpatterns = [
     path(
         "send/template/", views.send_mail_with_template, name="send_template_bulk_mail"
     ),
+    path("send/upload/", views.send_mail_with_upload, name="send_upload_bulk_mail"),
     path("<uuid:mail_id>/detail/", views.get_mail, name="get_bulk_mail"),
+    path("<uuid:mail_id>/retry/", views.retry_mail, name="retry_bulk_mail"),
+    path("<uuid:mail_id>/pause/", views.pause_mail, name="pause_bulk_mail"),
+    path("<uuid:mail_id>/resume/", views.resume_mail, name="resume_bulk_mail"),
+    path("<uuid:mail_id>/cancel/", views.cancel_mail, name="cancel_bulk_mail"),
     path("<uuid:mail_id>/delete/", views.delete_mail, name="delete_bulk_mail"),
 ]
@@ -2,7 +2,8 @@ import uuid
 
 import pinject
 from drf_spectacular.utils import extend_schema
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.request import Request
 from rest_framework.response import Response
 
@@ -13,10 +14,11 @@ from app.template.repository import MailTemplateRepository
 from core.utils import api_responses
 
 from .controller import BulkMailController
-from .repository import BulkMailRepository
+from .repository import BulkMailRecipientRepository, BulkMailRepository
 from .serializer import (
     BulkMailResponseSerializer,
     BulkMailSerializer,
+    BulkMailUploadResponseSerializer,
     PaginatedBulkMailSerializer,
     QueryBulkMailSerializer,
     SendBulkMailSerializer,
@@ -28,6 +30,7 @@ obj_graph = pinject.new_object_graph(
     classes=[
         BulkMailController,
         BulkMailRepository,
+        BulkMailRecipientRepository,
         MailAccountRepository,
         MailDeliveryRepository,
         MailTemplateController,
@@ -76,6 +79,34 @@ def send_mail_with_template(request: Request):
     return Response(data=serializer.data, status=201)
 
 
+@extend_schema(
+    request={
+        "multipart/form-data": {
+            "type": "object",
+            "properties": {
+                "sender": {"type": "string", "format": "email"},
+                "name": {"type": "string"},
+                "subject": {"type": "string"},
+                "html_body": {"type": "string"},
+                "text_body": {"type": "string"},
+                "file": {"type": "string", "format": "binary"},
+            },
+            "required": ["sender", "subject", "html_body", "file"],
+        }
+    },
+    responses=api_responses(
+        status_codes=[201, 400, 401, 404, 422],
+        schema=BulkMailUploadResponseSerializer,
+    ),
+    tags=api_doc_tag,
+)
+@api_view(http_method_names=["POST"])
+@parser_classes([MultiPartParser, FormParser])
+def send_mail_with_upload(request: Request):
+    serializer = bulk_mail_controller.send_mail_with_upload(request)
+    return Response(data=serializer.data, status=201)
+
+
 @extend_schema(
     responses=api_responses(status_codes=[200, 401, 404], schema=BulkMailSerializer),
     tags=api_doc_tag,
@@ -86,6 +117,58 @@ def get_mail(request: Request, mail_id: uuid.UUID):
     return Response(data=serializer.data, status=200)
 
 
+@extend_schema(
+    request=None,
+    responses=api_responses(
+        status_codes=[201, 400, 401, 404], schema=BulkMailResponseSerializer
+    ),
+    tags=api_doc_tag,
+)
+@api_view(http_method_names=["POST"])
+def retry_mail(request: Request, mail_id: uuid.UUID):
+    serializer = bulk_mail_controller.retry_mail(str(mail_id))
+    return Response(data=serializer.data, status=201)
+
+
+@extend_schema(
+    request=None,
+    responses=api_responses(
+        status_codes=[200, 400, 401, 404], schema=BulkMailResponseSerializer
+    ),
+    tags=api_doc_tag,
+)
+@api_view(http_method_names=["POST"])
+def pause_mail(request: Request, mail_id: uuid.UUID):
+    serializer = bulk_mail_controller.pause_mail(str(mail_id))
+    return Response(data=serializer.data, status=200)
+
+
+@extend_schema(
+    request=None,
+    responses=api_responses(
+        status_codes=[200, 400, 401, 404], schema=BulkMailResponseSerializer
+    ),
+    tags=api_doc_tag,
+)
+@api_view(http_method_names=["POST"])
+def resume_mail(request: Request, mail_id: uuid.UUID):
+    serializer = bulk_mail_controller.resume_mail(str(mail_id))
+    return Response(data=serializer.data, status=200)
+
+
+@extend_schema(
+    request=None,
+    responses=api_responses(
+        status_codes=[200, 400, 401, 404], schema=BulkMailResponseSerializer
+    ),
+    tags=api_doc_tag,
+)
+@api_view(http_method_names=["POST"])
+def cancel_mail(request: Request, mail_id: uuid.UUID):
+    serializer = bulk_mail_controller.cancel_mail(str(mail_id))
+    return Response(data=serializer.data, status=200)
+
+
 @extend_schema(
     responses=api_responses(status_codes=[204, 401, 404], schema=None),
     tags=api_doc_tag,
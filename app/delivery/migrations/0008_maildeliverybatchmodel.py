@@ -0,0 +1,60 @@
+# Generated by Django 5.1 on 2026-10-18 15:14
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("delivery", "0007_alter_maildeliverymodel_bulk_mail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="maildeliverymodel",
+            name="failed_recipients",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="maildeliverymodel",
+            name="sent_recipients",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="MailDeliveryBatchModel",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("created_by", models.CharField(null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("updated_by", models.CharField(null=True)),
+                ("is_deleted", models.BooleanField(default=False)),
+                ("deleted_at", models.DateTimeField(null=True)),
+                ("deleted_by", models.CharField(null=True)),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, primary_key=True, serialize=False
+                    ),
+                ),
+                ("status", models.CharField()),
+                ("total_recipients", models.IntegerField(default=0)),
+                ("sent_recipients", models.IntegerField(default=0)),
+                ("failures", models.JSONField(null=True)),
+                ("date_sent", models.DateTimeField(null=True)),
+                (
+                    "delivery",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="batches",
+                        to="delivery.maildeliverymodel",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "delivery_batches",
+                "ordering": ["created_at"],
+            },
+        ),
+    ]
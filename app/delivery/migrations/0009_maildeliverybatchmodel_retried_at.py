@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("delivery", "0008_maildeliverybatchmodel"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="maildeliverybatchmodel",
+            name="retried_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -35,6 +35,8 @@ class MailDeliveryModel(BaseModel):
     provider = models.CharField(null=True)
     status = models.CharField(null=False)
     total_recipients = models.IntegerField(null=False, default=0)
+    sent_recipients = models.IntegerField(null=False, default=0)
+    failed_recipients = models.IntegerField(null=False, default=0)
     comment = models.JSONField(null=True)
 
     class Meta:
@@ -46,3 +48,36 @@ class MailDeliveryModel(BaseModel):
 
     def __repr__(self):
         return self.provider
+
+
+class MailDeliveryBatchModel(BaseModel):
+    """
+    A Django model representing the delivery of one smtp batch of a mail. Every batch
+    is recorded in the ledger table 'delivery_batches' while its counts are rolled up
+    onto the delivery report, with the recipients that were not sent kept in failures
+    until they are retried.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    delivery = models.ForeignKey(
+        to=MailDeliveryModel,
+        on_delete=models.CASCADE,
+        db_index=True,
+        related_name="batches",
+    )
+    status = models.CharField(null=False)
+    total_recipients = models.IntegerField(null=False, default=0)
+    sent_recipients = models.IntegerField(null=False, default=0)
+    failures = models.JSONField(null=True)
+    date_sent = models.DateTimeField(null=True)
+    retried_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = "delivery_batches"
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return self.status
+
+    def __repr__(self):
+        return self.status
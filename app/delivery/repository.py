@@ -1,6 +1,14 @@
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import Exact, GreaterThan
+
+from core.exceptions import AppException
 from core.repository import SqlBaseRepository
+from core.utils.constants import MailDeliveryStatusEnum
 
-from .models import MailDeliveryModel
+from .models import MailDeliveryBatchModel, MailDeliveryModel
 
 
 class MailDeliveryRepository(SqlBaseRepository):
@@ -12,3 +20,81 @@ class MailDeliveryRepository(SqlBaseRepository):
 
     model = MailDeliveryModel
     object_name = "delivery_report"
+
+    def rollup_by_id(
+        self, obj_id: str, recipients: int, sent_recipients: int, obj_data: dict
+    ):
+        """
+        add the counts of newly delivered batches to a delivery report and derive its
+        status from the running totals, in a single UPDATE that concurrent senders of
+        the same mail can issue without overwriting each other
+        :param obj_id: id of the delivery report
+        :param recipients: number of recipients in the new batches
+        :param sent_recipients: number of those recipients accepted by the provider
+        :param obj_data: {dict} other fields of the delivery report to update
+        """
+        total = F("total_recipients") + recipients
+        sent = F("sent_recipients") + sent_recipients
+        updated = self.model.objects.filter(pk=obj_id).update(
+            **obj_data,
+            total_recipients=total,
+            sent_recipients=sent,
+            failed_recipients=F("failed_recipients") + recipients - sent_recipients,
+            status=Case(
+                When(
+                    Exact(sent, total),
+                    then=Value(MailDeliveryStatusEnum.sent_to_provider.value),
+                ),
+                When(
+                    GreaterThan(sent, 0),
+                    then=Value(MailDeliveryStatusEnum.partially_sent_to_provider.value),
+                ),
+                default=Value(MailDeliveryStatusEnum.not_sent_to_provider.value),
+            ),
+        )
+        if not updated:
+            raise AppException.NotFoundException(
+                error_message=f"{self.object_name}({obj_id}) does not exist"
+            )
+        return updated
+
+
+class MailDeliveryBatchRepository(SqlBaseRepository):
+    """
+    A repository class for handling operations related to the delivery of the smtp
+    batches of a mail. This class extends `SqlBaseRepository` and specifies the model
+    as `MailDeliveryBatchModel` with the object name 'delivery_batch'.
+    """
+
+    model = MailDeliveryBatchModel
+    object_name = "delivery_batch"
+
+    def claim_failures(self, delivery_id: str):
+        """
+        mark the batches of a delivery with recipients that were not sent as retried
+        and return them, so concurrent retries of the same delivery never resend the
+        same recipients twice
+        :param delivery_id: id of the delivery report
+        """
+        with transaction.atomic():
+            batches = list(
+                self.model.objects.select_for_update(skip_locked=True).filter(
+                    delivery_id=delivery_id,
+                    failures__isnull=False,
+                    retried_at__isnull=True,
+                )
+            )
+            self.model.objects.filter(pk__in=[batch.id for batch in batches]).update(
+                retried_at=datetime.now(timezone.utc)
+            )
+        return batches
+
+    def release_failures(self, batch_ids: list):
+        """
+        undo the claim of batches whose retry could not be recorded, so the next retry
+        of the delivery claims them again
+        :param batch_ids: ids of the batches returned by claim_failures
+        """
+        return self.update_all(
+            filter_param={"pk__in": batch_ids}, obj_data={"retried_at": None}
+        )
@@ -7,4 +7,6 @@ class MailDeliverySerializer(serializers.Serializer):
     provider = serializers.CharField(required=True)
     status = serializers.CharField(required=True)
     total_recipients = serializers.IntegerField(required=True)
+    sent_recipients = serializers.IntegerField(required=True)
+    failed_recipients = serializers.IntegerField(required=True)
     comment = serializers.CharField(required=False)
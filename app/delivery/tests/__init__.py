@@ -0,0 +1 @@
+from .test_data import MailDeliveryTestData
@@ -0,0 +1,30 @@
+from app.delivery.models import (
+    MailDeliveryBatchModel,
+    MailDeliveryModel,
+)
+from app.delivery.repository import (
+    MailDeliveryBatchRepository,
+    MailDeliveryRepository,
+)
+from tests import BaseTestCase
+
+from .test_data import MailDeliveryTestData
+
+
+class MailDeliveryTestCase(BaseTestCase):
+    def setup_test_data(self):
+        self.mail_delivery_test_data = MailDeliveryTestData()
+        self.mail_delivery_model = MailDeliveryModel.objects.create(
+            **self.mail_delivery_test_data.existing_delivery
+        )
+        self.mail_delivery_batch_model = MailDeliveryBatchModel.objects.create(
+            delivery=self.mail_delivery_model,
+            **self.mail_delivery_test_data.existing_batch,
+        )
+        super().setup_test_data()
+
+    def instantiate_classes(self):
+        """This is where all classes are instantiated for the test"""
+        self.mail_delivery_repository = MailDeliveryRepository()
+        self.mail_delivery_batch_repository = MailDeliveryBatchRepository()
+        super().instantiate_classes()
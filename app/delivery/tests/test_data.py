@@ -0,0 +1,35 @@
+class MailDeliveryTestData:
+    @property
+    def existing_delivery(self):
+        return {
+            "id": "6d1f3c8e-3b4a-4f0e-9a55-0c1f8f3e2b71",
+            "user_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+            "status": "sent_to_provider",
+        }
+
+    @property
+    def existing_batch(self):
+        return {
+            "status": "partially_sent_to_provider",
+            "total_recipients": 2,
+            "sent_recipients": 1,
+            "failures": {"failed@example.com": "550 No such user"},
+        }
+
+    # noinspection PyMethodMayBeStatic
+    def batches(self, delivery_id):
+        return [
+            {
+                "delivery_id": delivery_id,
+                "status": "sent_to_provider",
+                "total_recipients": 2,
+                "sent_recipients": 2,
+            },
+            {
+                "delivery_id": delivery_id,
+                "status": "not_sent_to_provider",
+                "total_recipients": 1,
+                "sent_recipients": 0,
+                "failures": {"failed@example.com": "550 No such user"},
+            },
+        ]
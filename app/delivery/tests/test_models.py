@@ -0,0 +1,46 @@
+from django.test import tag
+
+from app.delivery.models import (
+    MailDeliveryBatchModel,
+    MailDeliveryModel,
+)
+
+from .base_test_case import MailDeliveryTestCase
+
+
+@tag("app.delivery.model")
+class TestMailDeliveryModel(MailDeliveryTestCase):
+    def test_mail_delivery_model(self):
+        self.assertEqual(MailDeliveryModel.objects.count(), 1)
+        delivery = MailDeliveryModel.objects.get(pk=self.mail_delivery_model.id)
+        self.assertIsInstance(delivery, MailDeliveryModel)
+        self.assertTrue(hasattr(delivery, "id"))
+        self.assertTrue(hasattr(delivery, "user_id"))
+        self.assertTrue(hasattr(delivery, "single_mail"))
+        self.assertTrue(hasattr(delivery, "bulk_mail"))
+        self.assertTrue(hasattr(delivery, "provider"))
+        self.assertTrue(hasattr(delivery, "status"))
+        self.assertTrue(hasattr(delivery, "total_recipients"))
+        self.assertTrue(hasattr(delivery, "sent_recipients"))
+        self.assertTrue(hasattr(delivery, "failed_recipients"))
+        self.assertTrue(hasattr(delivery, "comment"))
+
+    def test_mail_delivery_batch_model(self):
+        self.assertEqual(MailDeliveryBatchModel.objects.count(), 1)
+        batch = MailDeliveryBatchModel.objects.get(pk=self.mail_delivery_batch_model.id)
+        self.assertIsInstance(batch, MailDeliveryBatchModel)
+        self.assertTrue(hasattr(batch, "id"))
+        self.assertTrue(hasattr(batch, "delivery"))
+        self.assertTrue(hasattr(batch, "status"))
+        self.assertTrue(hasattr(batch, "total_recipients"))
+        self.assertTrue(hasattr(batch, "sent_recipients"))
+        self.assertTrue(hasattr(batch, "failures"))
+        self.assertTrue(hasattr(batch, "date_sent"))
+        self.assertTrue(hasattr(batch, "retried_at"))
+        self.assertIsNone(batch.retried_at)
+        self.assertEqual(
+            list(self.mail_delivery_model.batches.all()),
+            [self.mail_delivery_batch_model],
+        )
+        self.mail_delivery_model.delete()
+        self.assertEqual(MailDeliveryBatchModel.objects.count(), 0)
@@ -0,0 +1,114 @@
+from django.test import tag
+
+from app.delivery.models import MailDeliveryBatchModel
+from core.exceptions import AppException
+from core.utils.constants import MailDeliveryStatusEnum
+
+from .base_test_case import MailDeliveryTestCase
+
+
+@tag("app.delivery.repository")
+class TestMailDeliveryRepository(MailDeliveryTestCase):
+    def test_rollup_by_id(self):
+        self.mail_delivery_repository.rollup_by_id(
+            obj_id=self.mail_delivery_model.id,
+            recipients=10,
+            sent_recipients=10,
+            obj_data={"provider": "QuantumMailServer"},
+        )
+        self.mail_delivery_model.refresh_from_db()
+        self.assertEqual(self.mail_delivery_model.total_recipients, 10)
+        self.assertEqual(self.mail_delivery_model.sent_recipients, 10)
+        self.assertEqual(self.mail_delivery_model.failed_recipients, 0)
+        self.assertEqual(self.mail_delivery_model.provider, "QuantumMailServer")
+        self.assertEqual(
+            self.mail_delivery_model.status,
+            MailDeliveryStatusEnum.sent_to_provider.value,
+        )
+        self.mail_delivery_repository.rollup_by_id(
+            obj_id=self.mail_delivery_model.id,
+            recipients=5,
+            sent_recipients=0,
+            obj_data={},
+        )
+        self.mail_delivery_model.refresh_from_db()
+        self.assertEqual(self.mail_delivery_model.total_recipients, 15)
+        self.assertEqual(self.mail_delivery_model.sent_recipients, 10)
+        self.assertEqual(self.mail_delivery_model.failed_recipients, 5)
+        self.assertEqual(
+            self.mail_delivery_model.status,
+            MailDeliveryStatusEnum.partially_sent_to_provider.value,
+        )
+
+    def test_rollup_by_id_retried_recipients(self):
+        self.mail_delivery_repository.rollup_by_id(
+            obj_id=self.mail_delivery_model.id,
+            recipients=2,
+            sent_recipients=0,
+            obj_data={},
+        )
+        self.mail_delivery_repository.rollup_by_id(
+            obj_id=self.mail_delivery_model.id,
+            recipients=0,
+            sent_recipients=2,
+            obj_data={},
+        )
+        self.mail_delivery_model.refresh_from_db()
+        self.assertEqual(self.mail_delivery_model.failed_recipients, 0)
+        self.assertEqual(
+            self.mail_delivery_model.status,
+            MailDeliveryStatusEnum.sent_to_provider.value,
+        )
+
+    def test_rollup_by_id_not_found(self):
+        with self.assertRaises(AppException.NotFoundException):
+            self.mail_delivery_repository.rollup_by_id(
+                obj_id="1b4e28ba-2fa1-11d2-883f-0016d3cca427",
+                recipients=1,
+                sent_recipients=1,
+                obj_data={},
+            )
+
+
+@tag("app.delivery.repository")
+class TestMailDeliveryBatchRepository(MailDeliveryTestCase):
+    def test_bulk_create(self):
+        batches = self.mail_delivery_batch_repository.bulk_create(
+            objs_data=self.mail_delivery_test_data.batches(
+                delivery_id=self.mail_delivery_model.id
+            ),
+            batch_size=1,
+        )
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(MailDeliveryBatchModel.objects.count(), 3)
+        self.assertEqual(
+            self.mail_delivery_model.batches.filter(failures__isnull=False).count(), 2
+        )
+
+    def test_claim_failures(self):
+        batches = self.mail_delivery_batch_repository.claim_failures(
+            delivery_id=self.mail_delivery_model.id
+        )
+        self.assertEqual(batches, [self.mail_delivery_batch_model])
+        self.mail_delivery_batch_model.refresh_from_db()
+        self.assertIsNotNone(self.mail_delivery_batch_model.retried_at)
+        self.assertEqual(
+            self.mail_delivery_batch_repository.claim_failures(
+                delivery_id=self.mail_delivery_model.id
+            ),
+            [],
+        )
+
+    def test_release_failures(self):
+        batches = self.mail_delivery_batch_repository.claim_failures(
+            delivery_id=self.mail_delivery_model.id
+        )
+        self.mail_delivery_batch_repository.release_failures(
+            batch_ids=[batch.id for batch in batches]
+        )
+        self.assertEqual(
+            self.mail_delivery_batch_repository.claim_failures(
+                delivery_id=self.mail_delivery_model.id
+            ),
+            [self.mail_delivery_batch_model],
+        )
@@ -1,4 +1,9 @@
+from functools import partial
+
 from amqp import exceptions as amqp_exc
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from kombu import exceptions as kombu_exc
 from rest_framework.request import Request
 
@@ -7,6 +12,7 @@ from app.delivery.repository import MailDeliveryRepository
 from app.template.controller import MailTemplateController
 from core.exceptions import AppException
 from core.interfaces import MailMailAttribute
+from core.log import logger
 from core.tasks import send_mail_task
 from core.utils.constants import MailDeliveryStatusEnum
 
@@ -47,12 +53,19 @@ class SingleMailController:
             mail_delivery = self.create_delivery_record(
                 user_id=request.user.get("preferred_username"), mail_id=mail_record.id
             )
+            if mail_record.is_scheduled:
+                return SingleMailResponseSerializer(
+                    {"id": mail_record.id, "is_success": True}
+                )
             self.create_task(
                 obj_data={
                     "mail_id": mail_record.id,
                     "sender_address": obj_data.get("sender"),
                     "sender_name": obj_data.get("name"),
                     "password": obj_data.get("password"),
+                    "data_key": obj_data.get("data_key"),
+                    "batch_size": obj_data.get("batch_size"),
+                    "adaptive_batch_size": obj_data.get("adaptive_batch_size"),
                     "recipient": obj_data.get("recipient"),
                     "subject": obj_data.get("subject"),
                     "delivery_id": mail_delivery.id,
@@ -88,12 +101,19 @@ class SingleMailController:
             mail_delivery = self.create_delivery_record(
                 user_id=request.user.get("preferred_username"), mail_id=mail_record.id
             )
+            if mail_record.is_scheduled:
+                return SingleMailResponseSerializer(
+                    {"id": mail_record.id, "is_success": True}
+                )
             self.create_task(
                 obj_data={
                     "mail_id": mail_record.id,
                     "sender_address": obj_data.get("sender"),
                     "sender_name": obj_data.get("name"),
                     "password": obj_data.get("password"),
+                    "data_key": obj_data.get("data_key"),
+                    "batch_size": obj_data.get("batch_size"),
+                    "adaptive_batch_size": obj_data.get("adaptive_batch_size"),
                     "recipient": obj_data.get("recipient"),
                     "subject": obj_data.get("subject"),
                     "delivery_id": mail_delivery.id,
@@ -105,6 +125,64 @@ class SingleMailController:
             )
         raise AppException.ValidationException(error_message=serializer.errors)
 
+    def dispatch_scheduled_mails(self):
+        """
+        queue the scheduled mails that are due, claimed in batches in the order they
+        are due so every mail is queued once however many dispatchers run
+        :return: the number of mails queued
+        """
+        dispatched, refused = 0, []
+        while not refused:
+            # reminder: the flag is cleared in the transaction queuing the mails once
+            # it commits, so a dispatcher that dies first leaves them scheduled
+            with transaction.atomic():
+                mails = self.single_mail_repository.claim(
+                    filter_param={
+                        "is_scheduled": True,
+                        "scheduled_date__lte": timezone.now(),
+                    },
+                    obj_data={"is_scheduled": False},
+                    limit=settings.MAIL_SCHEDULE_BATCH_SIZE,
+                    order_by=["scheduled_date"],
+                )
+                if not mails:
+                    break
+                deliveries = {
+                    delivery.single_mail_id: delivery.id
+                    for delivery in self.mail_delivery_repository.find_all(
+                        filter_param={"single_mail_id__in": [mail.id for mail in mails]}
+                    )
+                }
+                objs_data = [
+                    {"mail_id": mail.id, "delivery_id": deliveries.get(mail.id)}
+                    for mail in mails
+                ]
+                transaction.on_commit(
+                    partial(
+                        self.queue_scheduled_mails, objs_data=objs_data, refused=refused
+                    )
+                )
+            dispatched += len(mails) - len(refused)
+        return dispatched
+
+    def queue_scheduled_mails(self, objs_data: list, refused: list):
+        """
+        queue the claimed scheduled mails in order, flagging the ones left once the
+        broker refuses one so the next dispatch picks them up
+        :param refused: filled with the ids of the mails that were not queued
+        """
+        for index, obj_data in enumerate(objs_data):
+            try:
+                self.create_task(obj_data=obj_data, inline=False)
+            except AppException.InternalServerException as exc:
+                refused.extend(_.get("mail_id") for _ in objs_data[index:])
+                self.single_mail_repository.update_all(
+                    filter_param={"id__in": refused}, obj_data={"is_scheduled": True}
+                )
+                logger.error(f"ScheduledMailDispatchError({exc})")
+                return None
+        return None
+
     def delete_mail(self, obj_id: str):
         self.single_mail_repository.delete_by_id(obj_id)
         return None
@@ -115,14 +193,24 @@ class SingleMailController:
         )
         obj_data["name"] = obj_data.get("name", account.sender_name)
         obj_data["password"] = account.password
+        obj_data["data_key"] = account.data_key
+        obj_data["batch_size"] = account.batch_size
+        obj_data["adaptive_batch_size"] = account.adaptive_batch_size
+        # reminder: a mail scheduled in the past is sent straight away
+        scheduled_date = obj_data.get("scheduled_date")
         mail = self.single_mail_repository.create(
             obj_data={
                 "user_id": user_id,
                 "sender": obj_data.get("sender"),
+                "name": obj_data.get("name"),
                 "recipient": obj_data.get("recipient"),
                 "subject": obj_data.get("subject"),
                 "html_body": obj_data.get("html_body"),
                 "text_body": obj_data.get("text_body"),
+                "is_scheduled": bool(
+                    scheduled_date and scheduled_date > timezone.now()
+                ),
+                "scheduled_date": scheduled_date,
             }
         )
         return obj_data, mail
@@ -137,26 +225,36 @@ class SingleMailController:
         )
 
     # noinspection PyMethodMayBeStatic
-    def create_task(self, obj_data: dict):
-        try:
-            send_mail_task.apply_async(
-                kwargs={
-                    "mail_attr": MailMailAttribute(
-                        sender_address=obj_data.get("sender_address"),
-                        sender_name=obj_data.get("sender_name"),
-                        password=obj_data.get("password"),
-                        recipient=obj_data.get("recipient"),
-                        subject=obj_data.get("subject"),
-                        html_body=obj_data.get("html_body"),
-                        text_body=obj_data.get("text_body"),
-                    ),
-                    "mail_record": {
-                        "delivery_id": obj_data.get("delivery_id"),
-                        "single_mail_id": obj_data.get("mail_id"),
-                    },
-                },
-                kwargsrepr="",
+    def create_task(self, obj_data: dict, inline: bool = True):
+        """
+        :param inline: whether a small mail travels inline in the task, a mail queued
+        without its content is loaded from the database by the worker
+        """
+        mail_record = {
+            "delivery_id": obj_data.get("delivery_id"),
+            "single_mail_id": obj_data.get("mail_id"),
+        }
+        task_kwargs = {"mail_record": mail_record}
+        # reminder: small mails travel inline so the worker skips loading them, larger
+        # ones only carry their ids and are loaded from the database by the worker
+        body_size = len(obj_data.get("html_body") or "") + len(
+            obj_data.get("text_body") or ""
+        )
+        if inline and body_size <= settings.MAIL_INLINE_MAX_SIZE:
+            task_kwargs["mail_attr"] = MailMailAttribute(
+                sender_address=obj_data.get("sender_address"),
+                sender_name=obj_data.get("sender_name"),
+                password=obj_data.get("password"),
+                data_key=obj_data.get("data_key"),
+                batch_size=obj_data.get("batch_size"),
+                adaptive_batch_size=obj_data.get("adaptive_batch_size"),
+                recipient=obj_data.get("recipient"),
+                subject=obj_data.get("subject"),
+                html_body=obj_data.get("html_body"),
+                text_body=obj_data.get("text_body"),
             )
+        try:
+            send_mail_task.apply_async(kwargs=task_kwargs, kwargsrepr="")
         except (kombu_exc.KombuError, amqp_exc.AMQPError) as exc:
             raise AppException.InternalServerException(
                 error_message=f"CeleryBrokerError({exc})"
@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("single", "0003_alter_singlemailmodel_text_body"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="singlemailmodel",
+            index=models.Index(
+                condition=models.Q(("is_scheduled", True)),
+                fields=["scheduled_date"],
+                name="single_mail_due",
+            ),
+        ),
+    ]
@@ -22,6 +22,15 @@ class SingleMailModel(BaseModel):
     class Meta:
         db_table = "single_mails"
         ordering = ["created_at"]
+        # reminder: only the mails waiting to be dispatched are indexed, so finding
+        # the ones that are due never scans the mails already sent
+        indexes = [
+            models.Index(
+                fields=["scheduled_date"],
+                condition=models.Q(is_scheduled=True),
+                name="single_mail_due",
+            )
+        ]
 
     def __str__(self):
         return self.sender
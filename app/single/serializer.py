@@ -11,6 +11,8 @@ class SingleMailSerializer(serializers.Serializer):
     name = serializers.CharField(required=False)
     recipient = serializers.EmailField(required=True)
     subject = serializers.CharField(required=False)
+    is_scheduled = serializers.BooleanField(required=True)
+    scheduled_date = serializers.DateTimeField(required=False)
     delivery = MailDeliverySerializer(many=True)
 
 
@@ -25,6 +27,7 @@ class SendSingleMailSerializer(serializers.Serializer):
     subject = serializers.CharField(required=True)
     html_body = serializers.CharField(required=True)
     text_body = serializers.CharField(required=False)
+    scheduled_date = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class SendSingleMailTemplateSerializer(serializers.Serializer):
@@ -35,6 +38,7 @@ class SendSingleMailTemplateSerializer(serializers.Serializer):
     template_id = serializers.UUIDField(required=False)
     template_name = serializers.CharField(required=False)
     keywords = serializers.DictField(required=False)
+    scheduled_date = serializers.DateTimeField(required=False, allow_null=True)
 
 
 class SingleMailResponseSerializer(serializers.Serializer):
@@ -1,10 +1,13 @@
 import uuid
+from datetime import timedelta
 
-from django.test import tag
+from django.test import override_settings, tag
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.parsers import JSONParser
 from rest_framework.request import Request
 
+from app.single.models import SingleMailModel
 from app.single.serializer import (
     SingleMailResponseSerializer,
     SingleMailSerializer,
@@ -55,6 +58,25 @@ class TestSingleMailController(SingleMailTestCase):
         self.assertIsInstance(result, SingleMailResponseSerializer)
         self.assertIsInstance(result.data, dict)
 
+    def test_send_mail_scheduled(self):
+        request = Request(
+            self.request_factory.post(
+                self.request_url,
+                {
+                    **self.single_mail_test_data.send_mail(
+                        self.mail_account_model.mail_address
+                    ),
+                    "scheduled_date": (timezone.now() + timedelta(hours=1)).isoformat(),
+                },
+                format=self.data_format,
+            ),
+            parsers=[JSONParser()],
+        )
+        request.user = self.mock_decode_token()
+        result = self.single_mail_controller.send_mail(request=request)
+        self.assertTrue(SingleMailModel.objects.get(pk=result.data["id"]).is_scheduled)
+        self.celery_task.assert_not_called()
+
     def test_send_mail_invalid_data_exc(self):
         with self.assertRaises(AppException.ValidationException) as exception:
             request = Request(
@@ -140,6 +162,58 @@ class TestSingleMailController(SingleMailTestCase):
         self.assertEqual(exception.exception.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIsNotNone(exception.exception.error_message)
 
+    def test_dispatch_scheduled_mails(self):
+        self.schedule_mail(scheduled_date=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.single_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(result, 1)
+        self.single_mail_model.refresh_from_db()
+        self.assertFalse(self.single_mail_model.is_scheduled)
+        task_kwargs = self.celery_task.call_args.kwargs["kwargs"]
+        self.assertNotIn("mail_attr", task_kwargs)
+        self.assertEqual(
+            task_kwargs["mail_record"]["single_mail_id"], self.single_mail_model.id
+        )
+
+    def test_dispatch_scheduled_mails_not_due(self):
+        self.schedule_mail(scheduled_date=timezone.now() + timedelta(hours=1))
+        result = self.single_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(result, 0)
+        self.single_mail_model.refresh_from_db()
+        self.assertTrue(self.single_mail_model.is_scheduled)
+        self.celery_task.assert_not_called()
+
+    def test_dispatch_scheduled_mails_celery_exc(self):
+        self.schedule_mail(scheduled_date=timezone.now() - timedelta(minutes=1))
+        self.celery_task.side_effect = self.celery_exc
+        with self.captureOnCommitCallbacks(execute=True):
+            self.single_mail_controller.dispatch_scheduled_mails()
+        self.single_mail_model.refresh_from_db()
+        self.assertTrue(self.single_mail_model.is_scheduled)
+
+    def test_dispatch_scheduled_mails_queued_on_commit(self):
+        self.schedule_mail(scheduled_date=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.single_mail_controller.dispatch_scheduled_mails()
+        self.assertEqual(len(callbacks), 1)
+        self.celery_task.assert_not_called()
+
+    def test_queue_scheduled_mails_celery_exc(self):
+        self.celery_task.side_effect = self.celery_exc
+        refused = []
+        self.single_mail_controller.queue_scheduled_mails(
+            objs_data=[{"mail_id": self.single_mail_model.id}], refused=refused
+        )
+        self.assertEqual(refused, [self.single_mail_model.id])
+
+    def schedule_mail(self, scheduled_date):
+        SingleMailModel.objects.filter(pk=self.single_mail_model.id).update(
+            is_scheduled=True, scheduled_date=scheduled_date
+        )
+        self.single_mail_controller.create_delivery_record(
+            user_id=self.single_mail_model.user_id, mail_id=self.single_mail_model.id
+        )
+
     def test_delete_mail(self):
         result = self.single_mail_controller.delete_mail(
             obj_id=self.single_mail_model.id
@@ -158,6 +232,22 @@ class TestSingleMailController(SingleMailTestCase):
         )
         self.assertIsNone(result)
 
+    def test_create_task_inline(self):
+        self.single_mail_controller.create_task(
+            obj_data=self.single_mail_test_data.mail_task
+        )
+        task_kwargs = self.celery_task.call_args.kwargs["kwargs"]
+        self.assertEqual(task_kwargs["mail_attr"].get("html_body"), "html")
+
+    @override_settings(MAIL_INLINE_MAX_SIZE=0)
+    def test_create_task_by_reference(self):
+        self.single_mail_controller.create_task(
+            obj_data=self.single_mail_test_data.mail_task
+        )
+        task_kwargs = self.celery_task.call_args.kwargs["kwargs"]
+        self.assertNotIn("mail_attr", task_kwargs)
+        self.assertIn("mail_record", task_kwargs)
+
     def test_create_task_celery_exc(self):
         with self.assertRaises(AppException.InternalServerException) as exception:
             self.celery_task.side_effect = self.celery_exc
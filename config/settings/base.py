@@ -268,6 +268,101 @@ CELERY_BROKER_URL = (
 CELERY_RESULT_BACKEND = (
     f"redis://:{env('REDIS_PASSWORD')}@{env('REDIS_SERVER')}:{env('REDIS_PORT')}"
 )
+# reminder: mail tasks are acknowledged once they finish, so a task running longer
+# than the visibility timeout is delivered to a second worker while it still runs
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": env.int("CELERY_VISIBILITY_TIMEOUT", default=43200)
+}
+# reminder: celery beat dispatches the scheduled mails that are due every interval
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-scheduled-single-mails": {
+        "task": "app.single.tasks.dispatch_scheduled_mails_task",
+        "schedule": env.float("MAIL_SCHEDULE_INTERVAL", default=60.0),
+    },
+    "dispatch-scheduled-bulk-mails": {
+        "task": "app.bulk.tasks.dispatch_scheduled_mails_task",
+        "schedule": env.float("MAIL_SCHEDULE_INTERVAL", default=60.0),
+    },
+}
+
+# Smtp Connection Pool Settings
+SMTP_POOL_MAX_SIZE = env.int("SMTP_POOL_MAX_SIZE", default=5)
+SMTP_POOL_IDLE_TIMEOUT = env.int("SMTP_POOL_IDLE_TIMEOUT", default=60)
+# reminder: seconds a send waits for a connection when the account has max size open
+SMTP_POOL_ACQUIRE_TIMEOUT = env.float("SMTP_POOL_ACQUIRE_TIMEOUT", default=60.0)
+
+# Mail Delivery Settings
+# reminder: the MailServiceInterface implementation used by the mail tasks, set to
+# core.services.AsyncMailService to drive the smtp sessions on an asyncio event loop
+MAIL_SERVICE = env("MAIL_SERVICE", default="core.services.MailService")
+# reminder: sessions per task, capped by SMTP_POOL_MAX_SIZE shared with every task
+MAIL_ASYNC_MAX_SESSIONS = env.int("MAIL_ASYNC_MAX_SESSIONS", default=5)
+# reminder: encode the mime message of a mail once and reuse it for every batch
+MAIL_PRERENDER_MESSAGE = env.bool("MAIL_PRERENDER_MESSAGE", default=True)
+# reminder: "batch" sends one message to every recipient of a batch, "recipient"
+# sends every recipient its own message over the same pooled connection
+MAIL_ENVELOPE_MODE = env("MAIL_ENVELOPE_MODE", default="batch")
+# reminder: number of smtp connections a single mail task fans its batches out to,
+# capped by SMTP_POOL_MAX_SIZE so an account never exceeds its pooled connections
+MAIL_BATCH_CONCURRENCY = env.int("MAIL_BATCH_CONCURRENCY", default=1)
+# reminder: recipients read from the database per page with a server-side cursor
+# and sent before the next page is read
+MAIL_RECIPIENT_PAGE_SIZE = env.int("MAIL_RECIPIENT_PAGE_SIZE", default=2000)
+# reminder: recipients per smtp batch for accounts without their own batch size,
+# adaptive batch sizes stay within the min and max and shrink when a batch is
+# throttled or takes longer than the target latency in seconds
+MAIL_BATCH_SIZE = env.int("MAIL_BATCH_SIZE", default=100)
+MAIL_BATCH_SIZE_MIN = env.int("MAIL_BATCH_SIZE_MIN", default=1)
+MAIL_BATCH_SIZE_MAX = env.int("MAIL_BATCH_SIZE_MAX", default=1000)
+MAIL_BATCH_TARGET_LATENCY = env.float("MAIL_BATCH_TARGET_LATENCY", default=10.0)
+# reminder: batch sizers kept per worker process for this many sender accounts,
+# expiring after the ttl in seconds so adaptive sizes are relearnt periodically
+MAIL_BATCH_SIZER_CACHE_SIZE = env.int("MAIL_BATCH_SIZER_CACHE_SIZE", default=1024)
+MAIL_BATCH_SIZER_CACHE_TTL = env.int("MAIL_BATCH_SIZER_CACHE_TTL", default=3600)
+# reminder: recipients per second each sender account may send to, shared by all
+# workers through a redis token bucket holding at most the burst, 0 disables it
+MAIL_RATE_LIMIT = env.float("MAIL_RATE_LIMIT", default=0)
+MAIL_RATE_LIMIT_BURST = env.int("MAIL_RATE_LIMIT_BURST", default=100)
+MAIL_RATE_LIMIT_REDIS_URL = env("MAIL_RATE_LIMIT_REDIS_URL", default=CELERY_BROKER_URL)
+# reminder: bulk mails with more recipients than the chunk size are split into
+# chunk tasks sent across the workers of the cluster, 0 disables chunking
+BULK_MAIL_CHUNK_SIZE = env.int("BULK_MAIL_CHUNK_SIZE", default=0)
+# reminder: recipients are stored this many at a time with COPY, and files of up to
+# the max size in megabytes can be uploaded
+BULK_MAIL_RECIPIENT_CHUNK_SIZE = env.int("BULK_MAIL_RECIPIENT_CHUNK_SIZE", default=5000)
+BULK_MAIL_UPLOAD_MAX_SIZE_MB = env.int("BULK_MAIL_UPLOAD_MAX_SIZE_MB", default=100)
+# reminder: single mails whose html and text bodies together are at most this many
+# characters travel inline in the task, every other mail is loaded by the worker
+MAIL_INLINE_MAX_SIZE = env.int("MAIL_INLINE_MAX_SIZE", default=16384)
+# reminder: a delivery report is written once this many batch results are buffered
+# or this many seconds have passed since it was last written, and when sending ends
+MAIL_DELIVERY_FLUSH_BATCHES = env.int("MAIL_DELIVERY_FLUSH_BATCHES", default=20)
+MAIL_DELIVERY_FLUSH_INTERVAL = env.float("MAIL_DELIVERY_FLUSH_INTERVAL", default=5.0)
+# reminder: bulk mail tasks keep how far they got through their recipients in
+# redis for this many seconds, so a task redelivered after its worker died resumes
+MAIL_CHECKPOINT_TTL = env.int("MAIL_CHECKPOINT_TTL", default=86400)
+MAIL_CHECKPOINT_REDIS_URL = env("MAIL_CHECKPOINT_REDIS_URL", default=CELERY_BROKER_URL)
+# reminder: paused and cancelled bulk mails are flagged in redis for the workers
+MAIL_CAMPAIGN_REDIS_URL = env("MAIL_CAMPAIGN_REDIS_URL", default=CELERY_BROKER_URL)
+# reminder: scheduled mails that are due are claimed and queued this many at a time
+MAIL_SCHEDULE_BATCH_SIZE = env.int("MAIL_SCHEDULE_BATCH_SIZE", default=500)
+# reminder: recipients that failed are retried up to this many times, 0 disables
+# automatic retries, waiting a random time of up to backoff * 2^attempt seconds
+MAIL_RETRY_MAX_ATTEMPTS = env.int("MAIL_RETRY_MAX_ATTEMPTS", default=3)
+MAIL_RETRY_BACKOFF = env.int("MAIL_RETRY_BACKOFF", default=60)
+MAIL_RETRY_BACKOFF_MAX = env.int("MAIL_RETRY_BACKOFF_MAX", default=3600)
+
+# Mail Account Encryption Settings
+# reminder: keys are separated by "|", the first key wraps new data keys and the
+# remaining keys are kept for unwrapping data keys during a key rotation. The account
+# app refuses to start without them, see the README for migrating existing accounts
+MAIL_ACCOUNT_MASTER_KEYS = env("MAIL_ACCOUNT_MASTER_KEYS", default="").split("|")
+MAIL_ACCOUNT_MASTER_KEYS = [key for key in MAIL_ACCOUNT_MASTER_KEYS if key]
+
+# Mail Account Key Cache Settings
+MAIL_KEY_CACHE_SIZE = env.int("MAIL_KEY_CACHE_SIZE", default=1024)
+MAIL_KEY_CACHE_TTL = env.int("MAIL_KEY_CACHE_TTL", default=3600)
+MAIL_CREDENTIAL_CACHE_TTL = env.int("MAIL_CREDENTIAL_CACHE_TTL", default=300)
 
 # Jwt Settings
 JWT_ALGORITHMS = ["HS256", "RS256"]
@@ -284,3 +379,22 @@ KAFKA_SERVER_USERNAME = env("KAFKA_SERVER_USERNAME")
 KAFKA_SERVER_PASSWORD = env("KAFKA_SERVER_PASSWORD")
 KAFKA_SUBSCRIPTIONS = env("KAFKA_SUBSCRIPTIONS")
 KAFKA_CONSUMER_GROUP = env("KAFKA_CONSUMER_GROUP")
+# reminder: the consumer polls up to max records per batch and commits the offsets
+# of the batches it processed once every commit interval in seconds, 0 commits
+# after every batch
+KAFKA_MAX_POLL_RECORDS = env.int("KAFKA_MAX_POLL_RECORDS", default=500)
+KAFKA_POLL_TIMEOUT_MS = env.int("KAFKA_POLL_TIMEOUT_MS", default=1000)
+KAFKA_COMMIT_INTERVAL = env.float("KAFKA_COMMIT_INTERVAL", default=5.0)
+# reminder: number of threads processing a polled batch, where the messages of a
+# partition, or of a key within a partition when ordering is "key", are processed
+# in order by one thread and different partitions or keys run concurrently
+KAFKA_CONSUMER_WORKERS = env.int("KAFKA_CONSUMER_WORKERS", default=1)
+KAFKA_CONSUMER_ORDERING = env("KAFKA_CONSUMER_ORDERING", default="partition")
+# reminder: a batch or message that raises is retried up to max retries times,
+# waiting backoff * 2^attempt seconds, and then published to the dead-letter topic
+# with the messages that are not valid json or are rejected by the controller
+KAFKA_MAX_RETRIES = env.int("KAFKA_MAX_RETRIES", default=2)
+KAFKA_RETRY_BACKOFF = env.float("KAFKA_RETRY_BACKOFF", default=0.5)
+KAFKA_DEAD_LETTER_TOPIC = env(
+    "KAFKA_DEAD_LETTER_TOPIC", default="bulk_mail_dead_letter"
+)
@@ -3,6 +3,10 @@ from config.settings.base import *  # noqa
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 SECRET_KEY = env("SECRET_KEY")
+# reminder: a fixed key so the tests run without configuring one
+MAIL_ACCOUNT_MASTER_KEYS = MAIL_ACCOUNT_MASTER_KEYS or [  # noqa
+    "dGVzdC1tYWlsLWFjY291bnQtbWFzdGVyLWtleS0wMDA="
+]
 
 DATABASES = {
     "default": {
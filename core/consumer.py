@@ -1,85 +1,266 @@
 import json
-import os
-import sys
-import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable
 
-import pinject
-from kafka import KafkaConsumer
-from kafka.errors import KafkaError
+from django.conf import settings
+from django.db import (
+    InterfaceError,
+    OperationalError,
+    close_old_connections,
+)
+from django.utils import timezone
+from kafka import (
+    ConsumerRebalanceListener,
+    KafkaConsumer,
+    KafkaProducer,
+)
 from loguru import logger as loguru_logger
 
-# Add "app" root to PYTHONPATH so we can import from app i.e. from app import create_app.
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.bulk.controller import BulkMailController
+from core.exceptions import AppExceptionCase
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.base")
+# reminder: errors of the database itself rather than of a message, the consumer
+# stops on them instead of dead-lettering every message it reads while they last
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
 
 
-if __name__ == "__main__":
-    import django
+class CommitOnRevoke(ConsumerRebalanceListener):
+    """
+    Commits the offsets of the batches processed so far before the partitions move
+    to another consumer, so a rebalance does not redeliver them
+    """
 
-    django.setup()
-    from django.conf import settings
+    def __init__(self, commit: Callable):
+        self.commit = commit
 
-    try:
+    def on_partitions_revoked(self, revoked):
+        # reminder: revocation happens inside poll, between two processed batches
+        if revoked:
+            self.commit()
+
+    def on_partitions_assigned(self, assigned):
+        pass
+
+
+class DeadLetterPublisher:
+    """
+    Publishes the messages the consumer could not process to the dead-letter topic,
+    unchanged, with headers recording where they came from and why they failed
+    """
+
+    def __init__(self, producer: KafkaProducer, topic: str):
+        self.producer = producer
+        self.topic = topic
+        self.sent = []
+
+    def publish(self, msg, error: Exception, attempts: int):
+        loguru_logger.error(f"[message | dead lettered | {error}]")
+        headers = {
+            "dead_letter_topic": msg.topic,
+            "dead_letter_partition": msg.partition,
+            "dead_letter_offset": msg.offset,
+            "dead_letter_error": f"{type(error).__name__}({error})",
+            "dead_letter_attempts": attempts,
+            "dead_letter_date": timezone.now().isoformat(),
+        }
+        self.sent.append(
+            self.producer.send(
+                self.topic,
+                key=msg.key,
+                value=msg.value,
+                headers=[(key, str(value).encode()) for key, value in headers.items()],
+            )
+        )
+
+    def flush(self):
+        # reminder: flush only waits for the sends, the result of every send raises
+        # when its dead letter was not published, so the offsets of its message are
+        # never committed
+        self.producer.flush()
+        sent, self.sent = self.sent, []
+        for future in sent:
+            future.get()
+
+
+class MailConsumer:
+    """
+    Consumes the bulk mails published on the kafka subscriptions in batches of polled
+    records, committing offsets only after their batch is processed so every mail is
+    delivered at least once. Messages that cannot be processed are retried a few times
+    and then published to the dead-letter topic, so they never stall their partition.
+    The controller is built once when the consumer starts and reused for every message.
+    """
+
+    def __init__(self, bulk_mail_controller: BulkMailController):
+        self.bulk_mail_controller = bulk_mail_controller
+        self.dead_letters = None
+        self.executor = (
+            ThreadPoolExecutor(
+                max_workers=settings.KAFKA_CONSUMER_WORKERS,
+                thread_name_prefix="mail_consumer",
+            )
+            if settings.KAFKA_CONSUMER_WORKERS > 1
+            else None
+        )
+
+    # noinspection PyMethodMayBeStatic
+    def connection_config(self):
+        return {
+            "bootstrap_servers": settings.KAFKA_BOOTSTRAP_SERVERS,
+            "security_protocol": "SASL_PLAINTEXT",
+            "sasl_mechanism": "SCRAM-SHA-256",
+            "sasl_plain_username": settings.KAFKA_SERVER_USERNAME,
+            "sasl_plain_password": settings.KAFKA_SERVER_PASSWORD,
+        }
+
+    def connect(self):
         loguru_logger.info("CONNECTING TO KAFKA SERVER")
         consumer = KafkaConsumer(
-            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+            **self.connection_config(),
             auto_offset_reset="earliest",
             group_id=settings.KAFKA_CONSUMER_GROUP,
-            security_protocol="SASL_PLAINTEXT",
-            sasl_mechanism="SCRAM-SHA-256",
-            sasl_plain_username=settings.KAFKA_SERVER_USERNAME,
-            sasl_plain_password=settings.KAFKA_SERVER_PASSWORD,
             enable_auto_commit=False,
         )
-    except KafkaError as exc:
-        loguru_logger.error(f"error({exc}) occurred while connecting to kafka")
-    else:
-        consumer.subscribe(settings.KAFKA_SUBSCRIPTIONS)
-        loguru_logger.info(f"Event Subscription List: {settings.KAFKA_SUBSCRIPTIONS}")
-        loguru_logger.info("AWAITING MESSAGES\n")
-        from app.account.controller import (
-            MailAccountController,
-            MailAccountRepository,
+        self.dead_letters = DeadLetterPublisher(
+            producer=KafkaProducer(**self.connection_config(), acks="all"),
+            topic=settings.KAFKA_DEAD_LETTER_TOPIC,
         )
-        from app.bulk.controller import (
-            BulkMailController,
-            BulkMailRepository,
+        consumer.subscribe(
+            settings.KAFKA_SUBSCRIPTIONS,
+            listener=CommitOnRevoke(commit=lambda: self.commit(consumer)),
         )
-        from app.delivery.repository import MailDeliveryRepository
-        from app.template.controller import (
-            MailTemplateController,
-            MailTemplateRepository,
-            ObjectStorageLogRepository,
+        loguru_logger.info(f"Event Subscription List: {settings.KAFKA_SUBSCRIPTIONS}")
+        return consumer
+
+    def run(self, consumer: KafkaConsumer):
+        loguru_logger.info("AWAITING MESSAGES\n")
+        uncommitted, committed_at = 0, time.monotonic()
+        while True:
+            uncommitted += self.process(consumer)
+            if (
+                uncommitted
+                and time.monotonic() - committed_at >= settings.KAFKA_COMMIT_INTERVAL
+            ):
+                # reminder: commit only between batches, the committed positions then
+                # never run ahead of the messages processed
+                self.commit(consumer)
+                loguru_logger.success(f"[{uncommitted} | messages | consumed]")
+                uncommitted, committed_at = 0, time.monotonic()
+
+    def commit(self, consumer: KafkaConsumer):
+        self.dead_letters.flush()
+        consumer.commit()
+
+    def process(self, consumer: KafkaConsumer):
+        """
+        poll a batch of records and process every message of it, returning once the
+        whole batch is processed so only contiguous processed offsets are committed
+        :return: the number of messages processed
+        """
+        records = consumer.poll(
+            timeout_ms=settings.KAFKA_POLL_TIMEOUT_MS,
+            max_records=settings.KAFKA_MAX_POLL_RECORDS,
         )
-        from core.exceptions import AppExceptionCase
+        streams = self.streams(records)
+        if self.executor:
+            futures = [
+                self.executor.submit(self.handle_stream, stream) for stream in streams
+            ]
+            wait(futures)
+            for future in futures:
+                future.result()
+        else:
+            for stream in streams:
+                self.handle_stream(stream)
+        return sum(len(stream) for stream in streams)
+
+    # noinspection PyMethodMayBeStatic
+    def streams(self, records: dict):
+        """
+        split the polled records into the streams of messages that keep their order
+        """
+        streams = {}
+        for partition, messages in records.items():
+            for msg in messages:
+                key = (
+                    (partition, msg.key)
+                    if settings.KAFKA_CONSUMER_ORDERING == "key"
+                    else partition
+                )
+                streams.setdefault(key, []).append(msg)
+        return list(streams.values())
 
-        for msg in consumer:
-            data = json.loads(msg.value)
-            message_id = str(uuid.uuid4())
+    def handle_stream(self, messages: list):
+        # reminder: every worker thread holds its own database connection
+        close_old_connections()
+        try:
+            self.handle(messages)
+        finally:
+            close_old_connections()
+
+    def handle(self, messages: list):
+        """
+        create the mails of messages in one batch, keeping the order of the messages.
+        When the batch keeps failing every message is retried on its own, so only the
+        messages that fail by themselves are dead-lettered
+        """
+        consumed = []
+        for msg in messages:
             loguru_logger.info(f"[consuming | message | {msg}]")
-            obj_graph = pinject.new_object_graph(
-                modules=None,
-                classes=[
-                    BulkMailController,
-                    BulkMailRepository,
-                    MailTemplateRepository,
-                    MailTemplateController,
-                    MailDeliveryRepository,
-                    MailAccountController,
-                    MailAccountRepository,
-                    ObjectStorageLogRepository,
-                ],
-            )
-            bulk_mail_controller: BulkMailController = obj_graph.provide(
-                BulkMailController
-            )
             try:
-                loguru_logger.info("[processing | message]")
-                bulk_mail_controller.consumer_send_mail(obj_data=data)
+                consumed.append((msg, json.loads(msg.value)))
+            except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+                self.dead_letters.publish(msg=msg, error=exc, attempts=1)
+        if not consumed:
+            return
+        loguru_logger.info(f"[processing | {len(consumed)} | messages]")
+        try:
+            results = self.with_retries(
+                lambda: self.bulk_mail_controller.consumer_send_mails(
+                    [obj_data for _, obj_data in consumed]
+                )
+            )
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as exc:
+            loguru_logger.error(f"[batch | processing | failed | {exc}]")
+            results = [self.handle_alone(obj_data) for _, obj_data in consumed]
+        for (msg, _), result in zip(consumed, results):
+            if isinstance(result, AppExceptionCase):
+                # reminder: invalid messages fail the same way on every attempt
+                self.dead_letters.publish(msg=msg, error=result, attempts=1)
+            elif isinstance(result, Exception):
+                self.dead_letters.publish(
+                    msg=msg, error=result, attempts=settings.KAFKA_MAX_RETRIES + 1
+                )
+            else:
                 loguru_logger.success("[message | successfully | processed]")
-            except AppExceptionCase as exc:
-                loguru_logger.error(f"[message | processing | failed | {exc}]")
-            finally:
-                consumer.commit()
-                loguru_logger.success("[message | successfully | consumed]")
+
+    def handle_alone(self, obj_data: dict):
+        """
+        :return: the result of the message, or the exception it kept failing with
+        """
+        try:
+            return self.with_retries(
+                lambda: self.bulk_mail_controller.consumer_send_mails([obj_data])
+            )[0]
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as exc:
+            return exc
+
+    # noinspection PyMethodMayBeStatic
+    def with_retries(self, func: Callable):
+        """
+        call func, retrying it up to settings.KAFKA_MAX_RETRIES times with an
+        exponential backoff when it raises
+        """
+        for attempt in range(settings.KAFKA_MAX_RETRIES + 1):
+            try:
+                return func()
+            except Exception as exc:
+                if attempt >= settings.KAFKA_MAX_RETRIES:
+                    raise
+                loguru_logger.warning(f"[processing | retry | {attempt + 1} | {exc}]")
+                time.sleep(settings.KAFKA_RETRY_BACKOFF * 2**attempt)
@@ -1,12 +1,15 @@
 import abc
-from typing import List, TypedDict, Union
+from typing import Iterable, Optional, TypedDict, Union
 
 
 class MailMailAttribute(TypedDict):
     sender_address: str
     sender_name: str
     password: str
-    recipient: Union[List[str], str]
+    data_key: Optional[str]
+    batch_size: Optional[int]
+    adaptive_batch_size: Optional[bool]
+    recipient: Union[Iterable[str], str]
     subject: str
     html_body: str
     text_body: str
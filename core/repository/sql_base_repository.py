@@ -1,5 +1,5 @@
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import models, transaction
 
 from core.exceptions import AppException
 from core.interfaces import CrudRepositoryInterface
@@ -40,6 +40,19 @@ class SqlBaseRepository(CrudRepositoryInterface):
         model_obj.save()
         return model_obj
 
+    def bulk_create(self, objs_data: list, batch_size: int = None):
+        """
+
+        :param objs_data: {list} the data you want to use to create each model
+        :param batch_size: number of objects inserted per INSERT statement
+        :return: {list} - Returns the instance objects of the model passed
+        """
+
+        return self.model.objects.bulk_create(  # noqa
+            [self.model(**obj_data) for obj_data in objs_data],  # noqa
+            batch_size=batch_size,
+        )
+
     def update_by_id(self, obj_id: str, obj_data: dict):
         """
         :param obj_id: id of object to update
@@ -72,6 +85,67 @@ class SqlBaseRepository(CrudRepositoryInterface):
             db_obj.save()
         return db_obj
 
+    def update_all(self, filter_param: dict, obj_data: dict):
+        """
+        :param filter_param {dict}. Parameters to be filtered by model object passed
+        :param obj_data: {dict} update data written to every matching object in a
+        single UPDATE, without loading them or calling their save
+        :return: {int} - Returns the number of objects updated
+        """
+        assert filter_param, "update_all missing filter parameters"
+        return self.model.objects.filter(**filter_param).update(**obj_data)  # noqa
+
+    def update_fields_by_id(self, obj_id: str, obj_data: dict):
+        """
+        :param obj_id: id of object to update
+        :param obj_data: {dict} update data. Written in a single UPDATE statement
+        without loading the object first, keys that are not fields of the model are
+        ignored and auto_now fields are not touched
+        :return: {int} - Returns the number of objects updated
+        """
+        assert obj_id, "update_fields_by_id missing obj_id of object to update"
+        assert obj_data, "update_fields_by_id missing update data of object"
+        assert isinstance(obj_data, dict), "update_fields_by_id parameters not a dict"
+
+        fields = set()
+        for field in self.model._meta.concrete_fields:  # noqa
+            fields.update({field.name, field.attname})
+        updated = self.model.objects.filter(pk=obj_id).update(  # noqa
+            **{field: value for field, value in obj_data.items() if field in fields}
+        )
+        if not updated:
+            raise AppException.NotFoundException(
+                error_message=f"{self.object_name}({obj_id}) does not exist"
+            )
+        return updated
+
+    def claim(
+        self, filter_param: dict, obj_data: dict, limit: int, order_by: list = None
+    ):
+        """
+        lock up to limit objects matching filter_param, skipping the ones locked by
+        another transaction, update them with obj_data in a single UPDATE and return
+        them, so concurrent callers never claim the same object twice
+        :param filter_param {dict}. Parameters to be filtered by model object passed
+        :param obj_data: {dict} update data marking the objects as claimed
+        :param limit: maximum number of objects claimed
+        :param order_by: {list} fields the objects are claimed in the order of
+        :return: {list} - Returns the claimed instance objects of the model passed
+        """
+        assert filter_param, "claim missing filter parameters"
+        assert obj_data, "claim missing update data of objects"
+
+        with transaction.atomic():
+            db_objs = list(
+                self.model.objects.select_for_update(skip_locked=True)  # noqa
+                .filter(**filter_param)
+                .order_by(*(order_by or ["pk"]))[:limit]
+            )
+            self.model.objects.filter(  # noqa
+                pk__in=[db_obj.pk for db_obj in db_objs]
+            ).update(**obj_data)
+        return db_objs
+
     def find_by_id(self, obj_id: str):
         """
         returns an object matching the specified id if it exists in the database
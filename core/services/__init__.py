@@ -1 +1,7 @@
+from .async_mail_service import AsyncMailService
+from .campaign_control import CampaignControl, campaign_control
+from .connection_pool import SmtpConnectionPool, smtp_connection_pool
+from .mail_loader import MailLoader
 from .mail_service import MailService
+from .recipient_stream import RecipientStream
+from .rendered_mail import RenderedMail
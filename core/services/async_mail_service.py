@@ -0,0 +1,260 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Callable, Coroutine, Iterator
+
+import aiosmtplib
+from django.conf import settings
+
+from core.interfaces import MailMailAttribute
+from core.log import logger
+from core.utils.constants import MailEnvelopeModeEnum
+
+from .batch_sizer import BatchSizer
+from .mail_service import MailService
+from .rendered_mail import RenderedMail
+
+
+class EventLoopThread:
+    """
+    An asyncio event loop running on a daemon thread for the life of the worker
+    process, so mail tasks submit their smtp sessions to one loop instead of creating
+    and tearing down a loop per task
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    def run(self, coroutine: Coroutine):
+        """
+        run the coroutine on the loop and block the calling thread until it returns
+        """
+        return self.submit(coroutine).result()
+
+    def submit(self, coroutine: Coroutine):
+        """
+        schedule the coroutine on the loop without waiting for it
+        :return: the concurrent future of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop())
+
+    def loop(self):
+        with self._lock:
+            # reminder: a forked worker process does not inherit the loop thread
+            if self._loop is None or self._pid != os.getpid():
+                self._loop, self._pid = asyncio.new_event_loop(), os.getpid()
+                threading.Thread(
+                    target=self._loop.run_forever, name="mail_event_loop", daemon=True
+                ).start()
+            return self._loop
+
+
+class AsyncMailService(MailService):
+    """
+    A mail service that drives its smtp conversations on an asyncio event loop, so a
+    worker process keeps its smtp sessions in flight without a thread per session.
+    Every session takes a connection slot of the account from the connection pool, so
+    the sessions of all the tasks of the process stay within SMTP_POOL_MAX_SIZE.
+    Delivery reporting is shared with MailService.
+    """
+
+    event_loop = EventLoopThread()
+
+    def send_batches(
+        self,
+        mail_attribute: MailMailAttribute,
+        recipients: list,
+        password: str,
+        stopped: Callable[[], bool] = None,
+    ):
+        sizer = self.batch_sizer(mail_attribute=mail_attribute)
+        results = queue.Queue()
+        sending = self.event_loop.submit(
+            self.send_batches_async(
+                mail_attribute=mail_attribute,
+                batches=self.send_in_batches(
+                    recipients=recipients, sizer=sizer, stopped=stopped
+                ),
+                password=password,
+                sessions=min(
+                    settings.MAIL_ASYNC_MAX_SESSIONS,
+                    self.connection_pool.max_size,
+                    -(-len(recipients) // sizer.size),
+                ),
+                sizer=sizer,
+                results=results,
+            )
+        )
+        try:
+            # reminder: every result is yielded as its batch completes, so the
+            # delivery checkpoint never falls more than a batch behind
+            while (result := results.get()) is not None:
+                yield result
+            sending.result()
+        finally:
+            # reminder: a caller that stops early stops the sessions still sending
+            sending.cancel()
+
+    async def send_batches_async(
+        self,
+        mail_attribute: MailMailAttribute,
+        batches: Iterator[list],
+        password: str,
+        sessions: int,
+        sizer: BatchSizer,
+        results: queue.Queue,
+    ):
+        """
+        open sessions smtp sessions, each session sending the next batch until none
+        is left, and put the delivery result of every batch on results as it
+        completes, followed by None once every batch is sent
+        """
+        errors, batch_lock, rendered = [], asyncio.Lock(), None
+
+        async def next_batch():
+            # reminder: taking a batch reads the stop flag from redis, the batches
+            # are taken one session at a time as threads cannot share the generator
+            async with batch_lock:
+                return await asyncio.to_thread(next, batches, None)
+
+        async def session():
+            slot = None
+            try:
+                slot = await asyncio.to_thread(
+                    self.connection_pool.reserve,
+                    username=mail_attribute.get("sender_address"),
+                )
+                async with self.smtp_client(
+                    username=mail_attribute.get("sender_address"), password=password
+                ) as client:
+                    while (addresses := await next_batch()) is not None:
+                        await self.acquire_rate_limit_async(
+                            key=mail_attribute.get("sender_address"),
+                            tokens=len(addresses),
+                        )
+                        started = time.monotonic()
+                        result = await self.send_batch_async(
+                            mail_attribute=mail_attribute,
+                            addresses=addresses,
+                            client=client,
+                            rendered=rendered,
+                        )
+                        sizer.record(
+                            latency=time.monotonic() - started,
+                            throttled=result.get("throttled"),
+                        )
+                        results.put(result)
+            except Exception as exc:
+                errors.append(exc)
+                logger.error(f"{exc}")
+            finally:
+                if slot:
+                    slot.release()
+
+        try:
+            # reminder: blocking calls run off the loop thread, so they never stall
+            # the other sessions on the loop
+            rendered = await asyncio.to_thread(
+                self.render_mail, mail_attribute=mail_attribute
+            )
+            await asyncio.gather(*(session() for _ in range(sessions)))
+            if errors:
+                # reminder: every session failed before the batches were exhausted
+                while (addresses := await next_batch()) is not None:
+                    results.put(self.batch_result(addresses=addresses, exc=errors[0]))
+        finally:
+            results.put(None)
+
+    async def send_batch_async(
+        self,
+        mail_attribute: MailMailAttribute,
+        addresses: list,
+        client: aiosmtplib.SMTP,
+        rendered: RenderedMail = None,
+    ):
+        try:
+            if not rendered:
+                rendered = RenderedMail(
+                    self.build_mail(mail_attribute=mail_attribute, addresses=[])
+                )
+            if settings.MAIL_ENVELOPE_MODE != MailEnvelopeModeEnum.recipient.value:
+                refused = await self.send_message_async(
+                    rendered=rendered, addresses=addresses, client=client
+                )
+                return self.batch_result(
+                    addresses=addresses,
+                    refused=self.refusals(refused, addresses=addresses),
+                )
+            refused = {}
+            for address in addresses:
+                try:
+                    refused.update(
+                        await self.send_message_async(
+                            rendered=rendered, addresses=[address], client=client
+                        )
+                    )
+                except aiosmtplib.SMTPRecipientsRefused as exc:
+                    refused.update(self.async_refusals(exc))
+                except aiosmtplib.SMTPResponseException as exc:
+                    refused[address] = (exc.code, exc.message)
+            return self.batch_result(
+                addresses=addresses, refused=self.refusals(refused, addresses=addresses)
+            )
+        except aiosmtplib.SMTPRecipientsRefused as exc:
+            return self.batch_result(
+                addresses=addresses,
+                refused=self.refusals(self.async_refusals(exc), addresses=addresses),
+            )
+        except Exception as exc:
+            logger.error(f"{exc}")
+            return self.batch_result(addresses=addresses, exc=exc)
+
+    async def acquire_rate_limit_async(self, key: str, tokens: int):
+        """
+        wait for the rate limit of the account without blocking the other sessions
+        """
+        while True:
+            wait = await asyncio.to_thread(
+                self.rate_limiter.try_acquire, key=key, tokens=tokens
+            )
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    # noinspection PyMethodMayBeStatic
+    async def send_message_async(
+        self, rendered: RenderedMail, addresses: list, client: aiosmtplib.SMTP
+    ):
+        sender, recipients = rendered.from_email, rendered.recipients(addresses)
+        message = rendered.as_bytes(addresses)
+        try:
+            refused, _ = await client.sendmail(sender, recipients, message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # reminder: session was dropped by the server, reconnect and retry
+            await client.connect()
+            refused, _ = await client.sendmail(sender, recipients, message)
+        return refused
+
+    # noinspection PyMethodMayBeStatic
+    def async_refusals(self, exc: aiosmtplib.SMTPRecipientsRefused):
+        return {
+            refusal.recipient: (refusal.code, refusal.message)
+            for refusal in exc.recipients
+        }
+
+    # noinspection PyMethodMayBeStatic
+    def smtp_client(self, username: str, password: str):
+        authenticate = bool(username and password)
+        return aiosmtplib.SMTP(
+            hostname=settings.EMAIL_HOST,
+            port=int(settings.EMAIL_PORT),
+            username=username if authenticate else None,
+            password=password if authenticate else None,
+            use_tls=settings.EMAIL_USE_SSL,
+            start_tls=settings.EMAIL_USE_TLS,
+            timeout=settings.EMAIL_TIMEOUT,
+        )
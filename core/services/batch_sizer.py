@@ -0,0 +1,101 @@
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+from core.utils import TTLCache
+
+
+class BatchSizer:
+    """
+    Decides how many recipients go in the next smtp batch of a sender account. An
+    adaptive sizer grows the batch additively while batches are accepted within the
+    target latency and halves it as soon as the provider throttles a batch with a 4xx
+    reply or a batch is too slow, so it settles just below what the relay accepts.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        minimum: int,
+        maximum: int,
+        adaptive: bool = False,
+        target_latency: Optional[float] = None,
+        step: int = 10,
+    ):
+        """
+        :param size: the initial number of recipients per batch
+        :param minimum: the smallest batch an adaptive sizer shrinks to
+        :param maximum: the largest batch an adaptive sizer grows to
+        :param adaptive: whether the batch size follows the observed deliveries
+        :param target_latency: seconds a batch may take before the size shrinks
+        :param step: number of recipients added after every batch that went through
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.step = step
+        self._size = max(minimum, min(size, maximum))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def record(self, latency: float, throttled: bool):
+        """
+        adjust the batch size to the outcome of a batch
+        :param latency: seconds the batch took to send
+        :param throttled: whether the provider answered the batch with a 4xx reply
+        """
+        if not self.adaptive:
+            return
+        with self._lock:
+            if throttled or (self.target_latency and latency > self.target_latency):
+                self._size = max(self.minimum, self._size // 2)
+            else:
+                self._size = min(self.maximum, self._size + self.step)
+
+
+class BatchSizerRegistry:
+    """
+    Keeps the batch sizer of every sender account for the life of the worker
+    process, so adaptive sizes carry over from one mail task to the next
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._sizers = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(
+        self, sender_address: str, size: Optional[int] = None, adaptive: bool = False
+    ):
+        """
+        :param sender_address: the account the batches are sent from
+        :param size: the batch size of the account, defaults to settings.MAIL_BATCH_SIZE
+        :param adaptive: whether the account adapts its batch size
+        """
+        size = size or settings.MAIL_BATCH_SIZE
+        # reminder: a changed account configuration starts a fresh sizer
+        key = (settings.EMAIL_HOST, sender_address, size, bool(adaptive))
+        with self._lock:
+            sizer = self._sizers.get(key)
+            if sizer is None:
+                sizer = self._sizers.set(
+                    key,
+                    BatchSizer(
+                        size=size,
+                        minimum=settings.MAIL_BATCH_SIZE_MIN,
+                        maximum=settings.MAIL_BATCH_SIZE_MAX,
+                        adaptive=bool(adaptive),
+                        target_latency=settings.MAIL_BATCH_TARGET_LATENCY,
+                    ),
+                )
+        return sizer
+
+
+batch_sizers = BatchSizerRegistry(
+    maxsize=settings.MAIL_BATCH_SIZER_CACHE_SIZE,
+    ttl=settings.MAIL_BATCH_SIZER_CACHE_TTL,
+)
@@ -0,0 +1,66 @@
+import redis
+from django.conf import settings
+
+from core.log import logger
+from core.utils.constants import BulkMailStatusEnum
+
+
+class CampaignControl:
+    """
+    Keeps in redis whether a bulk mail was paused or cancelled, or which run of the
+    mail may send after it was resumed. Workers check it before every batch, so a
+    campaign stops within one batch of the request.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    def set_state(self, bulk_mail_id: str, state: str = None):
+        """
+        :param state: a paused or cancelled BulkMailStatusEnum value, or the run of
+        the mail allowed to send, None lets the first run of the mail send
+        """
+        if state is None:
+            self.client.delete(f"mail_campaign:{bulk_mail_id}")
+        else:
+            self.client.set(f"mail_campaign:{bulk_mail_id}", state)
+
+    def is_stopped(self, bulk_mail_id: str, run: str = None, any_run: bool = False):
+        """
+        whether the run of a bulk mail has to stop sending, either because the mail
+        was paused or cancelled or because it was resumed by a later run
+        :param any_run: whether the task sends for whichever run is allowed, like
+        retries, which only stop while the mail is paused or cancelled
+        """
+        try:
+            state = self.client.get(f"mail_campaign:{bulk_mail_id}")
+        except redis.RedisError as exc:
+            # reminder: fail open, a campaign keeps sending when redis is unavailable
+            logger.warning(f"CampaignControlError({exc})")
+            return False
+        if any_run:
+            return state is not None and state.decode() in (
+                BulkMailStatusEnum.paused.value,
+                BulkMailStatusEnum.cancelled.value,
+            )
+        # reminder: a mail that was never paused has no state and its first run
+        # carries no run, every other state stops all runs but the resumed one
+        return state is not None and state.decode() != str(run)
+
+    def is_cancelled(self, bulk_mail_id: str):
+        """
+        whether a bulk mail was cancelled, a cancelled mail is never resumed
+        """
+        try:
+            state = self.client.get(f"mail_campaign:{bulk_mail_id}")
+        except redis.RedisError as exc:
+            logger.warning(f"CampaignControlError({exc})")
+            return False
+        return (
+            state is not None and state.decode() == BulkMailStatusEnum.cancelled.value
+        )
+
+
+campaign_control = CampaignControl(
+    client=redis.Redis.from_url(settings.MAIL_CAMPAIGN_REDIS_URL)
+)
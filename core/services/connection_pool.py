@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from smtplib import SMTPException
+from typing import Optional
+
+from django.conf import settings
+from django.core import mail as django_mail
+from django.core.mail.backends.smtp import EmailBackend
+
+from core.log import logger
+
+
+class SmtpConnectionPoolTimeout(SMTPException):
+    """
+    Raised when no connection of an account is freed within the acquire timeout
+    """
+
+
+class SmtpConnectionPool:
+    """
+    A process wide pool of open smtp connections keyed by (host, sender_address).
+    Connections are authenticated once and handed back to the pool after use so
+    consecutive sends from the same account reuse a warm session instead of paying
+    the tcp, tls and auth handshake on every mail.
+    """
+
+    def __init__(self, max_size: int, idle_timeout: int, acquire_timeout: float):
+        """
+        :param max_size: maximum number of open connections per sender account
+        :param idle_timeout: seconds an idle connection is kept before it is closed
+        :param acquire_timeout: seconds to wait for a connection of a busy account
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+        self._reaper = None
+
+    @contextmanager
+    def connection(self, username: str, password: str, host: Optional[str] = None):
+        """
+        borrow an open connection for the account, returning it to the pool on exit
+        :param username: the sender address used to authenticate
+        :param password: the decrypted password of the sender account
+        :param host: the smtp host, defaults to settings.EMAIL_HOST
+        """
+        backend = self.acquire(username=username, password=password, host=host)
+        discard = True
+        try:
+            yield backend
+            discard = False
+        finally:
+            # reminder: a borrower closed early, like a generator closed mid-send,
+            # exits with a BaseException and must still free its slot
+            self.release(backend, discard=discard)
+
+    def acquire(self, username: str, password: str, host: Optional[str] = None):
+        key = (host or settings.EMAIL_HOST, username)
+        slot = self.reserve(username=username, host=host)
+        try:
+            backend = self._take_idle(key)
+            if backend is None:
+                backend = django_mail.get_connection(
+                    host=host, username=username, password=password
+                )
+                backend.open()
+        except Exception:
+            slot.release()
+            raise
+        backend.pool_key = key
+        return backend
+
+    def reserve(self, username: str, host: Optional[str] = None):
+        """
+        take one of the connection slots of the account, for sessions opened outside
+        the pool that must still count towards its max size
+        :return: the slot, released by the caller once its session is closed
+        """
+        slot = self._slot((host or settings.EMAIL_HOST, username))
+        if not slot.acquire(timeout=self.acquire_timeout):
+            raise SmtpConnectionPoolTimeout(
+                f"no connection of {username} freed within {self.acquire_timeout}s"
+            )
+        return slot
+
+    def release(self, backend: EmailBackend, discard: bool = False):
+        key = backend.pool_key
+        if discard or backend.connection is None:
+            self._close(backend)
+        else:
+            with self._lock:
+                self._idle.setdefault(key, deque()).append((backend, time.monotonic()))
+            self._start_reaper()
+        self._slot(key).release()
+
+    def reconnect(self, backend: EmailBackend):
+        """
+        replace a dropped session of a borrowed connection with a fresh one
+        """
+        self._close(backend)
+        backend.open()
+        return backend
+
+    def close_all(self):
+        with self._lock:
+            idle = [backend for pool in self._idle.values() for backend, _ in pool]
+            self._idle.clear()
+        for backend in idle:
+            self._close(backend)
+
+    def reap(self):
+        """
+        close the connections of every account that stayed idle too long
+        """
+        expired_at = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._lock:
+            for pool in self._idle.values():
+                # reminder: connections are released to the right, the oldest first
+                while pool and pool[0][1] < expired_at:
+                    expired.append(pool.popleft()[0])
+        for backend in expired:
+            self._close(backend)
+        return len(expired)
+
+    def _slot(self, key: tuple):
+        # reminder: created under the lock, so every thread shares the account's slots
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.max_size)
+        return slot
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(
+                target=self._reap_forever, name="smtp_pool_reaper", daemon=True
+            )
+        self._reaper.start()
+
+    def _reap_forever(self):
+        # reminder: idle connections are closed even when their account sends no more
+        while True:
+            time.sleep(max(self.idle_timeout, 1))
+            self.reap()
+
+    def _take_idle(self, key: tuple):
+        while True:
+            with self._lock:
+                if not self._idle.get(key):
+                    return None
+                backend, last_used = self._idle[key].pop()
+            if time.monotonic() - last_used > self.idle_timeout:
+                self._close(backend)
+            elif self._is_alive(backend):
+                return backend
+            else:
+                self._close(backend)
+
+    # noinspection PyMethodMayBeStatic
+    def _is_alive(self, backend: EmailBackend):
+        try:
+            return backend.connection.noop()[0] == 250
+        except (SMTPException, OSError, AttributeError) as exc:
+            logger.warning(f"SmtpConnectionHealthCheckError({exc})")
+            return False
+
+    # noinspection PyMethodMayBeStatic
+    def _close(self, backend: EmailBackend):
+        try:
+            backend.close()
+        except Exception as exc:
+            logger.warning(f"SmtpConnectionCloseError({exc})")
+
+
+smtp_connection_pool = SmtpConnectionPool(
+    max_size=settings.SMTP_POOL_MAX_SIZE,
+    idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+    acquire_timeout=settings.SMTP_POOL_ACQUIRE_TIMEOUT,
+)
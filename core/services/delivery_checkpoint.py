@@ -0,0 +1,112 @@
+import redis
+from django.conf import settings
+
+from core.log import logger
+
+
+class DeliveryCheckpoint:
+    """
+    Keeps in redis how many recipients of a bulk mail task were sent in order, and the
+    recipients refused among them, after every batch. A task redelivered after its
+    worker died resumes after the last batch it sent instead of its first recipient,
+    and reports the batches whose results were still buffered when the worker died.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int):
+        """
+        :param client: the redis client holding the checkpoints
+        :param ttl: seconds a checkpoint is kept after its last batch
+        """
+        self.client = client
+        self.ttl = ttl
+
+    def load(self, key: str):
+        """
+        return the number of recipients sent in order and the recipients refused
+        among them mapped to the reason
+        """
+        try:
+            with self.client.pipeline() as pipeline:
+                pipeline.get(f"mail_checkpoint:{key}")
+                pipeline.hgetall(f"mail_checkpoint:{key}:failures")
+                sent, failures = pipeline.execute()
+        except redis.RedisError as exc:
+            # reminder: fail open, the task is sent again from its first recipient
+            logger.warning(f"DeliveryCheckpointError({exc})")
+            return 0, {}
+        return int(sent or 0), {
+            address.decode(): reason.decode() for address, reason in failures.items()
+        }
+
+    def save(self, key: str, sent: int, failures: dict = None, persist: bool = False):
+        """
+        :param sent: the number of recipients sent in order
+        :param failures: the recipients refused by the last batch mapped to the reason
+        :param persist: keep the checkpoint until the task saves it again
+        """
+        try:
+            with self.client.pipeline() as pipeline:
+                pipeline.set(
+                    f"mail_checkpoint:{key}", sent, ex=None if persist else self.ttl
+                )
+                if failures:
+                    pipeline.hset(f"mail_checkpoint:{key}:failures", mapping=failures)
+                if persist:
+                    pipeline.persist(f"mail_checkpoint:{key}:failures")
+                elif failures:
+                    pipeline.expire(f"mail_checkpoint:{key}:failures", self.ttl)
+                pipeline.execute()
+        except redis.RedisError as exc:
+            logger.warning(f"DeliveryCheckpointError({exc})")
+
+    def clear(self, key: str):
+        """
+        delete the checkpoint of a task that finished, with its refused recipients
+        """
+        try:
+            self.client.delete(
+                f"mail_checkpoint:{key}", f"mail_checkpoint:{key}:failures"
+            )
+        except redis.RedisError as exc:
+            logger.warning(f"DeliveryCheckpointError({exc})")
+
+
+class DeliveryProgress:
+    """
+    The number of recipients of a task sent in order. Concurrent batches complete out
+    of order, so a batch only moves the offset once every batch before it completed.
+    """
+
+    def __init__(self, sent: int = 0):
+        self.sent = sent
+        self._positions = {}
+        self._completed = {}
+
+    def read(self, page: list):
+        """
+        remember the position of every recipient of the next page, a page is only
+        read once every batch of the previous one completed
+        """
+        self._positions = {
+            address: self.sent + index for index, address in enumerate(page)
+        }
+        self._completed = {}
+
+    def complete(self, addresses: list):
+        """
+        mark a batch of the page as completed and move the offset past every batch
+        completed in order
+        """
+        start = self._positions.get(addresses[0]) if addresses else None
+        if start is None:
+            return self.sent
+        self._completed[start] = start + len(addresses)
+        while self.sent in self._completed:
+            self.sent = self._completed.pop(self.sent)
+        return self.sent
+
+
+delivery_checkpoint = DeliveryCheckpoint(
+    client=redis.Redis.from_url(settings.MAIL_CHECKPOINT_REDIS_URL),
+    ttl=settings.MAIL_CHECKPOINT_TTL,
+)
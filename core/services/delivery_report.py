@@ -0,0 +1,62 @@
+import time
+
+
+class DeliveryReportBuffer:
+    """
+    Buffers the batch results of a mail in memory, so the delivery ledger and report
+    are written every few batches or seconds instead of after every batch
+    """
+
+    def __init__(self, flush_batches: int, flush_interval: float):
+        """
+        :param flush_batches: number of batch results buffered before a flush is due
+        :param flush_interval: seconds after the last flush when a flush is due
+        """
+        self.flush_batches = flush_batches
+        self.flush_interval = flush_interval
+        self.recipients = 0
+        self.sent_recipients = 0
+        self.comment = None
+        self.results = []
+        self._flushed_at = time.monotonic()
+
+    @property
+    def pending(self):
+        return len(self.results)
+
+    def add(self, result: dict):
+        self.recipients += result.get("recipients") or 0
+        self.sent_recipients += result.get("sent_recipients") or 0
+        self.comment = result.get("comment") or self.comment
+        self.results.append(result)
+
+    def is_due(self):
+        return (
+            self.pending >= self.flush_batches
+            or time.monotonic() - self._flushed_at >= self.flush_interval
+        )
+
+    def flush(self):
+        """
+        return the batch results buffered since the last flush and empty the buffer
+        """
+        results, self.results = self.results, []
+        self._flushed_at = time.monotonic()
+        return results
+
+    def restore(self, results: list):
+        """
+        put back the batch results of a flush that could not be written, ahead of the
+        ones added since, so the next flush writes them again
+        """
+        self.results = results + self.results
+
+    def summary(self):
+        """
+        the delivery result of every batch added so far
+        """
+        return {
+            "recipients": self.recipients,
+            "sent_recipients": self.sent_recipients,
+            "comment": self.comment,
+        }
@@ -0,0 +1,70 @@
+from app.account.repository import MailAccountRepository
+from app.bulk.repository import (
+    BulkMailRecipientRepository,
+    BulkMailRepository,
+)
+from app.single.repository import SingleMailRepository
+from core.interfaces import MailMailAttribute
+
+from .recipient_stream import RecipientStream
+
+
+class MailLoader:
+    """
+    Loads the mail a task refers to from the database, so celery messages only carry
+    the ids of the mail and its delivery report instead of its content, credentials
+    and recipients
+    """
+
+    def __init__(
+        self,
+        bulk_mail_repository: BulkMailRepository,
+        single_mail_repository: SingleMailRepository,
+        mail_account_repository: MailAccountRepository,
+        bulk_mail_recipient_repository: BulkMailRecipientRepository,
+    ):
+        self.bulk_mail_repository = bulk_mail_repository
+        self.bulk_mail_recipient_repository = bulk_mail_recipient_repository
+        self.single_mail_repository = single_mail_repository
+        self.mail_account_repository = mail_account_repository
+
+    def load(self, mail_record: dict):
+        """
+        :param mail_record: the ids of the mail, with an optional recipient_slice of
+        [start, stop] selecting the recipients of a chunk of a bulk mail
+        """
+        start, stop = mail_record.get("recipient_slice") or (0, None)
+        if mail_record.get("bulk_mail_id"):
+            mail = self.bulk_mail_repository.find_by_id(mail_record.get("bulk_mail_id"))
+            # reminder: recipients are streamed from the database as they are sent
+            recipients = RecipientStream(
+                bulk_mail_recipient_repository=self.bulk_mail_recipient_repository,
+                bulk_mail_id=mail.id,
+                start=start,
+                stop=stop,
+            )
+        else:
+            mail = self.single_mail_repository.find_by_id(
+                mail_record.get("single_mail_id")
+            )
+            recipients = mail.recipient
+        # reminder: only the owner of the mail may send it from their account
+        account = self.mail_account_repository.find(
+            filter_param={
+                "user_id": mail.user_id,
+                "mail_address": mail.sender,
+                "is_deleted": False,
+            }
+        )
+        return MailMailAttribute(
+            sender_address=account.mail_address,
+            sender_name=mail.name or account.sender_name,
+            password=account.password,
+            data_key=account.data_key,
+            batch_size=account.batch_size,
+            adaptive_batch_size=account.adaptive_batch_size,
+            recipient=recipients,
+            subject=mail.subject,
+            html_body=mail.html_body,
+            text_body=mail.text_body,
+        )
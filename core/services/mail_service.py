@@ -1,109 +1,743 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Union
+from functools import partial
+from itertools import chain, islice
+from smtplib import (
+    SMTPRecipientsRefused,
+    SMTPResponseException,
+    SMTPServerDisconnected,
+)
+from typing import Callable, Iterable, Iterator, Union
 
-from django.core import mail as django_mail
+from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import sanitize_address
+from django.db import transaction
 
 from app.account.models import MailAccountModel
-from app.delivery.repository import MailDeliveryRepository
+from app.bulk.repository import (
+    BulkMailRecipientRepository,
+    BulkMailRepository,
+)
+from app.delivery.repository import (
+    MailDeliveryBatchRepository,
+    MailDeliveryRepository,
+)
 from core.exceptions import AppException
 from core.interfaces import MailMailAttribute, MailServiceInterface
 from core.log import logger
-from core.utils.constants import MailDeliveryStatusEnum
+from core.utils.constants import (
+    BulkMailStatusEnum,
+    MailDeliveryStatusEnum,
+    MailEnvelopeModeEnum,
+    MailRecipientStatusEnum,
+)
+
+from .batch_sizer import BatchSizer, batch_sizers
+from .campaign_control import campaign_control
+from .connection_pool import smtp_connection_pool
+from .delivery_checkpoint import DeliveryProgress, delivery_checkpoint
+from .delivery_report import DeliveryReportBuffer
+from .rate_limiter import mail_rate_limiter
+from .rendered_mail import RenderedMail
 
 
 class MailService(MailServiceInterface):
     client = "QuantumMailServer"
+    connection_pool = smtp_connection_pool
+    rate_limiter = mail_rate_limiter
+    checkpoint = delivery_checkpoint
+    campaign_control = campaign_control
 
-    def __init__(self, mail_delivery_repository: MailDeliveryRepository):
+    def __init__(
+        self,
+        mail_delivery_repository: MailDeliveryRepository,
+        mail_delivery_batch_repository: MailDeliveryBatchRepository,
+        bulk_mail_recipient_repository: BulkMailRecipientRepository,
+        bulk_mail_repository: BulkMailRepository,
+    ):
         self.mail_delivery_repository = mail_delivery_repository
+        self.mail_delivery_batch_repository = mail_delivery_batch_repository
+        self.bulk_mail_recipient_repository = bulk_mail_recipient_repository
+        self.bulk_mail_repository = bulk_mail_repository
         self.error = False
 
     def send(self, mail_attribute: MailMailAttribute, **kwargs):
-        sender_address = mail_attribute.get("sender_address")
-        sender_name = mail_attribute.get("sender_name")
-        recipients = self._recipients(mail_attribute.get("recipient"))
+        summary = self.deliver(mail_attribute=mail_attribute, **kwargs)
+        if not summary.get("stopped"):
+            self.complete(**kwargs)
+        self.error = summary.get("sent_recipients") != summary.get("recipients")
+        return self.error
+
+    def send_chunk(self, mail_attribute: MailMailAttribute, **kwargs):
+        """
+        send a chunk of a bulk mail and return its aggregated delivery result. Chunks
+        roll their batches up onto the shared delivery report as they go
+        :param mail_attribute: the mail to send, carrying the recipients of the chunk
+        """
+        return self.deliver(mail_attribute=mail_attribute, **kwargs)
+
+    def finalise_delivery(self, results: list, **kwargs):
+        """
+        report whether a mail sent in chunks failed for any recipient once every
+        chunk completes, the delivery report was rolled up by the chunks themselves
+        :param results: the summaries returned by send_chunk for every chunk
+        """
+        if not any(result.get("stopped") for result in results):
+            self.complete(**kwargs)
+        total = sum(result.get("recipients") for result in results)
+        sent = sum(result.get("sent_recipients") for result in results)
+        return sent != total
+
+    def retry(self, mail_attribute: MailMailAttribute, **kwargs):
+        """
+        re-send only the recipients of the mail that were not sent by earlier batches
+        and return whether any of them failed again
+        :param mail_attribute: the mail to send, its recipients are ignored
+        """
+        # reminder: the failures of a stopped mail are left in the delivery ledger
+        # instead of being claimed by a retry that would not send them
+        stopped = self.campaign_stopped(is_retry=True, **kwargs)
+        if stopped and stopped():
+            logger.info(f"DeliveryRetryStopped({kwargs})")
+            return False
+        batches = self.mail_delivery_batch_repository.claim_failures(
+            delivery_id=kwargs.get("delivery_id")
+        )
+        # reminder: recipients refused with a permanent 5xx reply would be refused again
+        recipients = [
+            address
+            for batch in batches
+            for address, reason in batch.failures.items()
+            if not self.is_permanent(reason)
+        ]
+        if not recipients:
+            return False
+        report = self.delivery_report()
         try:
-            with django_mail.get_connection(
-                username=sender_address,
-                password=MailAccountModel.decrypt_text(
-                    passkey=sender_address,
-                    encrypted_text=mail_attribute.get("password"),
-                ),
-            ) as connection:
-                for addresses in self.send_in_batches(recipients=recipients, size=100):
-                    try:
-                        mail = EmailMultiAlternatives(
-                            subject=mail_attribute.get("subject"),
-                            body=mail_attribute.get("text_body"),
-                            from_email=f"{sender_name} <{sender_address}>",
-                            to=addresses,
-                            connection=connection,
-                        )
-                        mail.attach_alternative(
-                            mail_attribute.get("html_body"), "text/html"
+            summary = self.deliver(
+                mail_attribute={**mail_attribute, "recipient": recipients},
+                is_retry=True,
+                report=report,
+                **kwargs,
+            )
+        except Exception:
+            self.release_failures(batches=batches)
+            raise
+        if report.pending:
+            self.release_failures(batches=batches)
+        return summary.get("sent_recipients") != summary.get("recipients")
+
+    def complete(self, **kwargs):
+        """
+        mark a bulk mail completed once every recipient was sent to, a completed mail
+        is never paused and resumed to be sent again
+        """
+        if not kwargs.get("bulk_mail_id"):
+            return None
+        # reminder: a mail paused after its last batch was sent still completed, a
+        # cancelled mail stays cancelled
+        return self.bulk_mail_repository.update_all(
+            filter_param={
+                "id": kwargs.get("bulk_mail_id"),
+                "status__in": [
+                    BulkMailStatusEnum.active.value,
+                    BulkMailStatusEnum.paused.value,
+                ],
+            },
+            obj_data={"status": BulkMailStatusEnum.completed.value},
+        )
+
+    def release_failures(self, batches: list):
+        # reminder: the outcome of the retry was not recorded, so its batches are
+        # claimed again by the next retry instead of being lost
+        logger.warning(f"DeliveryRetryReleased({len(batches)} batches)")
+        self.mail_delivery_batch_repository.release_failures(
+            batch_ids=[batch.id for batch in batches]
+        )
+
+    def deliver(
+        self,
+        mail_attribute: MailMailAttribute,
+        is_retry: bool = False,
+        report: DeliveryReportBuffer = None,
+        **kwargs,
+    ):
+        """
+        send the mail in batches, record every batch in the delivery ledger, roll the
+        counts up onto the delivery report and return the aggregated delivery result
+        :param is_retry: whether the recipients are already counted on the report
+        :param report: the buffer of the delivery report, holding the results that
+        could not be written once the delivery returns
+        :return: the delivery result, stopped when the mail was paused, cancelled or
+        resumed before every recipient was sent
+        """
+        recipients = iter(self._recipients(mail_attribute.get("recipient")))
+        report = report or self.delivery_report()
+        checkpoint_key = self.checkpoint_key(is_retry=is_retry, **kwargs)
+        progress = DeliveryProgress()
+        stopped = self.campaign_stopped(is_retry=is_retry, **kwargs)
+        page, reported, halted, paused = [], 0, False, False
+        try:
+            if checkpoint_key:
+                recipients = self.resume(
+                    checkpoint_key=checkpoint_key,
+                    recipients=recipients,
+                    report=report,
+                    progress=progress,
+                    **kwargs,
+                )
+            password = MailAccountModel.decrypt_text(
+                passkey=mail_attribute.get("sender_address"),
+                encrypted_text=mail_attribute.get("password"),
+                data_key=mail_attribute.get("data_key"),
+            )
+            # reminder: recipients are sent a page at a time, so a mail streaming its
+            # recipients from the database is never held in memory as a whole
+            while page := list(islice(recipients, settings.MAIL_RECIPIENT_PAGE_SIZE)):
+                reported = report.recipients
+                progress.read(page)
+                for result in self.send_batches(
+                    mail_attribute=mail_attribute,
+                    recipients=page,
+                    password=password,
+                    stopped=stopped,
+                ):
+                    report.add(result)
+                    if checkpoint_key:
+                        self.checkpoint.save(
+                            key=checkpoint_key,
+                            sent=progress.complete(result.get("addresses")),
+                            failures=result.get("failed_recipients"),
                         )
-                        mail.send()
-                        self.update_delivery_report(
-                            obj_data={
-                                "date_sent": datetime.now(timezone.utc),
-                                "delivery_id": kwargs.get("delivery_id"),
-                                "single_mail_id": kwargs.get("single_mail_id"),
-                                "bulk_mail_id": kwargs.get("bulk_mail_id"),
-                                "status": MailDeliveryStatusEnum.sent_to_provider.value,
-                                "recipients": len(addresses),
-                            }
+                    if report.is_due():
+                        # reminder: a failed write never stops the batches still being
+                        # sent, its results are written by a later flush
+                        self.flush_remaining_report(
+                            report=report, is_retry=is_retry, **kwargs
                         )
-                    except Exception as exc:
-                        self.error = True
-                        self.update_delivery_report(
-                            obj_data={
-                                "delivery_id": kwargs.get("delivery_id"),
-                                "single_mail_id": kwargs.get("single_mail_id"),
-                                "bulk_mail_id": kwargs.get("bulk_mail_id"),
-                                "status": MailDeliveryStatusEnum.not_sent_to_provider.value,
-                                "recipients": len(addresses),
-                                "comment": f"{exc.args}",
-                            }
+                # reminder: send_batches only sends fewer recipients than the page
+                # once the mail was stopped, so the flag is not read again
+                if report.recipients - reported < len(page):
+                    halted = True
+                    logger.info(f"DeliveryStopped({kwargs})")
+                    paused = not self.campaign_control.is_cancelled(
+                        bulk_mail_id=kwargs.get("bulk_mail_id")
+                    )
+                    if checkpoint_key and paused:
+                        # reminder: a paused mail resumes from its checkpoint however
+                        # long it stays paused
+                        self.checkpoint.save(
+                            key=checkpoint_key, sent=progress.sent, persist=True
                         )
-                        logger.error(f"{exc}")
+                    break
         except Exception as exc:
-            self.error = True
-            self.update_delivery_report(
-                obj_data={
-                    "delivery_id": kwargs.get("delivery_id"),
-                    "single_mail_id": kwargs.get("single_mail_id"),
-                    "bulk_mail_id": kwargs.get("bulk_mail_id"),
-                    "status": MailDeliveryStatusEnum.not_sent_to_provider.value,
-                    "recipients": len(recipients),
-                    "comment": f"{exc.args}",
-                }
+            logger.error(f"{exc}")
+            # reminder: batches are reported in order, so the recipients not reported
+            # yet are the rest of the page and the pages not read yet
+            unsent = chain(page[report.recipients - reported :], recipients)
+            while addresses := list(islice(unsent, settings.MAIL_RECIPIENT_PAGE_SIZE)):
+                report.add(self.batch_result(addresses=addresses, exc=exc))
+                if report.is_due():
+                    self.flush_remaining_report(
+                        report=report, is_retry=is_retry, **kwargs
+                    )
+        if report.pending:
+            self.flush_remaining_report(report=report, is_retry=is_retry, **kwargs)
+        if checkpoint_key and not paused:
+            # reminder: a task that finished is never resumed
+            self.checkpoint.clear(key=checkpoint_key)
+        return {**report.summary(), "stopped": halted}
+
+    # noinspection PyMethodMayBeStatic
+    def delivery_report(self):
+        return DeliveryReportBuffer(
+            flush_batches=settings.MAIL_DELIVERY_FLUSH_BATCHES,
+            flush_interval=settings.MAIL_DELIVERY_FLUSH_INTERVAL,
+        )
+
+    def campaign_stopped(self, is_retry: bool = False, **kwargs):
+        """
+        the check telling a bulk mail task that its mail was paused, cancelled or
+        resumed by a later run, single mails are never stopped
+        :param is_retry: whether the task retries failures, which belong to no run
+        """
+        if not kwargs.get("bulk_mail_id"):
+            return None
+        return partial(
+            self.campaign_control.is_stopped,
+            bulk_mail_id=kwargs.get("bulk_mail_id"),
+            run=kwargs.get("run"),
+            any_run=is_retry,
+        )
+
+    # noinspection PyMethodMayBeStatic
+    def checkpoint_key(self, is_retry: bool = False, **kwargs):
+        """
+        the checkpoint of a bulk mail task, retries send recipients claimed from the
+        delivery ledger and are never checkpointed
+        """
+        if is_retry or not kwargs.get("bulk_mail_id"):
+            return None
+        start, _ = kwargs.get("recipient_slice") or (0, None)
+        return f"{kwargs.get('delivery_id')}:{start}"
+
+    def resume(
+        self,
+        checkpoint_key: str,
+        recipients: Iterator[str],
+        report: DeliveryReportBuffer,
+        progress: DeliveryProgress,
+        **kwargs,
+    ):
+        """
+        skip the recipients a redelivered task already sent and report the ones it
+        sent after its delivery report was last written, which are still pending
+        """
+        sent, failures = self.checkpoint.load(key=checkpoint_key)
+        if not sent:
+            return recipients
+        logger.info(f"DeliveryResumed({checkpoint_key} | {sent})")
+        progress.sent = sent
+        start, _ = kwargs.get("recipient_slice") or (0, None)
+        unreported = iter(
+            self.bulk_mail_recipient_repository.find_addresses(
+                bulk_mail_id=kwargs.get("bulk_mail_id"),
+                start=start,
+                stop=start + sent,
+                status=MailRecipientStatusEnum.pending.value,
+            )
+        )
+        while addresses := list(islice(unreported, settings.MAIL_BATCH_SIZE)):
+            report.add(
+                self.batch_result(
+                    addresses=addresses,
+                    refused={
+                        address: failures[address]
+                        for address in addresses
+                        if address in failures
+                    },
+                )
+            )
+        return islice(recipients, sent, None)
+
+    def send_batches(
+        self,
+        mail_attribute: MailMailAttribute,
+        recipients: list,
+        password: str,
+        stopped: Callable[[], bool] = None,
+    ):
+        """
+        send the recipients in batches and yield the delivery result of each batch
+        :param mail_attribute: the mail to send
+        :param recipients: the recipients of the mail
+        :param password: the decrypted password of the sender account
+        :param stopped: checked before every batch, no batch is sent once it is true
+        """
+        sizer = self.batch_sizer(mail_attribute=mail_attribute)
+        batches = self.send_in_batches(
+            recipients=recipients, sizer=sizer, stopped=stopped
+        )
+        rendered = self.render_mail(mail_attribute=mail_attribute)
+        # reminder: never open more connections than the account is allowed in the pool
+        concurrency = min(
+            settings.MAIL_BATCH_CONCURRENCY, self.connection_pool.max_size
+        )
+        if concurrency > 1:
+            yield from self.send_batches_concurrently(
+                mail_attribute=mail_attribute,
+                batches=batches,
+                password=password,
+                concurrency=concurrency,
+                sizer=sizer,
+                rendered=rendered,
+            )
+            return
+        with self.connection_pool.connection(
+            username=mail_attribute.get("sender_address"), password=password
+        ) as connection:
+            for addresses in batches:
+                yield self.send_sized_batch(
+                    sizer=sizer,
+                    mail_attribute=mail_attribute,
+                    addresses=addresses,
+                    connection=connection,
+                    rendered=rendered,
+                )
+
+    def send_batches_concurrently(
+        self,
+        mail_attribute: MailMailAttribute,
+        batches: Iterator[list],
+        password: str,
+        concurrency: int,
+        sizer: BatchSizer,
+        rendered: RenderedMail = None,
+    ):
+        """
+        dispatch the batches over concurrency pooled connections, each worker thread
+        holding one connection and pulling the next batch until none is left. The
+        results are yielded on the calling thread so delivery reports are written
+        from a single database connection
+        """
+        results, lock, errors = queue.Queue(), threading.Lock(), []
+
+        def worker():
+            try:
+                with self.connection_pool.connection(
+                    username=mail_attribute.get("sender_address"), password=password
+                ) as connection:
+                    while True:
+                        with lock:
+                            addresses = next(batches, None)
+                        if addresses is None:
+                            return
+                        results.put(
+                            self.send_sized_batch(
+                                sizer=sizer,
+                                mail_attribute=mail_attribute,
+                                addresses=addresses,
+                                connection=connection,
+                                rendered=rendered,
+                            )
+                        )
+            except Exception as exc:
+                errors.append(exc)
+                logger.error(f"{exc}")
+            finally:
+                results.put(None)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+            running = concurrency
+            while running:
+                result = results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+        if errors:
+            # reminder: every worker failed before the batches were exhausted
+            for addresses in batches:
+                yield self.batch_result(addresses=addresses, exc=errors[0])
+
+    def send_sized_batch(self, sizer: BatchSizer, **kwargs):
+        """
+        wait for the rate limit of the account to allow the batch, send it and feed
+        how long it took and whether it was throttled back to the batch sizer
+        """
+        self.rate_limiter.acquire(
+            key=kwargs["mail_attribute"].get("sender_address"),
+            tokens=len(kwargs["addresses"]),
+        )
+        started = time.monotonic()
+        result = self.send_batch(**kwargs)
+        sizer.record(
+            latency=time.monotonic() - started, throttled=result.get("throttled")
+        )
+        return result
+
+    def send_batch(
+        self,
+        mail_attribute: MailMailAttribute,
+        addresses: list,
+        connection,
+        rendered: RenderedMail = None,
+    ):
+        try:
+            if rendered:
+                refused = self.send_rendered(
+                    rendered=rendered, addresses=addresses, connection=connection
+                )
+                return self.batch_result(addresses=addresses, refused=refused)
+            mail = self.build_mail(
+                mail_attribute=mail_attribute,
+                addresses=addresses,
+                connection=connection,
             )
+            self.send_message(message=mail, connection=connection)
+            return self.batch_result(addresses=addresses)
+        except SMTPRecipientsRefused as exc:
+            return self.batch_result(
+                addresses=addresses,
+                refused=self.refusals(exc.recipients, addresses=addresses),
+            )
+        except Exception as exc:
             logger.error(f"{exc}")
+            return self.batch_result(addresses=addresses, exc=exc)
 
-        return self.error
+    # noinspection PyMethodMayBeStatic
+    def build_mail(
+        self, mail_attribute: MailMailAttribute, addresses: list, connection=None
+    ):
+        mail = EmailMultiAlternatives(
+            subject=mail_attribute.get("subject"),
+            body=mail_attribute.get("text_body"),
+            from_email=(
+                f"{mail_attribute.get('sender_name')} "
+                f"<{mail_attribute.get('sender_address')}>"
+            ),
+            to=addresses,
+            connection=connection,
+        )
+        mail.attach_alternative(mail_attribute.get("html_body"), "text/html")
+        return mail
+
+    def render_mail(self, mail_attribute: MailMailAttribute):
+        """
+        encode the mail once for all its batches when settings.MAIL_PRERENDER_MESSAGE
+        is enabled or recipients get their own envelope, otherwise every batch builds
+        and encodes its own message
+        """
+        if (
+            not settings.MAIL_PRERENDER_MESSAGE
+            and settings.MAIL_ENVELOPE_MODE == MailEnvelopeModeEnum.batch.value
+        ):
+            return None
+        return RenderedMail(
+            self.build_mail(mail_attribute=mail_attribute, addresses=[])
+        )
+
+    # noinspection PyMethodMayBeStatic
+    def batch_result(
+        self, addresses: list, exc: Exception = None, refused: dict = None
+    ):
+        """
+        the delivery result of a batch
+        :param addresses: the recipients of the batch
+        :param exc: the exception that failed the whole batch
+        :param refused: the recipients refused by the provider mapped to the reason
+        """
+        if exc:
+            refused = dict.fromkeys(addresses, f"{exc.args}")
+        refused = refused or {}
+        sent = len(addresses) - len(refused)
+        if not refused:
+            status = MailDeliveryStatusEnum.sent_to_provider.value
+        elif sent:
+            status = MailDeliveryStatusEnum.partially_sent_to_provider.value
+        else:
+            status = MailDeliveryStatusEnum.not_sent_to_provider.value
+        return {
+            "date_sent": datetime.now(timezone.utc) if sent else None,
+            "status": status,
+            "addresses": addresses,
+            "recipients": len(addresses),
+            "sent_recipients": sent,
+            "failed_recipients": refused,
+            "throttled": self.is_throttled(exc=exc, refused=refused),
+            "comment": f"{exc.args}" if exc else (refused or None),
+        }
+
+    # noinspection PyMethodMayBeStatic
+    def is_throttled(self, exc: Exception = None, refused: dict = None):
+        """
+        whether the provider answered with a transient 4xx reply, which is how relays
+        signal too many recipients or too high a rate
+        """
+        code = getattr(exc, "smtp_code", None) or getattr(exc, "code", None)
+        if isinstance(code, int) and 400 <= code < 500:
+            return True
+        # reminder: refusal reasons start with the smtp reply code
+        return any(reason.startswith("4") for reason in (refused or {}).values())
+
+    # noinspection PyMethodMayBeStatic
+    def is_permanent(self, reason: str):
+        """
+        whether a recipient failed with a permanent 5xx reply, either a refusal reason
+        or the arguments of the smtp exception that failed its batch
+        """
+        return bool(re.match(r"\(?5\d\d\b", str(reason)))
+
+    # noinspection PyMethodMayBeStatic
+    def batch_sizer(self, mail_attribute: MailMailAttribute):
+        return batch_sizers.get(
+            sender_address=mail_attribute.get("sender_address"),
+            size=mail_attribute.get("batch_size"),
+            adaptive=mail_attribute.get("adaptive_batch_size"),
+        )
 
-    def update_delivery_report(self, obj_data: dict):
+    def send_message(self, message: EmailMultiAlternatives, connection):
         try:
-            self.mail_delivery_repository.update_by_id(
-                obj_id=obj_data.get("delivery_id"),
-                obj_data={
-                    "status": obj_data.get("status"),
-                    "provider": self.client,
-                    "single_mail_id": obj_data.get("single_mail_id"),
-                    "bulk_mail_id": obj_data.get("bulk_mail_id"),
-                    "total_recipients": obj_data.get("recipients"),
-                    "comment": obj_data.get("comment"),
-                    "date_sent": obj_data.get("date_sent"),
-                },
+            return message.send()
+        except SMTPServerDisconnected:
+            # reminder: pooled session was dropped by the server, reconnect and retry
+            self.connection_pool.reconnect(connection)
+            return message.send()
+
+    def send_rendered(self, rendered: RenderedMail, addresses: list, connection):
+        """
+        send the rendered mail to the addresses and return the refused recipients.
+        In recipient envelope mode every recipient gets its own message over the same
+        connection, so one bad address never fails the rest of the batch
+        """
+        if settings.MAIL_ENVELOPE_MODE != MailEnvelopeModeEnum.recipient.value:
+            return self.refusals(
+                self.sendmail(
+                    rendered=rendered, addresses=addresses, connection=connection
+                ),
+                addresses=addresses,
             )
+        refused = {}
+        for address in addresses:
+            try:
+                refused.update(
+                    self.sendmail(
+                        rendered=rendered, addresses=[address], connection=connection
+                    )
+                )
+            except SMTPRecipientsRefused as exc:
+                refused.update(exc.recipients)
+            except SMTPResponseException as exc:
+                refused[address] = (exc.smtp_code, exc.smtp_error)
+        return self.refusals(refused, addresses=addresses)
+
+    def sendmail(self, rendered: RenderedMail, addresses: list, connection):
+        recipients = rendered.recipients(addresses)
+        message = rendered.as_bytes(addresses)
+        try:
+            return connection.connection.sendmail(
+                rendered.from_email, recipients, message
+            )
+        except SMTPServerDisconnected:
+            # reminder: pooled session was dropped by the server, reconnect and retry
+            self.connection_pool.reconnect(connection)
+            return connection.connection.sendmail(
+                rendered.from_email, recipients, message
+            )
+
+    # noinspection PyMethodMayBeStatic
+    def refusals(self, refused: dict, addresses: list = ()):
+        """
+        convert the (code, message) refusals returned by smtplib to readable reasons
+        :param addresses: the addresses of the batch, smtplib reports refusals by the
+        sanitized envelope recipients, which are mapped back to the addresses stored
+        """
+        originals = {
+            sanitize_address(address, settings.DEFAULT_CHARSET): address
+            for address in addresses
+        }
+        return {
+            originals.get(recipient, recipient): " ".join(
+                part.decode("utf-8", "replace")
+                if isinstance(part, bytes)
+                else str(part)
+                for part in reason
+            )
+            for recipient, reason in refused.items()
+        }
+
+    def flush_delivery_report(
+        self, report: DeliveryReportBuffer, is_retry: bool = False, **kwargs
+    ):
+        results = report.flush()
+        comments = [
+            result.get("comment") for result in results if result.get("comment")
+        ]
+        mail_ids = {
+            field: kwargs.get(field)
+            for field in ("single_mail_id", "bulk_mail_id")
+            if kwargs.get(field)
+        }
+        try:
+            with transaction.atomic():
+                self.mail_delivery_repository.rollup_by_id(
+                    obj_id=kwargs.get("delivery_id"),
+                    # reminder: retried recipients were counted when they first failed
+                    recipients=(
+                        0
+                        if is_retry
+                        else sum(result.get("recipients") for result in results)
+                    ),
+                    sent_recipients=sum(
+                        result.get("sent_recipients") for result in results
+                    ),
+                    obj_data={
+                        **mail_ids,
+                        **({"comment": comments[-1]} if comments else {}),
+                        "provider": self.client,
+                        "updated_at": datetime.now(timezone.utc),
+                    },
+                )
+                self.mail_delivery_batch_repository.bulk_create(
+                    objs_data=[
+                        {
+                            "delivery_id": kwargs.get("delivery_id"),
+                            "status": result.get("status"),
+                            "total_recipients": result.get("recipients"),
+                            "sent_recipients": result.get("sent_recipients"),
+                            "failures": result.get("failed_recipients") or None,
+                            "date_sent": result.get("date_sent"),
+                        }
+                        for result in results
+                    ]
+                )
+                if kwargs.get("bulk_mail_id"):
+                    self.update_recipient_status(
+                        bulk_mail_id=kwargs.get("bulk_mail_id"), results=results
+                    )
         except AppException.NotFoundException:
-            logger.warning(f"DeliveryReportUpdateError({obj_data})")
+            logger.warning(f"DeliveryReportUpdateError({kwargs})")
+        except Exception:
+            # reminder: the results are only dropped once they are committed
+            report.restore(results)
+            raise
+
+    def flush_remaining_report(
+        self, report: DeliveryReportBuffer, is_retry: bool = False, **kwargs
+    ):
+        """
+        flush the delivery report without letting a failed write stop the delivery.
+        Results that cannot be written stay buffered for the next flush and are
+        logged if the last flush fails too
+        """
+        try:
+            self.flush_delivery_report(report=report, is_retry=is_retry, **kwargs)
+        except Exception as exc:
+            logger.error(
+                f"DeliveryReportUpdateError({kwargs} | {report.pending} batches | {exc})"
+            )
+
+    def update_recipient_status(self, bulk_mail_id: str, results: list):
+        """
+        mark the recipients of the batch results of a bulk mail as sent or failed
+        """
+        sent, failed = [], []
+        for result in results:
+            refused = result.get("failed_recipients") or {}
+            failed.extend(refused)
+            sent.extend(
+                address for address in result.get("addresses") if address not in refused
+            )
+        for addresses, status in (
+            (sent, MailRecipientStatusEnum.sent.value),
+            (failed, MailRecipientStatusEnum.failed.value),
+        ):
+            self.bulk_mail_recipient_repository.update_status(
+                bulk_mail_id=bulk_mail_id, addresses=addresses, status=status
+            )
 
     # noinspection PyMethodMayBeStatic
-    def send_in_batches(self, recipients: list, size: int):
-        for _ in range(0, len(recipients), size):
-            yield recipients[_ : size + _]
+    def send_in_batches(
+        self,
+        recipients: list,
+        sizer: BatchSizer,
+        stopped: Callable[[], bool] = None,
+    ):
+        start = 0
+        while start < len(recipients):
+            if stopped and stopped():
+                return
+            # reminder: read the size per batch so an adapted size applies at once
+            size = sizer.size
+            yield recipients[start : start + size]
+            start += size
 
-    def _recipients(self, recipient: Union[list, str]):
-        return recipient if isinstance(recipient, list) else [recipient]
+    def _recipients(self, recipient: Union[Iterable[str], str]):
+        return [recipient] if isinstance(recipient, str) else recipient
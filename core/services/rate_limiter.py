@@ -0,0 +1,87 @@
+import time
+
+import redis
+from django.conf import settings
+
+from core.log import logger
+
+# reminder: refill and take from the bucket atomically on the redis clock, so every
+# worker thread and container shares one budget and one notion of time
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+local needed = math.min(requested, capacity)
+if tokens >= needed then
+    tokens = tokens - requested
+else
+    wait = (needed - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated_at", now)
+redis.call("EXPIRE", KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(wait)
+"""
+
+
+class TokenBucketRateLimiter:
+    """
+    A token bucket kept in redis per sender account. Every recipient of a batch takes
+    a token and tokens refill at rate per second up to capacity, so all the workers
+    sending from an account stay together just under the provider's ceiling.
+    """
+
+    def __init__(self, client: redis.Redis, rate: float, capacity: int):
+        """
+        :param client: the redis client holding the buckets
+        :param rate: tokens added to a bucket per second, 0 disables the limiter
+        :param capacity: maximum tokens a bucket holds, the largest burst allowed
+        """
+        self.client = client
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, key: str, tokens: int = 1):
+        """
+        block until the bucket of key holds tokens and take them
+        """
+        while True:
+            wait = self.try_acquire(key=key, tokens=tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self, key: str, tokens: int = 1):
+        """
+        take tokens from the bucket of key if it holds enough, and return the
+        seconds to wait before trying again otherwise. A request larger than the
+        bucket is granted once it is full and leaves it in debt, so the requests
+        after it wait until the whole request was paid for
+        """
+        if not self.rate:
+            return 0
+        try:
+            return float(
+                self._script(
+                    keys=[f"mail_rate_limit:{key}"],
+                    args=[self.rate, self.capacity, tokens],
+                )
+            )
+        except redis.RedisError as exc:
+            # reminder: fail open, the provider still enforces its own limits
+            logger.warning(f"RateLimiterError({exc})")
+            return 0
+
+
+mail_rate_limiter = TokenBucketRateLimiter(
+    client=redis.Redis.from_url(settings.MAIL_RATE_LIMIT_REDIS_URL),
+    rate=settings.MAIL_RATE_LIMIT,
+    capacity=settings.MAIL_RATE_LIMIT_BURST,
+)
@@ -0,0 +1,36 @@
+from django.conf import settings
+
+from app.bulk.repository import BulkMailRecipientRepository
+
+
+class RecipientStream:
+    """
+    The recipients of a bulk mail, read from the database with a server-side cursor a
+    page at a time every time they are iterated, so a worker holds a page of a
+    campaign in memory however many recipients it has
+    """
+
+    def __init__(
+        self,
+        bulk_mail_recipient_repository: BulkMailRecipientRepository,
+        bulk_mail_id: str,
+        start: int = 0,
+        stop: int = None,
+    ):
+        """
+        :param bulk_mail_id: the bulk mail the recipients belong to
+        :param start: position of the first recipient, in the order they were stored
+        :param stop: position after the last recipient, None for the last one
+        """
+        self.bulk_mail_recipient_repository = bulk_mail_recipient_repository
+        self.bulk_mail_id = bulk_mail_id
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self):
+        return self.bulk_mail_recipient_repository.iter_addresses(
+            bulk_mail_id=self.bulk_mail_id,
+            start=self.start,
+            stop=self.stop,
+            chunk_size=settings.MAIL_RECIPIENT_PAGE_SIZE,
+        )
@@ -0,0 +1,34 @@
+from email.utils import make_msgid
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+
+
+class RenderedMail:
+    """
+    A mail whose mime message is encoded to bytes once and reused for every batch,
+    only the To and Message-ID headers and the envelope recipients change per batch
+    """
+
+    def __init__(self, mail: EmailMultiAlternatives):
+        """
+        :param mail: the mail to render, built without recipients
+        """
+        self.encoding = mail.encoding or settings.DEFAULT_CHARSET
+        self.from_email = sanitize_address(mail.from_email, self.encoding)
+        message = mail.message()
+        del message["To"]
+        del message["Message-ID"]
+        self.payload = message.as_bytes(linesep="\r\n")
+
+    def recipients(self, addresses: list):
+        return [sanitize_address(address, self.encoding) for address in addresses]
+
+    def as_bytes(self, addresses: list):
+        # reminder: fold the To header with one address per line so it stays within
+        # the smtp line length limit however many recipients the batch has
+        to = ",\r\n ".join(self.recipients(addresses))
+        headers = f"To: {to}\r\nMessage-ID: {make_msgid(domain=DNS_NAME)}\r\n"
+        return headers.encode("ascii") + self.payload
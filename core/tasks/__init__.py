@@ -1 +1,6 @@
-from .send_mail import send_mail_task
+from .send_mail import (
+    finalise_delivery_task,
+    retry_failed_recipients_task,
+    send_mail_chunk_task,
+    send_mail_task,
+)
@@ -1,24 +1,131 @@
 import pinject
 from celery import shared_task
+from celery.signals import worker_shutdown
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.utils.module_loading import import_string
 
-from app.delivery.repository import MailDeliveryRepository
+from app.account.repository import MailAccountRepository
+from app.bulk.repository import (
+    BulkMailRecipientRepository,
+    BulkMailRepository,
+)
+from app.delivery.repository import (
+    MailDeliveryBatchRepository,
+    MailDeliveryRepository,
+)
+from app.single.repository import SingleMailRepository
+from core.exceptions import AppException
 from core.interfaces import MailMailAttribute
 from core.log import logger
-from core.services import MailService
+from core.services import MailLoader, MailService, smtp_connection_pool
 
+# reminder: the mail service implementation is selected with settings.MAIL_SERVICE
+mail_service_class = import_string(settings.MAIL_SERVICE)
 obj_graph = pinject.new_object_graph(
     modules=None,
-    classes=[MailService, MailDeliveryRepository],
+    classes=[
+        mail_service_class,
+        MailDeliveryRepository,
+        MailDeliveryBatchRepository,
+        MailLoader,
+        BulkMailRepository,
+        BulkMailRecipientRepository,
+        SingleMailRepository,
+        MailAccountRepository,
+    ],
 )
-mail_service: MailService = obj_graph.provide(MailService)
+mail_service: MailService = obj_graph.provide(mail_service_class)
+mail_loader: MailLoader = obj_graph.provide(MailLoader)
 
 
-@shared_task()
-def send_mail_task(mail_attr: MailMailAttribute, mail_record: dict):
+# reminder: mail tasks are acknowledged once they finish, so the task of a worker
+# that died is redelivered and resumes from the checkpoint of its last batch
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def send_mail_task(mail_record: dict, mail_attr: MailMailAttribute = None):
     """Sends an email when the feedback form has been submitted."""
     logger.info("Task [send_mail_task | processing]")
+    mail_attr = mail_attr or load_mail(mail_record=mail_record)
+    if not mail_attr:
+        return "Task [send_mail_task | end]"
     if mail_service.send(mail_attribute=mail_attr, **mail_record):
         logger.error("Task [send_email_task | error]\n")
+        schedule_retry(mail_record=mail_record)
     else:
         logger.info("Task [send_email_task| successful]\n")
     return "Task [send_mail_task | end]"
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def send_mail_chunk_task(mail_record: dict, mail_attr: MailMailAttribute = None):
+    """Sends one chunk of a bulk mail dispatched as part of a chord."""
+    logger.info(f"Task [send_mail_chunk_task | processing | {mail_record}]")
+    mail_attr = mail_attr or load_mail(mail_record=mail_record)
+    if not mail_attr:
+        return {"recipients": 0, "sent_recipients": 0, "comment": None}
+    return mail_service.send_chunk(mail_attribute=mail_attr, **mail_record)
+
+
+@shared_task()
+def finalise_delivery_task(results: list, mail_record: dict):
+    """Reports the outcome of a bulk mail once every chunk has been sent."""
+    if mail_service.finalise_delivery(results=results, **mail_record):
+        logger.error("Task [finalise_delivery_task | error]\n")
+        schedule_retry(mail_record=mail_record)
+    else:
+        logger.info("Task [finalise_delivery_task | successful]\n")
+    return "Task [finalise_delivery_task | end]"
+
+
+@shared_task(bind=True, max_retries=settings.MAIL_RETRY_MAX_ATTEMPTS)
+def retry_failed_recipients_task(
+    self, mail_record: dict, mail_attr: MailMailAttribute = None
+):
+    """Re-sends only the recipients of a mail that failed, backing off between tries."""
+    logger.info(f"Task [retry_failed_recipients_task | processing | {mail_record}]")
+    mail_attr = mail_attr or load_mail(mail_record=mail_record)
+    if not mail_attr:
+        return "Task [retry_failed_recipients_task | end]"
+    if not mail_service.retry(mail_attribute=mail_attr, **mail_record):
+        logger.info("Task [retry_failed_recipients_task | successful]\n")
+    elif self.request.retries < self.max_retries:
+        raise self.retry(countdown=retry_countdown(retries=self.request.retries + 1))
+    else:
+        logger.error("Task [retry_failed_recipients_task | error]\n")
+    return "Task [retry_failed_recipients_task | end]"
+
+
+def load_mail(mail_record: dict):
+    """Loads the mail a task refers to, None when it no longer exists."""
+    try:
+        return mail_loader.load(mail_record=mail_record)
+    except AppException.NotFoundException as exc:
+        logger.error(f"MailLoadError({exc})")
+        return None
+
+
+def schedule_retry(mail_record: dict):
+    """Queues a retry of the failed recipients of a mail after a backoff."""
+    if not settings.MAIL_RETRY_MAX_ATTEMPTS:
+        return None
+    return retry_failed_recipients_task.apply_async(
+        kwargs={"mail_record": mail_record},
+        countdown=retry_countdown(retries=0),
+    )
+
+
+def retry_countdown(retries: int):
+    # reminder: exponential backoff with full jitter, so retries of mails that failed
+    # together are spread out instead of hitting the provider at the same time
+    return get_exponential_backoff_interval(
+        factor=settings.MAIL_RETRY_BACKOFF,
+        retries=retries,
+        maximum=settings.MAIL_RETRY_BACKOFF_MAX,
+        full_jitter=True,
+    )
+
+
+@worker_shutdown.connect
+def close_smtp_connections(**kwargs):
+    """Closes the pooled smtp connections when the worker shuts down."""
+    smtp_connection_pool.close_all()
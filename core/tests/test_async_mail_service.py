@@ -0,0 +1,176 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings, tag
+
+from core.services.async_mail_service import AsyncMailService
+from core.services.batch_sizer import BatchSizer
+from core.services.connection_pool import SmtpConnectionPool
+
+
+class FakeSmtpClient:
+    def __init__(self, sessions: dict):
+        self.sessions = sessions
+
+    async def __aenter__(self):
+        self.sessions["active"] += 1
+        self.sessions["peak"] = max(self.sessions["peak"], self.sessions["active"])
+        self.sessions["loops"].add(asyncio.get_running_loop())
+        return self
+
+    async def __aexit__(self, *args):
+        self.sessions["active"] -= 1
+
+
+@tag("core.services.async_mail_service")
+class TestAsyncMailService(SimpleTestCase):
+    def setUp(self):
+        self.mail_service = AsyncMailService(
+            mail_delivery_repository=mock.Mock(),
+            mail_delivery_batch_repository=mock.Mock(),
+            bulk_mail_recipient_repository=mock.Mock(),
+            bulk_mail_repository=mock.Mock(),
+        )
+        self.mail_attribute = {
+            "sender_name": "Sender",
+            "sender_address": "sender@example.com",
+            "subject": "Subject",
+            "text_body": "text",
+            "html_body": "<p>html</p>",
+        }
+        self.recipients = [f"user{index}@example.com" for index in range(20)]
+        self.sessions = {"active": 0, "peak": 0, "loops": set()}
+        self.pool = SmtpConnectionPool(max_size=2, idle_timeout=60, acquire_timeout=1)
+
+        async def send_message_async(**kwargs):
+            await asyncio.sleep(0.01)
+            return {}
+
+        for patch in (
+            mock.patch.object(AsyncMailService, "connection_pool", self.pool),
+            mock.patch.object(
+                AsyncMailService, "rate_limiter", try_acquire=mock.Mock(return_value=0)
+            ),
+            mock.patch.object(
+                self.mail_service,
+                "smtp_client",
+                side_effect=lambda **kwargs: FakeSmtpClient(self.sessions),
+            ),
+            mock.patch.object(
+                self.mail_service,
+                "send_message_async",
+                side_effect=send_message_async,
+            ),
+            mock.patch.object(
+                self.mail_service,
+                "batch_sizer",
+                return_value=BatchSizer(size=2, minimum=1, maximum=2),
+            ),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def send_batches(self):
+        return list(
+            self.mail_service.send_batches(
+                mail_attribute=self.mail_attribute,
+                recipients=self.recipients,
+                password="password",
+            )
+        )
+
+    @override_settings(MAIL_ASYNC_MAX_SESSIONS=10)
+    def test_sessions_capped_by_pool_size(self):
+        results = self.send_batches()
+        self.assertEqual(sum(result["sent_recipients"] for result in results), 20)
+        self.assertEqual(self.sessions["peak"], 2)
+        self.assertEqual(self.sessions["active"], 0)
+
+    @override_settings(MAIL_ASYNC_MAX_SESSIONS=10)
+    def test_sessions_share_pool_slots(self):
+        self.pool.acquire_timeout = 0.05
+        slots = [self.pool.reserve(username="sender@example.com") for _ in range(2)]
+        results = self.send_batches()
+        self.assertEqual(self.sessions["peak"], 0)
+        self.assertEqual(sum(result["recipients"] for result in results), 20)
+        self.assertEqual(sum(result["sent_recipients"] for result in results), 0)
+        for slot in slots:
+            slot.release()
+        results = self.send_batches()
+        self.assertEqual(sum(result["sent_recipients"] for result in results), 20)
+
+    def test_event_loop_reused_between_tasks(self):
+        self.send_batches()
+        self.send_batches()
+        self.assertEqual(len(self.sessions["loops"]), 1)
+
+    def test_results_yielded_as_batches_complete(self):
+        released, calls = threading.Event(), []
+        self.addCleanup(released.set)
+
+        async def send_message_async(**kwargs):
+            if calls:
+                await asyncio.to_thread(released.wait, 5)
+            calls.append(kwargs)
+            return {}
+
+        self.mail_service.send_message_async.side_effect = send_message_async
+        sending = self.mail_service.send_batches(
+            mail_attribute=self.mail_attribute,
+            recipients=self.recipients,
+            password="password",
+        )
+        self.assertEqual(next(sending)["sent_recipients"], 2)
+        self.assertEqual(len(calls), 1)
+        released.set()
+        self.assertEqual(sum(result["sent_recipients"] for result in sending), 18)
+
+    def test_closing_early_stops_sessions(self):
+        released, calls = threading.Event(), []
+        self.addCleanup(released.set)
+
+        async def send_message_async(**kwargs):
+            if calls:
+                await asyncio.to_thread(released.wait, 5)
+            calls.append(kwargs)
+            return {}
+
+        self.mail_service.send_message_async.side_effect = send_message_async
+        sending = self.mail_service.send_batches(
+            mail_attribute=self.mail_attribute,
+            recipients=self.recipients,
+            password="password",
+        )
+        next(sending)
+        sending.close()
+        # reminder: the cancelled sessions hand their pool slots back
+        slots = [self.pool.reserve(username="sender@example.com") for _ in range(2)]
+        for slot in slots:
+            slot.release()
+        self.assertEqual(len(calls), 1)
+
+    def test_stop_flag_read_off_the_loop_thread(self):
+        threads = set()
+
+        def stopped():
+            threads.add(threading.current_thread().name)
+            return False
+
+        results = list(
+            self.mail_service.send_batches(
+                mail_attribute=self.mail_attribute,
+                recipients=self.recipients,
+                password="password",
+                stopped=stopped,
+            )
+        )
+        self.assertEqual(sum(result["sent_recipients"] for result in results), 20)
+        self.assertTrue(threads)
+        self.assertNotIn("mail_event_loop", threads)
+
+    def test_render_error_ends_the_results(self):
+        with mock.patch.object(
+            self.mail_service, "render_mail", side_effect=ValueError("render")
+        ), self.assertRaises(ValueError):
+            self.send_batches()
@@ -0,0 +1,49 @@
+from django.test import SimpleTestCase, override_settings, tag
+
+from core.services.batch_sizer import BatchSizer, BatchSizerRegistry
+
+
+@tag("core.services.batch_sizer")
+class TestBatchSizer(SimpleTestCase):
+    def test_fixed_size_ignores_outcomes(self):
+        sizer = BatchSizer(size=50, minimum=1, maximum=100)
+        sizer.record(latency=0.1, throttled=True)
+        self.assertEqual(sizer.size, 50)
+
+    def test_size_clamped_to_bounds(self):
+        self.assertEqual(BatchSizer(size=500, minimum=1, maximum=100).size, 100)
+        self.assertEqual(BatchSizer(size=0, minimum=5, maximum=100).size, 5)
+
+    def test_adapts_up_until_maximum(self):
+        sizer = BatchSizer(size=80, minimum=1, maximum=100, adaptive=True, step=10)
+        sizer.record(latency=0.1, throttled=False)
+        self.assertEqual(sizer.size, 90)
+        for _ in range(5):
+            sizer.record(latency=0.1, throttled=False)
+        self.assertEqual(sizer.size, 100)
+
+    def test_adapts_down_when_throttled_or_slow(self):
+        sizer = BatchSizer(
+            size=80, minimum=15, maximum=100, adaptive=True, target_latency=1.0
+        )
+        sizer.record(latency=0.1, throttled=True)
+        self.assertEqual(sizer.size, 40)
+        sizer.record(latency=2.0, throttled=False)
+        self.assertEqual(sizer.size, 20)
+        sizer.record(latency=0.1, throttled=True)
+        self.assertEqual(sizer.size, 15)
+
+
+@tag("core.services.batch_sizer")
+class TestBatchSizerRegistry(SimpleTestCase):
+    @override_settings(MAIL_BATCH_SIZE=100, EMAIL_HOST="localhost")
+    def test_sizer_kept_per_account_configuration(self):
+        registry = BatchSizerRegistry(maxsize=10, ttl=60)
+        sizer = registry.get(sender_address="user@example.com", adaptive=True)
+        self.assertIs(
+            registry.get(sender_address="user@example.com", adaptive=True), sizer
+        )
+        self.assertIsNot(registry.get(sender_address="user@example.com"), sizer)
+        self.assertEqual(
+            registry.get(sender_address="user@example.com", size=20).size, 20
+        )
@@ -0,0 +1,48 @@
+from unittest import mock
+
+import fakeredis
+import redis
+from django.test import SimpleTestCase, tag
+
+from core.services.campaign_control import CampaignControl
+
+
+@tag("core.services.campaign_control")
+class TestCampaignControl(SimpleTestCase):
+    def setUp(self):
+        self.campaign_control = CampaignControl(client=fakeredis.FakeRedis())
+
+    def test_first_run_sends_until_stopped(self):
+        self.assertFalse(self.campaign_control.is_stopped(bulk_mail_id="mail_id"))
+        self.campaign_control.set_state(bulk_mail_id="mail_id", state="paused")
+        self.assertTrue(self.campaign_control.is_stopped(bulk_mail_id="mail_id"))
+
+    def test_resumed_run_stops_every_other_run(self):
+        self.campaign_control.set_state(bulk_mail_id="mail_id", state="run")
+        self.assertFalse(
+            self.campaign_control.is_stopped(bulk_mail_id="mail_id", run="run")
+        )
+        self.assertTrue(self.campaign_control.is_stopped(bulk_mail_id="mail_id"))
+
+    def test_cleared_state_lets_first_run_send(self):
+        self.campaign_control.set_state(bulk_mail_id="mail_id", state="run")
+        self.campaign_control.set_state(bulk_mail_id="mail_id")
+        self.assertFalse(self.campaign_control.is_stopped(bulk_mail_id="mail_id"))
+
+    def test_retries_send_for_any_run(self):
+        self.campaign_control.set_state(bulk_mail_id="mail_id", state="run")
+        self.assertFalse(
+            self.campaign_control.is_stopped(bulk_mail_id="mail_id", any_run=True)
+        )
+        for state in ("paused", "cancelled"):
+            self.campaign_control.set_state(bulk_mail_id="mail_id", state=state)
+            self.assertTrue(
+                self.campaign_control.is_stopped(bulk_mail_id="mail_id", any_run=True)
+            )
+
+    def test_fails_open_on_redis_error(self):
+        client = mock.Mock()
+        client.get.side_effect = redis.ConnectionError()
+        campaign_control = CampaignControl(client=client)
+        self.assertFalse(campaign_control.is_stopped(bulk_mail_id="mail_id"))
+        self.assertFalse(campaign_control.is_cancelled(bulk_mail_id="mail_id"))
@@ -0,0 +1,110 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+from core.services.connection_pool import (
+    SmtpConnectionPool,
+    SmtpConnectionPoolTimeout,
+)
+
+
+@tag("core.services.connection_pool")
+class TestSmtpConnectionPool(SimpleTestCase):
+    def setUp(self):
+        self.pool = SmtpConnectionPool(max_size=2, idle_timeout=60, acquire_timeout=0.1)
+        get_connection = mock.patch(
+            "core.services.connection_pool.django_mail.get_connection",
+            side_effect=lambda **kwargs: mock.Mock(),
+        )
+        self.addCleanup(get_connection.stop)
+        self.get_connection = get_connection.start()
+        reaper = mock.patch.object(SmtpConnectionPool, "_start_reaper")
+        self.addCleanup(reaper.stop)
+        reaper.start()
+
+    def test_connection_reused(self):
+        with self.pool.connection(username="user@example.com", password="x") as first:
+            pass
+        first.connection.noop.return_value = (250, b"OK")
+        with self.pool.connection(username="user@example.com", password="x") as second:
+            pass
+        self.assertIs(first, second)
+        self.get_connection.assert_called_once()
+
+    def test_connection_discarded_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.pool.connection(username="user@example.com", password="x") as a:
+                raise ValueError("failed")
+        a.close.assert_called_once()
+        with self.pool.connection(username="user@example.com", password="x") as b:
+            pass
+        self.assertIsNot(a, b)
+
+    def test_connection_released_when_borrower_closed(self):
+        def send():
+            with self.pool.connection(username="user@example.com", password="x") as a:
+                yield a
+
+        for _ in range(3):
+            sending = send()
+            backend = next(sending)
+            sending.close()
+            backend.close.assert_called_once()
+        for _ in range(2):
+            self.pool.acquire(username="user@example.com", password="x")
+
+    def test_acquire_timeout(self):
+        for _ in range(2):
+            self.pool.acquire(username="user@example.com", password="x")
+        with self.assertRaises(SmtpConnectionPoolTimeout):
+            self.pool.acquire(username="user@example.com", password="x")
+        # reminder: another account has its own connections
+        self.assertIsNotNone(
+            self.pool.acquire(username="other@example.com", password="x")
+        )
+
+    def test_slots_shared_between_threads(self):
+        slots, barrier = [], threading.Barrier(8)
+
+        def slot():
+            barrier.wait()
+            slots.append(self.pool._slot(("localhost", "user@example.com")))
+
+        threads = [threading.Thread(target=slot) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(slot) for slot in slots}), 1)
+
+    def test_release_frees_slot(self):
+        backends = [
+            self.pool.acquire(username="user@example.com", password="x")
+            for _ in range(2)
+        ]
+        self.pool.release(backends[0], discard=True)
+        self.assertIsNotNone(
+            self.pool.acquire(username="user@example.com", password="x")
+        )
+
+    def test_reap_closes_idle_connections_of_every_account(self):
+        first = self.pool.acquire(username="user@example.com", password="x")
+        second = self.pool.acquire(username="other@example.com", password="x")
+        self.pool.release(first)
+        self.pool.release(second)
+        with mock.patch(
+            "core.services.connection_pool.time.monotonic",
+            return_value=time.monotonic() + 61,
+        ):
+            self.assertEqual(self.pool.reap(), 2)
+        first.close.assert_called_once()
+        second.close.assert_called_once()
+        self.assertEqual(self.pool.reap(), 0)
+
+    def test_reap_keeps_fresh_connections(self):
+        backend = self.pool.acquire(username="user@example.com", password="x")
+        self.pool.release(backend)
+        self.assertEqual(self.pool.reap(), 0)
+        backend.close.assert_not_called()
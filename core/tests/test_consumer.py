@@ -0,0 +1,122 @@
+import json
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings, tag
+from kafka.errors import KafkaError
+from kafka.structs import TopicPartition
+
+from core.consumer import DeadLetterPublisher, MailConsumer
+from core.exceptions import AppException
+
+
+@tag("core.consumer")
+class TestDeadLetterPublisher(SimpleTestCase):
+    def setUp(self):
+        self.producer = mock.Mock()
+        self.publisher = DeadLetterPublisher(producer=self.producer, topic="dead")
+        self.msg = mock.Mock(topic="mails", partition=0, offset=7, key=b"key")
+
+    def test_publish_records_origin_in_headers(self):
+        self.publisher.publish(msg=self.msg, error=ValueError("bad"), attempts=3)
+        self.producer.send.assert_called_once()
+        headers = dict(self.producer.send.call_args.kwargs["headers"])
+        self.assertEqual(headers["dead_letter_topic"], b"mails")
+        self.assertEqual(headers["dead_letter_offset"], b"7")
+        self.assertEqual(headers["dead_letter_error"], b"ValueError(bad)")
+        self.assertEqual(headers["dead_letter_attempts"], b"3")
+
+    def test_flush_raises_when_a_dead_letter_was_not_published(self):
+        self.producer.send.return_value.get.side_effect = KafkaError("refused")
+        self.publisher.publish(msg=self.msg, error=ValueError("bad"), attempts=1)
+        consumer = MailConsumer(bulk_mail_controller=mock.Mock())
+        consumer.dead_letters = self.publisher
+        kafka_consumer = mock.Mock()
+        with self.assertRaises(KafkaError):
+            consumer.commit(kafka_consumer)
+        kafka_consumer.commit.assert_not_called()
+        # reminder: every send is checked once
+        self.publisher.flush()
+
+
+@tag("core.consumer")
+@override_settings(KAFKA_MAX_RETRIES=2, KAFKA_CONSUMER_WORKERS=1)
+class TestMailConsumer(SimpleTestCase):
+    def setUp(self):
+        self.controller = mock.Mock()
+        self.consumer = MailConsumer(bulk_mail_controller=self.controller)
+        self.consumer.dead_letters = mock.Mock()
+        sleep = mock.patch("core.consumer.time.sleep")
+        self.addCleanup(sleep.stop)
+        sleep.start()
+
+    def message(self, value, offset=0, key=None, partition=0):
+        return mock.Mock(
+            topic="mails",
+            partition=partition,
+            offset=offset,
+            key=key,
+            value=value if isinstance(value, bytes) else json.dumps(value).encode(),
+        )
+
+    def test_handle_dead_letters_failed_messages(self):
+        messages = [
+            self.message(b"{invalid", offset=0),
+            self.message({"subject": "invalid"}, offset=1),
+            self.message({"subject": "refused"}, offset=2),
+            self.message({"subject": "sent"}, offset=3),
+        ]
+        invalid = AppException.ValidationException(error_message={})
+        refused = ValueError("refused")
+        self.controller.consumer_send_mails.return_value = [invalid, refused, "sent"]
+        self.consumer.handle(messages)
+        self.controller.consumer_send_mails.assert_called_once_with(
+            [{"subject": "invalid"}, {"subject": "refused"}, {"subject": "sent"}]
+        )
+        calls = self.consumer.dead_letters.publish.call_args_list
+        self.assertEqual(
+            [(call.kwargs["msg"].offset, call.kwargs["attempts"]) for call in calls],
+            [(0, 1), (1, 1), (2, 3)],
+        )
+
+    def test_handle_retries_failed_batch_message_by_message(self):
+        messages = [
+            self.message({"subject": "first"}, offset=0),
+            self.message({"subject": "second"}, offset=1),
+        ]
+
+        def consumer_send_mails(objs_data):
+            if len(objs_data) > 1 or objs_data[0]["subject"] == "second":
+                raise ValueError("failed")
+            return ["sent"]
+
+        self.controller.consumer_send_mails.side_effect = consumer_send_mails
+        self.consumer.handle(messages)
+        # reminder: the batch and the failing message are both tried three times
+        self.assertEqual(self.controller.consumer_send_mails.call_count, 7)
+        self.consumer.dead_letters.publish.assert_called_once()
+        self.assertEqual(
+            self.consumer.dead_letters.publish.call_args.kwargs["msg"].offset, 1
+        )
+
+    def test_handle_stops_on_database_error(self):
+        self.controller.consumer_send_mails.side_effect = OperationalError("down")
+        with self.assertRaises(OperationalError):
+            self.consumer.handle([self.message({"subject": "first"})])
+        self.consumer.dead_letters.publish.assert_not_called()
+
+    @override_settings(KAFKA_CONSUMER_ORDERING="key")
+    def test_streams_keep_order_per_key(self):
+        first, second = TopicPartition("mails", 0), TopicPartition("mails", 1)
+        records = {
+            first: [
+                self.message({}, offset=0, key=b"a"),
+                self.message({}, offset=1, key=b"b"),
+                self.message({}, offset=2, key=b"a"),
+            ],
+            second: [self.message({}, offset=0, key=b"a", partition=1)],
+        }
+        streams = self.consumer.streams(records)
+        self.assertEqual(
+            [[msg.offset for msg in stream] for stream in streams], [[0, 2], [1], [0]]
+        )
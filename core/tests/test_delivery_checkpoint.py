@@ -0,0 +1,71 @@
+from unittest import mock
+
+import fakeredis
+import redis
+from django.test import SimpleTestCase, tag
+
+from core.services.delivery_checkpoint import (
+    DeliveryCheckpoint,
+    DeliveryProgress,
+)
+
+
+@tag("core.services.delivery_checkpoint")
+class TestDeliveryCheckpoint(SimpleTestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        self.checkpoint = DeliveryCheckpoint(client=self.client, ttl=60)
+
+    def test_save_and_load(self):
+        self.assertEqual(self.checkpoint.load(key="delivery:0"), (0, {}))
+        self.checkpoint.save(
+            key="delivery:0", sent=2, failures={"a@example.com": "550 No such user"}
+        )
+        self.checkpoint.save(key="delivery:0", sent=4)
+        self.assertEqual(
+            self.checkpoint.load(key="delivery:0"),
+            (4, {"a@example.com": "550 No such user"}),
+        )
+        self.assertGreater(self.client.ttl("mail_checkpoint:delivery:0"), 0)
+        self.assertGreater(self.client.ttl("mail_checkpoint:delivery:0:failures"), 0)
+
+    def test_save_persist(self):
+        self.checkpoint.save(
+            key="delivery:0", sent=2, failures={"a@example.com": "550 No such user"}
+        )
+        self.checkpoint.save(key="delivery:0", sent=2, persist=True)
+        self.assertEqual(self.client.ttl("mail_checkpoint:delivery:0"), -1)
+        self.assertEqual(self.client.ttl("mail_checkpoint:delivery:0:failures"), -1)
+
+    def test_clear(self):
+        self.checkpoint.save(
+            key="delivery:0", sent=2, failures={"a@example.com": "550 No such user"}
+        )
+        self.checkpoint.clear(key="delivery:0")
+        self.assertEqual(self.client.keys("mail_checkpoint:*"), [])
+
+    def test_fails_open_on_redis_error(self):
+        client = mock.Mock()
+        client.pipeline.side_effect = redis.ConnectionError()
+        checkpoint = DeliveryCheckpoint(client=client, ttl=60)
+        self.assertEqual(checkpoint.load(key="delivery:0"), (0, {}))
+        checkpoint.save(key="delivery:0", sent=2)
+
+
+@tag("core.services.delivery_checkpoint")
+class TestDeliveryProgress(SimpleTestCase):
+    def test_complete_out_of_order(self):
+        progress = DeliveryProgress(sent=10)
+        page = [f"user{index}@example.com" for index in range(6)]
+        progress.read(page)
+        self.assertEqual(progress.complete(page[2:4]), 10)
+        self.assertEqual(progress.complete(page[4:6]), 10)
+        self.assertEqual(progress.complete(page[0:2]), 16)
+        progress.read(page[:2])
+        self.assertEqual(progress.complete(page[:2]), 18)
+
+    def test_complete_unknown_batch(self):
+        progress = DeliveryProgress()
+        progress.read(["user@example.com"])
+        self.assertEqual(progress.complete(["other@example.com"]), 0)
+        self.assertEqual(progress.complete([]), 0)
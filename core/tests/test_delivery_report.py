@@ -0,0 +1,47 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+from core.services.delivery_report import DeliveryReportBuffer
+
+
+@tag("core.services.delivery_report")
+class TestDeliveryReportBuffer(SimpleTestCase):
+    def setUp(self):
+        self.report = DeliveryReportBuffer(flush_batches=3, flush_interval=5)
+        self.result = {"recipients": 10, "sent_recipients": 8, "comment": "refused"}
+
+    def test_due_after_flush_batches(self):
+        for _ in range(2):
+            self.report.add(self.result)
+        self.assertFalse(self.report.is_due())
+        self.report.add(self.result)
+        self.assertTrue(self.report.is_due())
+
+    def test_due_after_flush_interval(self):
+        self.report.add(self.result)
+        with mock.patch(
+            "core.services.delivery_report.time.monotonic",
+            return_value=time.monotonic() + 6,
+        ):
+            self.assertTrue(self.report.is_due())
+
+    def test_flush_empties_buffer_and_keeps_summary(self):
+        for _ in range(3):
+            self.report.add(self.result)
+        self.assertEqual(self.report.flush(), [self.result] * 3)
+        self.assertEqual(self.report.pending, 0)
+        self.assertFalse(self.report.is_due())
+        self.report.add({"recipients": 5, "sent_recipients": 5})
+        self.assertEqual(
+            self.report.summary(),
+            {"recipients": 35, "sent_recipients": 29, "comment": "refused"},
+        )
+
+    def test_restore_puts_results_back_in_order(self):
+        self.report.add({"recipients": 1})
+        results = self.report.flush()
+        self.report.add({"recipients": 2})
+        self.report.restore(results)
+        self.assertEqual(self.report.flush(), [{"recipients": 1}, {"recipients": 2}])
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+from core.services.mail_loader import MailLoader
+
+
+@tag("core.services.mail_loader")
+class TestMailLoader(SimpleTestCase):
+    def setUp(self):
+        self.mail_loader = MailLoader(
+            bulk_mail_repository=mock.Mock(),
+            single_mail_repository=mock.Mock(),
+            mail_account_repository=mock.Mock(),
+            bulk_mail_recipient_repository=mock.Mock(),
+        )
+
+    def test_load_single_mail_from_account_of_owner(self):
+        mail = self.mail_loader.single_mail_repository.find_by_id.return_value
+        mail.recipient = "example@test.com"
+        mail_attr = self.mail_loader.load(mail_record={"single_mail_id": "mail_id"})
+        self.mail_loader.mail_account_repository.find.assert_called_once_with(
+            filter_param={
+                "user_id": mail.user_id,
+                "mail_address": mail.sender,
+                "is_deleted": False,
+            }
+        )
+        self.assertEqual(mail_attr["recipient"], "example@test.com")
+
+    def test_load_bulk_mail_from_account_of_owner(self):
+        mail = self.mail_loader.bulk_mail_repository.find_by_id.return_value
+        mail_attr = self.mail_loader.load(
+            mail_record={"bulk_mail_id": "mail_id", "recipient_slice": [10, 20]}
+        )
+        self.assertEqual(
+            self.mail_loader.mail_account_repository.find.call_args.kwargs[
+                "filter_param"
+            ]["user_id"],
+            mail.user_id,
+        )
+        self.assertEqual(
+            (mail_attr["recipient"].start, mail_attr["recipient"].stop), (10, 20)
+        )
@@ -0,0 +1,438 @@
+import threading
+import time
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+
+import fakeredis
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings, tag
+
+from core.services.batch_sizer import BatchSizer
+from core.services.connection_pool import SmtpConnectionPool
+from core.services.delivery_checkpoint import DeliveryCheckpoint
+from core.services.mail_service import MailService
+from core.services.rendered_mail import RenderedMail
+from core.utils.constants import MailDeliveryStatusEnum
+
+
+@tag("core.services.mail_service")
+class TestMailService(SimpleTestCase):
+    def setUp(self):
+        self.mail_service = MailService(
+            mail_delivery_repository=mock.Mock(),
+            mail_delivery_batch_repository=mock.Mock(),
+            bulk_mail_recipient_repository=mock.Mock(),
+            bulk_mail_repository=mock.Mock(),
+        )
+        self.mail_attribute = {
+            "sender_name": "Sender",
+            "sender_address": "sender@example.com",
+            "subject": "Subject",
+            "text_body": "text",
+            "html_body": "<p>html</p>",
+        }
+        rate_limiter = mock.patch.object(MailService, "rate_limiter")
+        self.addCleanup(rate_limiter.stop)
+        rate_limiter.start()
+        transaction = mock.patch("core.services.mail_service.transaction")
+        self.addCleanup(transaction.stop)
+        transaction.start()
+
+    @override_settings(MAIL_BATCH_CONCURRENCY=8)
+    def test_send_batches_concurrently_respects_pool_size(self):
+        pool = SmtpConnectionPool(max_size=3, idle_timeout=60, acquire_timeout=5)
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def send_batch(addresses, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return self.mail_service.batch_result(addresses=addresses)
+
+        recipients = [f"user{index}@example.com" for index in range(40)]
+        with mock.patch(
+            "core.services.connection_pool.django_mail.get_connection",
+            side_effect=lambda **kwargs: mock.Mock(),
+        ) as get_connection, mock.patch.object(
+            MailService, "connection_pool", pool
+        ), mock.patch.object(
+            SmtpConnectionPool, "_start_reaper"
+        ), mock.patch.object(
+            self.mail_service, "send_batch", side_effect=send_batch
+        ), mock.patch.object(
+            self.mail_service,
+            "batch_sizer",
+            return_value=BatchSizer(size=2, minimum=1, maximum=2),
+        ):
+            results = list(
+                self.mail_service.send_batches(
+                    mail_attribute=self.mail_attribute,
+                    recipients=recipients,
+                    password="password",
+                )
+            )
+        self.assertEqual(len(results), 20)
+        self.assertCountEqual(
+            [address for result in results for address in result["addresses"]],
+            recipients,
+        )
+        self.assertLessEqual(peak[0], 3)
+        self.assertLessEqual(get_connection.call_count, 3)
+
+    def test_send_batch_partially_refused(self):
+        connection = mock.Mock()
+        connection.connection.sendmail.return_value = {
+            "bad@example.com": (550, b"No such user")
+        }
+        result = self.mail_service.send_batch(
+            mail_attribute=self.mail_attribute,
+            addresses=["good@example.com", "bad@example.com"],
+            connection=connection,
+            rendered=RenderedMail(
+                self.mail_service.build_mail(
+                    mail_attribute=self.mail_attribute, addresses=[]
+                )
+            ),
+        )
+        self.assertEqual(
+            result["status"],
+            MailDeliveryStatusEnum.partially_sent_to_provider.value,
+        )
+        self.assertEqual(result["sent_recipients"], 1)
+        self.assertEqual(
+            result["failed_recipients"], {"bad@example.com": "550 No such user"}
+        )
+
+    @override_settings(MAIL_ENVELOPE_MODE="recipient")
+    def test_send_batch_recipient_envelope_isolates_refusals(self):
+        def sendmail(from_email, recipients, message):
+            if recipients == ["bad@example.com"]:
+                raise SMTPRecipientsRefused({"bad@example.com": (550, b"No such user")})
+            return {}
+
+        connection = mock.Mock()
+        connection.connection.sendmail.side_effect = sendmail
+        result = self.mail_service.send_batch(
+            mail_attribute=self.mail_attribute,
+            addresses=["good@example.com", "bad@example.com", "other@example.com"],
+            connection=connection,
+            rendered=RenderedMail(
+                self.mail_service.build_mail(
+                    mail_attribute=self.mail_attribute, addresses=[]
+                )
+            ),
+        )
+        self.assertEqual(connection.connection.sendmail.call_count, 3)
+        self.assertEqual(
+            result["status"],
+            MailDeliveryStatusEnum.partially_sent_to_provider.value,
+        )
+        self.assertEqual(result["sent_recipients"], 2)
+        self.assertEqual(list(result["failed_recipients"]), ["bad@example.com"])
+
+    @override_settings(MAIL_DELIVERY_FLUSH_BATCHES=1)
+    def test_deliver_keeps_results_of_failed_report_write(self):
+        delivery_repository = self.mail_service.mail_delivery_repository
+        batch_repository = self.mail_service.mail_delivery_batch_repository
+        delivery_repository.rollup_by_id.side_effect = [OperationalError(), 1]
+        recipients = [f"user{index}@example.com" for index in range(4)]
+
+        def send_batches(recipients, **kwargs):
+            yield self.mail_service.batch_result(addresses=recipients[:2])
+            yield self.mail_service.batch_result(addresses=recipients[2:])
+
+        with mock.patch(
+            "core.services.mail_service.MailAccountModel.decrypt_text",
+            return_value="password",
+        ), mock.patch.object(
+            self.mail_service, "send_batches", side_effect=send_batches
+        ):
+            summary = self.mail_service.deliver(
+                mail_attribute={**self.mail_attribute, "recipient": recipients},
+                delivery_id="delivery_id",
+            )
+        self.assertEqual(summary["recipients"], 4)
+        self.assertEqual(summary["sent_recipients"], 4)
+        self.assertEqual(delivery_repository.rollup_by_id.call_count, 2)
+        self.assertEqual(
+            delivery_repository.rollup_by_id.call_args.kwargs["recipients"], 4
+        )
+        batch_repository.bulk_create.assert_called_once()
+        self.assertEqual(
+            [
+                batch["sent_recipients"]
+                for batch in batch_repository.bulk_create.call_args.kwargs["objs_data"]
+            ],
+            [2, 2],
+        )
+
+    def test_deliver_logs_results_of_last_failed_report_write(self):
+        delivery_repository = self.mail_service.mail_delivery_repository
+        delivery_repository.rollup_by_id.side_effect = OperationalError()
+        with mock.patch(
+            "core.services.mail_service.MailAccountModel.decrypt_text",
+            return_value="password",
+        ), mock.patch.object(
+            self.mail_service,
+            "send_batches",
+            side_effect=lambda recipients, **kwargs: iter(
+                [self.mail_service.batch_result(addresses=recipients)]
+            ),
+        ):
+            summary = self.mail_service.deliver(
+                mail_attribute={
+                    **self.mail_attribute,
+                    "recipient": ["user@example.com"],
+                },
+                delivery_id="delivery_id",
+            )
+        self.assertEqual(summary["sent_recipients"], 1)
+
+    def test_retry_skips_permanent_failures(self):
+        batch_repository = self.mail_service.mail_delivery_batch_repository
+        batch_repository.claim_failures.return_value = [
+            mock.Mock(
+                id=1,
+                failures={
+                    "refused@example.com": "550 No such user",
+                    "throttled@example.com": "421 Try again later",
+                    "dropped@example.com": "('Connection unexpectedly closed',)",
+                    "rejected@example.com": "(554, b'Message rejected')",
+                },
+            )
+        ]
+        with mock.patch.object(
+            self.mail_service,
+            "deliver",
+            return_value={"recipients": 2, "sent_recipients": 2},
+        ) as deliver:
+            self.assertFalse(
+                self.mail_service.retry(
+                    mail_attribute=self.mail_attribute, delivery_id="delivery_id"
+                )
+            )
+        self.assertEqual(
+            deliver.call_args.kwargs["mail_attribute"]["recipient"],
+            ["throttled@example.com", "dropped@example.com"],
+        )
+        batch_repository.release_failures.assert_not_called()
+
+    def test_retry_releases_claim_when_not_recorded(self):
+        batch_repository = self.mail_service.mail_delivery_batch_repository
+        batch_repository.claim_failures.return_value = [
+            mock.Mock(id=1, failures={"user@example.com": "421 Try again later"})
+        ]
+
+        def deliver(report, **kwargs):
+            report.add({"recipients": 1, "sent_recipients": 1})
+            return report.summary()
+
+        with mock.patch.object(self.mail_service, "deliver", side_effect=deliver):
+            self.mail_service.retry(
+                mail_attribute=self.mail_attribute, delivery_id="delivery_id"
+            )
+        batch_repository.release_failures.assert_called_once_with(batch_ids=[1])
+
+    def test_send_batch_refusals_keyed_by_address(self):
+        connection = mock.Mock()
+        connection.connection.sendmail.return_value = {
+            "user@xn--exmple-cua.com": (550, b"No such user")
+        }
+        result = self.mail_service.send_batch(
+            mail_attribute=self.mail_attribute,
+            addresses=["good@example.com", "user@exämple.com"],
+            connection=connection,
+            rendered=RenderedMail(
+                self.mail_service.build_mail(
+                    mail_attribute=self.mail_attribute, addresses=[]
+                )
+            ),
+        )
+        self.assertEqual(list(result["failed_recipients"]), ["user@exämple.com"])
+        self.mail_service.update_recipient_status(
+            bulk_mail_id="mail_id", results=[result]
+        )
+        recipient_repository = self.mail_service.bulk_mail_recipient_repository
+        self.assertEqual(
+            recipient_repository.update_status.call_args_list,
+            [
+                mock.call(
+                    bulk_mail_id="mail_id",
+                    addresses=["good@example.com"],
+                    status="sent",
+                ),
+                mock.call(
+                    bulk_mail_id="mail_id",
+                    addresses=["user@exämple.com"],
+                    status="failed",
+                ),
+            ],
+        )
+
+    def test_deliver_resumes_chunk_from_checkpoint(self):
+        checkpoint = DeliveryCheckpoint(client=fakeredis.FakeRedis(), ttl=60)
+        checkpoint.save(
+            key="delivery_id:100",
+            sent=4,
+            failures={"user101@example.com": "550 No such user"},
+        )
+        recipients = [f"user{index}@example.com" for index in range(100, 110)]
+        recipient_repository = self.mail_service.bulk_mail_recipient_repository
+        # reminder: the first two were reported before the worker died
+        recipient_repository.find_addresses.return_value = recipients[2:4] + [
+            "user101@example.com"
+        ]
+        pages = []
+
+        def send_batches(recipients, **kwargs):
+            pages.append(recipients)
+            yield self.mail_service.batch_result(addresses=recipients)
+
+        with mock.patch.object(
+            MailService, "checkpoint", checkpoint
+        ), mock.patch.object(
+            MailService, "campaign_control"
+        ) as campaign_control, mock.patch(
+            "core.services.mail_service.MailAccountModel.decrypt_text",
+            return_value="password",
+        ), mock.patch.object(
+            self.mail_service, "send_batches", side_effect=send_batches
+        ):
+            campaign_control.is_stopped.return_value = False
+            summary = self.mail_service.deliver(
+                mail_attribute={**self.mail_attribute, "recipient": recipients},
+                delivery_id="delivery_id",
+                bulk_mail_id="mail_id",
+                recipient_slice=[100, 110],
+            )
+        recipient_repository.find_addresses.assert_called_once_with(
+            bulk_mail_id="mail_id", start=100, stop=104, status="pending"
+        )
+        self.assertEqual(pages, [recipients[4:]])
+        # reminder: the pending ones are reported with the refusal they had
+        self.assertEqual(summary["recipients"], 9)
+        self.assertEqual(summary["sent_recipients"], 8)
+        self.assertEqual(checkpoint.load(key="delivery_id:100"), (0, {}))
+
+    def test_deliver_keeps_checkpoint_of_paused_mail_only(self):
+        for cancelled, kept in ((False, (2, {})), (True, (0, {}))):
+            checkpoint = DeliveryCheckpoint(client=fakeredis.FakeRedis(), ttl=60)
+            with mock.patch.object(
+                MailService, "checkpoint", checkpoint
+            ), mock.patch.object(
+                MailService, "campaign_control"
+            ) as campaign_control, mock.patch(
+                "core.services.mail_service.MailAccountModel.decrypt_text",
+                return_value="password",
+            ), mock.patch.object(
+                self.mail_service,
+                "send_batches",
+                side_effect=lambda recipients, stopped, **kwargs: iter(
+                    []
+                    if stopped()
+                    else [self.mail_service.batch_result(addresses=recipients)]
+                ),
+            ), override_settings(
+                MAIL_RECIPIENT_PAGE_SIZE=2
+            ):
+                campaign_control.is_stopped.side_effect = [False, True]
+                campaign_control.is_cancelled.return_value = cancelled
+                self.mail_service.deliver(
+                    mail_attribute={
+                        **self.mail_attribute,
+                        "recipient": [
+                            "a@example.com",
+                            "b@example.com",
+                            "c@example.com",
+                        ],
+                    },
+                    delivery_id="delivery_id",
+                    bulk_mail_id="mail_id",
+                )
+            self.assertEqual(checkpoint.load(key="delivery_id:0"), kept)
+
+    def test_deliver_stops_on_short_page_without_reading_flag_again(self):
+        checkpoint = DeliveryCheckpoint(client=fakeredis.FakeRedis(), ttl=60)
+        recipients = [f"user{index}@example.com" for index in range(4)]
+        with mock.patch.object(
+            MailService, "checkpoint", checkpoint
+        ), mock.patch.object(
+            MailService, "campaign_control"
+        ) as campaign_control, mock.patch(
+            "core.services.mail_service.MailAccountModel.decrypt_text",
+            return_value="password",
+        ), mock.patch.object(
+            self.mail_service,
+            "send_batches",
+            side_effect=lambda recipients, **kwargs: iter(
+                [self.mail_service.batch_result(addresses=recipients[:1])]
+            ),
+        ):
+            campaign_control.is_cancelled.return_value = False
+            summary = self.mail_service.deliver(
+                mail_attribute={**self.mail_attribute, "recipient": recipients},
+                delivery_id="delivery_id",
+                bulk_mail_id="mail_id",
+            )
+        campaign_control.is_stopped.assert_not_called()
+        self.assertTrue(summary["stopped"])
+        self.assertEqual(summary["recipients"], 1)
+        self.assertEqual(checkpoint.load(key="delivery_id:0"), (1, {}))
+
+    def test_retry_of_stopped_mail_claims_no_failures(self):
+        batch_repository = self.mail_service.mail_delivery_batch_repository
+        with mock.patch.object(MailService, "campaign_control") as campaign_control:
+            campaign_control.is_stopped.return_value = True
+            self.assertFalse(
+                self.mail_service.retry(
+                    mail_attribute=self.mail_attribute,
+                    delivery_id="delivery_id",
+                    bulk_mail_id="mail_id",
+                )
+            )
+        campaign_control.is_stopped.assert_called_once_with(
+            bulk_mail_id="mail_id", run=None, any_run=True
+        )
+        batch_repository.claim_failures.assert_not_called()
+
+    def test_send_completes_mail_unless_stopped(self):
+        bulk_mail_repository = self.mail_service.bulk_mail_repository
+        for stopped in (True, False):
+            with mock.patch.object(
+                self.mail_service,
+                "deliver",
+                return_value={
+                    "recipients": 2,
+                    "sent_recipients": 2,
+                    "stopped": stopped,
+                },
+            ):
+                self.assertFalse(
+                    self.mail_service.send(
+                        mail_attribute=self.mail_attribute, bulk_mail_id="mail_id"
+                    )
+                )
+        bulk_mail_repository.update_all.assert_called_once_with(
+            filter_param={"id": "mail_id", "status__in": ["active", "paused"]},
+            obj_data={"status": "completed"},
+        )
+
+    def test_finalise_delivery_completes_mail_unless_a_chunk_stopped(self):
+        bulk_mail_repository = self.mail_service.bulk_mail_repository
+        results = [
+            {"recipients": 2, "sent_recipients": 2, "stopped": False},
+            {"recipients": 1, "sent_recipients": 0, "stopped": True},
+        ]
+        self.assertTrue(
+            self.mail_service.finalise_delivery(results=results, bulk_mail_id="mail_id")
+        )
+        bulk_mail_repository.update_all.assert_not_called()
+        self.assertFalse(
+            self.mail_service.finalise_delivery(
+                results=results[:1], bulk_mail_id="mail_id"
+            )
+        )
+        bulk_mail_repository.update_all.assert_called_once()
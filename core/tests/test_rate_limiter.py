@@ -0,0 +1,56 @@
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+import fakeredis
+import redis
+from django.test import SimpleTestCase, tag
+
+from core.services.rate_limiter import TokenBucketRateLimiter
+
+
+@tag("core.services.rate_limiter")
+class TestTokenBucketRateLimiter(SimpleTestCase):
+    @skipUnless(find_spec("lupa"), "fakeredis runs lua scripts with lupa")
+    def test_allows_until_bucket_empty(self):
+        limiter = TokenBucketRateLimiter(
+            client=fakeredis.FakeRedis(), rate=1, capacity=10
+        )
+        self.assertEqual(limiter.try_acquire(key="user@example.com", tokens=6), 0)
+        self.assertEqual(limiter.try_acquire(key="user@example.com", tokens=4), 0)
+        wait = limiter.try_acquire(key="user@example.com", tokens=5)
+        self.assertGreater(wait, 4)
+        self.assertLessEqual(wait, 5)
+        # reminder: every account has its own bucket
+        self.assertEqual(limiter.try_acquire(key="other@example.com", tokens=10), 0)
+
+    @skipUnless(find_spec("lupa"), "fakeredis runs lua scripts with lupa")
+    def test_oversized_request_paid_in_full(self):
+        limiter = TokenBucketRateLimiter(
+            client=fakeredis.FakeRedis(), rate=1, capacity=10
+        )
+        self.assertEqual(limiter.try_acquire(key="user@example.com", tokens=5), 0)
+        # reminder: an oversized request waits for a full bucket
+        wait = limiter.try_acquire(key="user@example.com", tokens=50)
+        self.assertGreater(wait, 4)
+        self.assertLessEqual(wait, 5)
+        limiter.client.delete("mail_rate_limit:user@example.com")
+        self.assertEqual(limiter.try_acquire(key="user@example.com", tokens=50), 0)
+        # reminder: and leaves the bucket in debt for the whole request
+        wait = limiter.try_acquire(key="user@example.com", tokens=50)
+        self.assertGreater(wait, 49)
+        self.assertLessEqual(wait, 50)
+
+    def test_disabled_without_rate(self):
+        client = mock.Mock()
+        limiter = TokenBucketRateLimiter(client=client, rate=0, capacity=10)
+        self.assertEqual(limiter.try_acquire(key="user@example.com", tokens=50), 0)
+        client.register_script.return_value.assert_not_called()
+
+    def test_fails_open_on_redis_error(self):
+        client = mock.Mock()
+        client.register_script.return_value.side_effect = redis.ConnectionError()
+        limiter = TokenBucketRateLimiter(client=client, rate=1, capacity=10)
+        self.assertEqual(limiter.try_acquire(key="user@example.com", tokens=5), 0)
+        with mock.patch("core.services.rate_limiter.time.sleep") as sleep:
+            limiter.acquire(key="user@example.com", tokens=5)
+        sleep.assert_not_called()
@@ -0,0 +1,49 @@
+from itertools import islice
+
+from django.test import TestCase, override_settings, tag
+
+from app.bulk.models import BulkMailModel, BulkMailRecipientModel
+from app.bulk.repository import BulkMailRecipientRepository
+from core.services.recipient_stream import RecipientStream
+
+
+@tag("core.services.recipient_stream")
+@override_settings(MAIL_RECIPIENT_PAGE_SIZE=3)
+class TestRecipientStream(TestCase):
+    def setUp(self):
+        self.bulk_mail = BulkMailModel.objects.create(
+            user_id="3fa85f64-5717-4562-b3fc-2c963f66afa6",
+            sender="user@example.com",
+            name="string",
+            subject="string",
+            html_body="string",
+        )
+        self.addresses = [f"user{index}@example.com" for index in range(10)]
+        BulkMailRecipientModel.objects.bulk_create(
+            BulkMailRecipientModel(bulk_mail=self.bulk_mail, address=address)
+            for address in self.addresses
+        )
+
+    def stream(self, start=0, stop=None):
+        return RecipientStream(
+            bulk_mail_recipient_repository=BulkMailRecipientRepository(),
+            bulk_mail_id=self.bulk_mail.id,
+            start=start,
+            stop=stop,
+        )
+
+    def test_pages_across_chunk_boundaries(self):
+        recipients = iter(self.stream())
+        pages = []
+        while page := list(islice(recipients, 4)):
+            pages.append(page)
+        self.assertEqual(
+            pages,
+            [self.addresses[0:4], self.addresses[4:8], self.addresses[8:10]],
+        )
+
+    def test_slice_of_chunk(self):
+        stream = self.stream(start=2, stop=8)
+        self.assertEqual(list(stream), self.addresses[2:8])
+        # reminder: every iteration reads the recipients again from the database
+        self.assertEqual(list(islice(stream, 4, None)), self.addresses[6:8])
@@ -0,0 +1,37 @@
+from email import message_from_bytes
+
+from django.core.mail import EmailMultiAlternatives
+from django.test import SimpleTestCase, tag
+
+from core.services.rendered_mail import RenderedMail
+
+
+@tag("core.services.rendered_mail")
+class TestRenderedMail(SimpleTestCase):
+    def setUp(self):
+        mail = EmailMultiAlternatives(
+            subject="Subject",
+            body="text",
+            from_email="Sender <sender@example.com>",
+            to=[],
+        )
+        mail.attach_alternative("<p>html</p>", "text/html")
+        self.rendered = RenderedMail(mail)
+
+    def test_as_bytes_prepends_to_and_message_id(self):
+        addresses = ["first@example.com", "second@example.com"]
+        raw = self.rendered.as_bytes(addresses)
+        self.assertTrue(
+            raw.startswith(b"To: first@example.com,\r\n second@example.com")
+        )
+        message = message_from_bytes(raw)
+        self.assertEqual(len(message.get_all("To")), 1)
+        self.assertEqual(len(message.get_all("Message-ID")), 1)
+        self.assertEqual(message["Subject"], "Subject")
+        self.assertEqual(message["From"], "Sender <sender@example.com>")
+
+    def test_message_id_unique_per_batch(self):
+        first = message_from_bytes(self.rendered.as_bytes(["first@example.com"]))
+        second = message_from_bytes(self.rendered.as_bytes(["first@example.com"]))
+        self.assertNotEqual(first["Message-ID"], second["Message-ID"])
+        self.assertEqual(first.get_payload()[0].get_payload(), "text")
@@ -0,0 +1,35 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, tag
+
+from core.tasks import send_mail
+
+
+@tag("core.tasks.send_mail")
+class TestRetryFailedRecipientsTask(SimpleTestCase):
+    def setUp(self):
+        self.mail_record = {"delivery_id": "delivery_id", "bulk_mail_id": "mail_id"}
+        for name in ("load_mail", "mail_service"):
+            patch = mock.patch.object(send_mail, name)
+            self.addCleanup(patch.stop)
+            setattr(self, name, patch.start())
+        self.mail_service.retry.return_value = False
+
+    def test_retry_loads_mail(self):
+        send_mail.retry_failed_recipients_task.apply(
+            kwargs={"mail_record": self.mail_record}
+        )
+        self.load_mail.assert_called_once_with(mail_record=self.mail_record)
+        self.mail_service.retry.assert_called_once_with(
+            mail_attribute=self.load_mail.return_value, **self.mail_record
+        )
+
+    def test_retry_queued_with_mail_attr(self):
+        # reminder: retries queued before mails were loaded by reference
+        send_mail.retry_failed_recipients_task.apply(
+            kwargs={"mail_record": self.mail_record, "mail_attr": {"subject": "s"}}
+        )
+        self.load_mail.assert_not_called()
+        self.mail_service.retry.assert_called_once_with(
+            mail_attribute={"subject": "s"}, **self.mail_record
+        )
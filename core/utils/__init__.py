@@ -1,4 +1,6 @@
 from .auth import BlocklistPermission, KeycloakAuthentication
+from .cache import TTLCache
+from .recipient_reader import RecipientReader
 from .util import (
     CustomPageNumberPagination,
     JSONEncoder,
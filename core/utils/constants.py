@@ -4,3 +4,23 @@ import enum
 class MailDeliveryStatusEnum(enum.Enum):
     sent_to_provider = "sent_to_provider"
     not_sent_to_provider = "not_sent_to_provider"
+    partially_sent_to_provider = "partially_sent_to_provider"
+
+
+class MailRecipientStatusEnum(enum.Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"
+
+
+class BulkMailStatusEnum(enum.Enum):
+    loading = "loading"
+    active = "active"
+    paused = "paused"
+    cancelled = "cancelled"
+    completed = "completed"
+
+
+class MailEnvelopeModeEnum(enum.Enum):
+    batch = "batch"
+    recipient = "recipient"
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import BinaryIO
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from core.exceptions import AppException
+
+RECIPIENT_COLUMNS = ("email", "recipient", "address", "mail_address")
+
+
+class RecipientReader:
+    """
+    Reads the recipients of an uploaded csv or ndjson file line by line, so a file of
+    any size is never held in memory. Invalid addresses are skipped and counted, and
+    duplicates are dropped within every chunk read.
+    """
+
+    def __init__(self, file: BinaryIO, file_format: str):
+        """
+        :param file: the uploaded file opened in binary mode
+        :param file_format: "csv", or "ndjson" for one json string or object per line
+        """
+        self.file = file
+        self.file_format = file_format
+        self.invalid = 0
+
+    def chunks(self, size: int):
+        """
+        yield the valid recipients in lists of up to size unique addresses
+        """
+        recipients = iter(self)
+        while chunk := list(dict.fromkeys(islice(recipients, size))):
+            yield chunk
+
+    def __iter__(self):
+        lines = io.TextIOWrapper(self.file, encoding="utf-8-sig", newline="")
+        values = (
+            self._ndjson(lines) if self.file_format == "ndjson" else self._csv(lines)
+        )
+        try:
+            for value in values:
+                address = self.normalise(value)
+                if address:
+                    yield address
+                else:
+                    self.invalid += 1
+        except (UnicodeDecodeError, csv.Error) as exc:
+            # reminder: a file that is not utf-8 text, or a csv with NUL bytes
+            raise AppException.ValidationException(
+                error_message={"file": [f"recipients file is not readable: {exc}"]}
+            ) from exc
+
+    # noinspection PyMethodMayBeStatic
+    def normalise(self, value):
+        if not isinstance(value, str):
+            return None
+        local, _, domain = value.strip().rpartition("@")
+        # reminder: domains are case insensitive, local parts are left as they are
+        address = f"{local}@{domain.lower()}"
+        try:
+            validate_email(address)
+        except ValidationError:
+            return None
+        return address
+
+    # noinspection PyMethodMayBeStatic
+    def _csv(self, lines: io.TextIOWrapper):
+        rows = csv.reader(lines)
+        column = 0
+        for row in rows:
+            if not row:
+                continue
+            header = [cell.strip().lower() for cell in row]
+            if not any("@" in cell for cell in header):
+                # reminder: a first row without any address is a header naming the
+                # recipient column
+                column = next(
+                    (
+                        index
+                        for index, cell in enumerate(header)
+                        if cell in RECIPIENT_COLUMNS
+                    ),
+                    0,
+                )
+            else:
+                yield row[column] if len(row) > column else None
+            break
+        for row in rows:
+            if row:
+                yield row[column] if len(row) > column else None
+
+    # noinspection PyMethodMayBeStatic
+    def _ndjson(self, lines: io.TextIOWrapper):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+                continue
+            if isinstance(value, dict):
+                value = next(
+                    (value[key] for key in RECIPIENT_COLUMNS if key in value), None
+                )
+            yield value